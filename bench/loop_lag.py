@@ -0,0 +1,113 @@
+"""
+Лаг event loop при конкурентных апдейтах JSON-хранилища пользователей.
+
+before — старая схема (синхронный read + rewrite всего users.json в корутине),
+after  — JsonUserStorage (память + журнал через файловый поток).
+
+    python -m bench.loop_lag --users 20000 --updates 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from bot.users.storage import JsonUserStorage
+
+
+class LegacyJsonUserStorage:
+    """Поведение до переноса I/O: файл читается и переписывается целиком в корутине."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+
+    async def upsert_user(self, user) -> None:
+        async with self._lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            uid = str(user.id)
+            rec = data.setdefault(uid, {"id": user.id, "total_purchases": 0, "total_spent_rub": 0, "ref": None})
+            rec["username"] = user.username
+            rec["last_seen"] = datetime.utcnow().isoformat()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+
+def _seed(path: str, users: int) -> None:
+    data = {
+        str(i): {
+            "id": i, "username": f"user{i}", "first_name": None, "last_name": None,
+            "first_seen": None, "last_seen": None, "total_purchases": 0,
+            "total_spent_rub": 0, "ref": None,
+        }
+        for i in range(users)
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+async def _measure(storage, updates: int, concurrency: int) -> dict:
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def probe() -> None:
+        interval = 0.001
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - t0 - interval)
+
+    async def worker(start: int) -> None:
+        for i in range(start, updates, concurrency):
+            await storage.upsert_user(SimpleNamespace(id=i, username=f"u{i}", first_name=None, last_name=None))
+
+    probe_task = asyncio.create_task(probe())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await probe_task
+
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "lag_p50_ms": round(statistics.median(lags) * 1000, 2),
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1] * 1000, 2),
+        "lag_max_ms": round(lags[-1] * 1000, 2),
+    }
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20000)
+    ap.add_argument("--updates", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        before_path = os.path.join(d, "before.json")
+        after_path = os.path.join(d, "after.json")
+        _seed(before_path, args.users)
+        _seed(after_path, args.users)
+
+        before = await _measure(LegacyJsonUserStorage(before_path), args.updates, args.concurrency)
+        after_storage = JsonUserStorage(after_path)
+        await after_storage.get_profile(0)  # загрузка снапшота — вне замера
+        after = await _measure(after_storage, args.updates, args.concurrency)
+
+    print(f"users={args.users} updates={args.updates} concurrency={args.concurrency}")
+    print(f"before: {before}")
+    print(f"after:  {after}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
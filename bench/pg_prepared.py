@@ -0,0 +1,93 @@
+"""
+Микробенчмарк: репозиторий на каждый вызов vs долгоживущий репозиторий
+и кэшем prepared statements под весь набор запросов.
+
+Нужен локальный PostgreSQL; таблицы создаются в отдельной схеме bench
+и удаляются после прогона:
+
+    PG_DSN=postgresql://postgres@localhost/postgres python -m bench.pg_prepared --calls 20000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import asyncpg
+
+from bot.db.statements import statement_cache_size
+from bot.users.pg_storage import PgUserStorage
+
+_SCHEMA = """
+CREATE SCHEMA IF NOT EXISTS bench;
+CREATE TABLE IF NOT EXISTS bench.users (
+    id bigint PRIMARY KEY,
+    username text, first_name text, last_name text,
+    first_seen timestamptz, last_seen timestamptz,
+    total_purchases integer NOT NULL DEFAULT 0,
+    total_spent_rub integer NOT NULL DEFAULT 0,
+    ref bigint,
+    bonus_balance integer NOT NULL DEFAULT 0,
+    invited_count integer NOT NULL DEFAULT 0
+);
+"""
+
+_SETTINGS = {"search_path": "bench"}
+
+
+async def _run(pool: asyncpg.Pool, calls: int, concurrency: int, *, reuse: bool) -> float:
+    shared = PgUserStorage(pool)
+
+    async def worker(start: int) -> None:
+        for i in range(start, calls, concurrency):
+            repo = shared if reuse else PgUserStorage(pool)
+            uid = i % 1000
+            await repo.upsert_user_returning(SimpleNamespace(id=uid, username=f"u{uid}", first_name=None, last_name=None))
+            await repo.get_profile(uid)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return time.perf_counter() - t0
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=20000)
+    ap.add_argument("--concurrency", type=int, default=10)
+    args = ap.parse_args()
+
+    dsn = os.environ["PG_DSN"]
+    setup = await asyncpg.connect(dsn)
+    await setup.execute(_SCHEMA)
+
+    try:
+        modes = {
+            # как было: новый репозиторий на каждый вызов, без кэша statements
+            "per-call, no stmt cache": dict(statement_cache_size=0),
+            # новый репозиторий на вызов, дефолтный кэш asyncpg (готовится при первом запросе)
+            "per-call, default cache": dict(),
+            # долгоживущий репозиторий + кэш под весь набор запросов
+            "reused, sized stmt cache": dict(statement_cache_size=statement_cache_size()),
+        }
+
+        for name, extra in modes.items():
+            pool = await asyncpg.create_pool(
+                dsn, min_size=args.concurrency, max_size=args.concurrency,
+                server_settings=_SETTINGS, **extra,
+            )
+            try:
+                elapsed = await _run(pool, args.calls, args.concurrency, reuse=name.startswith("reused"))
+            finally:
+                await pool.close()
+
+            ops = args.calls * 2 / elapsed
+            print(f"{name:28s} {elapsed:7.3f}s  {ops:9.0f} queries/s")
+    finally:
+        await setup.execute("DROP SCHEMA bench CASCADE")
+        await setup.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
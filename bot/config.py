@@ -21,6 +21,15 @@ IS_TEST = not IS_PROD
 
 PAYMENTS_ENABLED = _str_to_bool(os.getenv("ENABLE_PAYMENTS"), default=IS_PROD)
 
+# === Локальное хранилище (test-режим и fallback для PROD) ===
+# - STORAGE_BACKEND=json   → JSON-файлы в data/ (по умолчанию)
+# - STORAGE_BACKEND=sqlite → SQLite (WAL) в SQLITE_PATH — для single-node и нагрузочных тестов
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "json").strip().lower()
+if STORAGE_BACKEND not in ("json", "sqlite"):
+    raise RuntimeError(f"STORAGE_BACKEND must be 'json' or 'sqlite', got {STORAGE_BACKEND!r}")
+
+SQLITE_PATH = os.getenv("SQLITE_PATH") or "data/store.sqlite3"
+
 
 def _env_int(name: str, *, required: bool = False, default: int = 0) -> int:
     raw = os.getenv(name)
@@ -42,6 +51,56 @@ TICKETS_CHAT_ID = _env_int("TICKETS_CHAT_ID", required=IS_PROD)
 
 MANAGERS = [x for x in (MANAGER_1_ID, MANAGER_2_ID) if x]
 
+# === Трекинг пользователей (write-behind) ===
+# буфер сбрасывается раз в USER_TRACK_FLUSH_MS или при USER_TRACK_BATCH пользователях
+USER_TRACK_FLUSH_MS = _env_int("USER_TRACK_FLUSH_MS", default=500)
+USER_TRACK_BATCH = _env_int("USER_TRACK_BATCH", default=500)
+
+# === Кэш профилей (LRU + TTL) ===
+PROFILE_CACHE_SIZE = _env_int("PROFILE_CACHE_SIZE", default=10_000)
+PROFILE_CACHE_TTL = _env_int("PROFILE_CACHE_TTL", default=60)  # секунды
+
+# миграции bot/db/migrations при старте (иначе: python -m bot.db.migrate)
+PG_MIGRATE_ON_START = _str_to_bool(os.getenv("PG_MIGRATE_ON_START"), default=True)
+
+# read-реплика (PG_REPLICA_HOST): допустимое отставание и период health-check, секунды
+PG_REPLICA_MAX_LAG = _env_int("PG_REPLICA_MAX_LAG", default=5)
+PG_REPLICA_CHECK_INTERVAL = _env_int("PG_REPLICA_CHECK_INTERVAL", default=5)
+
+# negative cache каталога промокодов (когда PG-слушатель недоступен): TTL, секунды / размер
+PROMO_NEGATIVE_TTL = _env_int("PROMO_NEGATIVE_TTL", default=300)
+PROMO_NEGATIVE_CACHE_SIZE = _env_int("PROMO_NEGATIVE_CACHE_SIZE", default=50_000)
+
+# резерв промокода под платёж: срок жизни ссылки (30 мин) + запас на поздний вебхук
+PROMO_HOLD_TTL = _env_int("PROMO_HOLD_TTL", default=35 * 60)  # секунды
+
+# circuit breaker PG → локальный fallback в UserService
+PG_BREAKER_FAILURES = _env_int("PG_BREAKER_FAILURES", default=5)  # ошибок подряд до open
+PG_BREAKER_RESET = _env_int("PG_BREAKER_RESET", default=15)  # секунды до пробного запроса
+PG_BREAKER_CALL_TIMEOUT = _env_int("PG_BREAKER_CALL_TIMEOUT", default=5)  # секунды на один вызов
+
+# проверки статуса Platega: срок жизни платежа, одновременных запросов, пауза между запросами
+PLATEGA_PAYMENT_TTL = _env_int("PLATEGA_PAYMENT_TTL", default=30 * 60)  # секунды
+PLATEGA_POLL_CONCURRENCY = _env_int("PLATEGA_POLL_CONCURRENCY", default=4)
+PLATEGA_POLL_MIN_GAP_MS = _env_int("PLATEGA_POLL_MIN_GAP_MS", default=100)
+
+# API Platega (переопределяется для стенда / локальной заглушки)
+PLATEGA_BASE_URL = (os.getenv("PLATEGA_BASE_URL") or "https://app.platega.io").strip()
+
+# /metrics — отдельный listener (не публичный сервер вебхуков); METRICS_PORT=0 — выключен,
+# METRICS_TOKEN — требовать Authorization: Bearer <token>
+METRICS_HOST = (os.getenv("METRICS_HOST") or "127.0.0.1").strip()
+METRICS_PORT = _env_int("METRICS_PORT", default=9100)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+
+# курсы Crypto Pay: период фонового обновления и предел устаревания для котировки, секунды
+RATES_REFRESH_INTERVAL = _env_int("RATES_REFRESH_INTERVAL", default=30)
+RATES_MAX_STALE = _env_int("RATES_MAX_STALE", default=10 * 60)
+
+# очередь вебхуков Platega: воркеров / максимум ожидающих tx
+PLATEGA_WEBHOOK_WORKERS = _env_int("PLATEGA_WEBHOOK_WORKERS", default=4)
+PLATEGA_WEBHOOK_QUEUE = _env_int("PLATEGA_WEBHOOK_QUEUE", default=1000)
+
 @dataclass
 class Config:
     token: str
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    closed → (failure_threshold ошибок подряд) → open → (reset_timeout) → half_open
+    half_open пропускает один пробный вызов: успех → closed, ошибка → снова open.
+
+    Пока open, call() сразу бросает CircuitOpenError — вызывающий уходит в fallback,
+    не дожидаясь таймаутов. Каждый вызов ограничен call_timeout.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout: float = 15.0,
+        call_timeout: float = 5.0,
+        on_close: Callable[[], None] | None = None,
+    ):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.on_close = on_close
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.opened_total = 0
+        self.fast_failed = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        return False
+
+    def _open(self) -> None:
+        if self.state != "open":
+            self.opened_total += 1
+            print(f"[breaker:{self.name}] open")
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def _record_success(self) -> None:
+        self._failures = 0
+        if self.state != "closed":
+            self.state = "closed"
+            self._probe_in_flight = False
+            print(f"[breaker:{self.name}] closed")
+            if self.on_close is not None:
+                self.on_close()
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            self._open()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.allow():
+            self.fast_failed += 1
+            raise CircuitOpenError(self.name)
+
+        try:
+            result = await asyncio.wait_for(fn(), timeout=self.call_timeout)
+        except asyncio.CancelledError:
+            # отмена снаружи — не ошибка PG, но пробный слот надо вернуть
+            if self.state == "half_open":
+                self._probe_in_flight = False
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+
+        self._record_success()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened_total": self.opened_total,
+            "fast_failed": self.fast_failed,
+        }
@@ -0,0 +1,208 @@
+"""
+Версионные миграции PostgreSQL.
+
+Файлы bot/db/migrations/NNNN_<name>.sql применяются по порядку, каждый в своей
+транзакции; применённые версии пишутся в schema_migrations. Параллельные
+запуски (несколько инстансов бота) сериализуются advisory lock'ом.
+
+    python -m bot.db.migrate            # применить недостающие
+    python -m bot.db.migrate --list     # показать статус
+    python -m bot.db.migrate --check    # + EXPLAIN горячих запросов, exit 1 при Seq Scan
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import asyncpg
+
+from bot.db.statements import STATEMENTS
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+# произвольная константа: один ключ на все инстансы бота
+_ADVISORY_LOCK_KEY = 7_310_411_012
+
+_SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version    text PRIMARY KEY,
+    name       text NOT NULL,
+    checksum   text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+# Горячие запросы (имена из bot.db.statements) и аргументы для EXPLAIN.
+# Запросы, не зарегистрированные в текущем процессе, пропускаются.
+_SAMPLE_ORDER_ID = uuid.UUID(int=0)
+_SAMPLE_TS = datetime(2000, 1, 1, tzinfo=timezone.utc)
+HOT_QUERIES: dict[str, tuple] = {
+    "users.get_profile": (1,),
+    "users.count_invited": (1,),
+    "users.set_ref": (1, 2),
+    "users.add_bonus": (1, 1),
+    "users.deduct_bonus": (1, 1),
+    "users.add_purchase": (1, 1),
+    "payments.get_status": (_SAMPLE_ORDER_ID,),
+    "payments.get_order": (_SAMPLE_ORDER_ID,),
+    "payments.mark_paid": (_SAMPLE_ORDER_ID,),
+    "payments.mark_expired": (_SAMPLE_ORDER_ID,),
+    "payments.list_pending": (_SAMPLE_TS,),
+    "payments.expire_stale": (_SAMPLE_TS,),
+    "promos.get": ("CODE",),
+    "promos.get_usage": ("CODE", 1),
+    "promos.release": (_SAMPLE_ORDER_ID,),
+}
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: str
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def discover(path: Path = MIGRATIONS_DIR) -> list[Migration]:
+    result = []
+    for file in sorted(path.glob("*.sql")):
+        version, _, name = file.stem.partition("_")
+        result.append(Migration(version=version, name=name, sql=file.read_text(encoding="utf-8")))
+    return result
+
+
+async def _applied(conn: asyncpg.Connection) -> dict[str, str]:
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {r["version"]: r["checksum"] for r in rows}
+
+
+async def pending(conn: asyncpg.Connection) -> list[Migration]:
+    """Миграции, ещё не применённые к базе (schema_migrations может не быть)."""
+    if await conn.fetchval("SELECT to_regclass('schema_migrations')") is None:
+        return discover()
+    applied = await _applied(conn)
+    return [m for m in discover() if m.version not in applied]
+
+
+async def migrate(conn: asyncpg.Connection) -> list[str]:
+    """Применяет недостающие миграции, возвращает применённые версии."""
+    await conn.execute(_SCHEMA_MIGRATIONS_SQL)
+    await conn.execute("SELECT pg_advisory_lock($1)", _ADVISORY_LOCK_KEY)
+    try:
+        applied = await _applied(conn)
+        done = []
+        for m in discover():
+            if m.version in applied:
+                if applied[m.version] != m.checksum:
+                    print(f"[migrate] WARNING: {m.version}_{m.name} changed after it was applied")
+                continue
+
+            async with conn.transaction():
+                await conn.execute(m.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                    m.version, m.name, m.checksum,
+                )
+            print(f"[migrate] applied {m.version}_{m.name}")
+            done.append(m.version)
+        return done
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", _ADVISORY_LOCK_KEY)
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", ()):
+        found.extend(_seq_scans(child))
+    return found
+
+
+async def check_plans(conn: asyncpg.Connection) -> list[str]:
+    """
+    EXPLAIN горячих запросов с enable_seqscan=off: если Seq Scan остался
+    и при таком штрафе, подходящего индекса нет. Возвращает список проблем.
+    """
+    problems = []
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_seqscan = off")
+        for name, args in HOT_QUERIES.items():
+            text = STATEMENTS.get(name)
+            if text is None:
+                continue
+
+            try:
+                raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {text.strip().rstrip(';')}", *args)
+            except Exception as e:
+                problems.append(f"{name}: EXPLAIN failed: {type(e).__name__}: {e}")
+                continue
+
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            tables = _seq_scans(plan)
+            if tables:
+                problems.append(f"{name}: Seq Scan on {', '.join(tables)}")
+    return problems
+
+
+def register_statements() -> None:
+    """Импорт репозиториев регистрирует их SQL в bot.db.statements."""
+    import bot.users.pg_storage  # noqa: F401
+    import bot.payments.pg_storage  # noqa: F401
+    import bot.promos.pg_storage  # noqa: F401
+
+
+async def run_migrations(conn: asyncpg.Connection, check: bool = True) -> list[str]:
+    """Старт бота: миграции + (опционально) проверка планов — проблемы только в лог."""
+    applied = await migrate(conn)
+    if check:
+        for problem in await check_plans(conn):
+            print(f"[migrate] plan check: {problem}")
+    return applied
+
+
+async def _cli(args: argparse.Namespace) -> int:
+    from bot.db.pool import PgConfig, connect
+
+    register_statements()
+    conn = await connect(PgConfig.from_env())
+    try:
+        if args.list:
+            missing = {m.version for m in await pending(conn)}
+            for m in discover():
+                print(f"{m.version}_{m.name}: {'pending' if m.version in missing else 'applied'}")
+            return 0
+
+        await migrate(conn)
+
+        if args.check:
+            problems = await check_plans(conn)
+            for problem in problems:
+                print(f"[migrate] plan check: {problem}")
+            if problems:
+                return 1
+            print("[migrate] plan check: OK")
+        return 0
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bot.db.migrate")
+    parser.add_argument("--list", action="store_true", help="показать статус миграций и выйти")
+    parser.add_argument("--check", action="store_true", help="проверить планы горячих запросов")
+    sys.exit(asyncio.run(_cli(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+-- Таблицы, которые ожидают PgUserStorage, PgPaymentsStorage и PgPromoStorage.
+-- IF NOT EXISTS / ADD COLUMN IF NOT EXISTS: базы, поднятые вручную, догоняются без пересоздания.
+
+CREATE TABLE IF NOT EXISTS users (
+    id              bigint PRIMARY KEY,
+    username        text,
+    first_name      text,
+    last_name       text,
+    first_seen      timestamptz NOT NULL DEFAULT now(),
+    last_seen       timestamptz NOT NULL DEFAULT now(),
+    total_purchases integer NOT NULL DEFAULT 0,
+    total_spent_rub bigint NOT NULL DEFAULT 0,
+    ref             bigint,
+    bonus_balance   integer NOT NULL DEFAULT 0,
+    invited_count   integer NOT NULL DEFAULT 0
+);
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS total_purchases integer NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS total_spent_rub bigint NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS ref bigint;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS bonus_balance integer NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS invited_count integer NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS payments (
+    order_id        uuid PRIMARY KEY,
+    ticket_id       text,
+    user_id         bigint NOT NULL,
+    product_id      text NOT NULL,
+    promo_code      text,
+    final_price_rub integer NOT NULL,
+    payment_method  text NOT NULL,
+    status          text NOT NULL DEFAULT 'pending',
+    created_at      timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS promos (
+    code             text PRIMARY KEY,
+    type             text NOT NULL,
+    value            integer NOT NULL,
+    active           boolean NOT NULL DEFAULT true,
+    expires_at       timestamptz,
+    max_uses         integer,
+    per_user_limit   integer,
+    allowed_products text[]
+);
+
+CREATE TABLE IF NOT EXISTS promo_usages (
+    promo_code text NOT NULL,
+    user_id    bigint NOT NULL,
+    used_at    timestamptz NOT NULL DEFAULT now()
+);
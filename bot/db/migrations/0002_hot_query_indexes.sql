@@ -0,0 +1,10 @@
+-- Индексы под горячие запросы (проверяются в bot.db.migrate --check).
+
+-- пересчёт/сверка invited_count и выборки рефералов
+CREATE INDEX IF NOT EXISTS users_ref_idx ON users (ref) WHERE ref IS NOT NULL;
+
+-- promos.get_usage и лимит на пользователя
+CREATE INDEX IF NOT EXISTS promo_usages_code_user_idx ON promo_usages (promo_code, user_id);
+
+-- незавершённые платежи (восстановление поллинга, истечение); paid/expired в индекс не попадают
+CREATE INDEX IF NOT EXISTS payments_pending_idx ON payments (created_at) WHERE status = 'pending';
@@ -0,0 +1,11 @@
+-- invited_count поддерживается в users.set_ref; для старых строк считаем один раз по ref.
+UPDATE users u
+SET invited_count = c.n
+FROM (
+    SELECT ref, count(*)::integer AS n
+    FROM users
+    WHERE ref IS NOT NULL
+    GROUP BY ref
+) c
+WHERE u.id = c.ref
+  AND u.invited_count <> c.n;
@@ -0,0 +1,5 @@
+-- idempotency keys записей из ReplayLog (bot/users/replay.py)
+CREATE TABLE IF NOT EXISTS replay_applied (
+    key        text PRIMARY KEY,
+    applied_at timestamptz NOT NULL DEFAULT now()
+);
@@ -0,0 +1,40 @@
+-- Счётчик использований промокода: валидация читает одну строку по PK
+-- вместо всех строк promo_usages. Поддерживается триггером, поэтому его
+-- обновляют все, кто пишет в promo_usages (increment_usage, payments.finalize).
+
+CREATE TABLE IF NOT EXISTS promo_usage_totals (
+    promo_code text PRIMARY KEY,
+    total_uses integer NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION promo_usage_totals_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO promo_usage_totals (promo_code, total_uses)
+        VALUES (NEW.promo_code, 1)
+        ON CONFLICT (promo_code) DO UPDATE
+        SET total_uses = promo_usage_totals.total_uses + 1;
+    ELSE
+        UPDATE promo_usage_totals
+        SET total_uses = greatest(total_uses - 1, 0)
+        WHERE promo_code = OLD.promo_code;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- бэкфилл и триггер атомарно относительно вставок
+LOCK TABLE promo_usages IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO promo_usage_totals (promo_code, total_uses)
+SELECT promo_code, count(*)::integer
+FROM promo_usages
+GROUP BY promo_code
+ON CONFLICT (promo_code) DO UPDATE
+SET total_uses = EXCLUDED.total_uses;
+
+DROP TRIGGER IF EXISTS promo_usages_totals ON promo_usages;
+CREATE TRIGGER promo_usages_totals
+AFTER INSERT OR DELETE ON promo_usages
+FOR EACH ROW EXECUTE FUNCTION promo_usage_totals_sync();
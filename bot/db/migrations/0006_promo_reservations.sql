@@ -0,0 +1,90 @@
+-- Резервы промокодов: слот берётся при создании платежа (hold с TTL),
+-- коммитится в promo_usages при финализации, освобождается при отмене/истечении.
+-- promo_usage_totals.reserved — число активных резервов кода.
+
+ALTER TABLE promo_usage_totals ADD COLUMN IF NOT EXISTS reserved integer NOT NULL DEFAULT 0;
+
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS promo_hold_id uuid;
+
+CREATE TABLE IF NOT EXISTS promo_reservations (
+    hold_id    uuid PRIMARY KEY,
+    promo_code text NOT NULL,
+    user_id    bigint NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS promo_reservations_code_user_idx ON promo_reservations (promo_code, user_id);
+CREATE INDEX IF NOT EXISTS promo_reservations_code_expires_idx ON promo_reservations (promo_code, expires_at);
+
+-- Проверка лимитов и резерв одним вызовом. Строка promo_usage_totals кода
+-- блокируется FOR UPDATE — это единственная точка сериализации (без блокировок
+-- таблиц); каждый запрос ниже берёт свежий снапшот и видит все закоммиченные резервы.
+CREATE OR REPLACE FUNCTION promo_reserve(
+    p_code text,
+    p_user_id bigint,
+    p_hold_id uuid,
+    p_max_uses integer,
+    p_per_user_limit integer,
+    p_ttl_seconds integer
+) RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_total integer;
+    v_reserved integer;
+    v_expired integer;
+    v_user_uses integer;
+BEGIN
+    INSERT INTO promo_usage_totals (promo_code) VALUES (p_code)
+    ON CONFLICT (promo_code) DO NOTHING;
+
+    SELECT total_uses, reserved INTO v_total, v_reserved
+    FROM promo_usage_totals
+    WHERE promo_code = p_code
+    FOR UPDATE;
+
+    -- повторный платёж с тем же резервом: только продлеваем
+    UPDATE promo_reservations
+    SET expires_at = greatest(expires_at, now() + make_interval(secs => p_ttl_seconds))
+    WHERE hold_id = p_hold_id AND expires_at > now();
+    IF FOUND THEN
+        RETURN true;
+    END IF;
+
+    -- протухшие резервы этого кода освобождаем под той же блокировкой
+    WITH gone AS (
+        DELETE FROM promo_reservations
+        WHERE promo_code = p_code AND expires_at <= now()
+        RETURNING 1
+    )
+    SELECT count(*) INTO v_expired FROM gone;
+    v_reserved := greatest(v_reserved - v_expired, 0);
+
+    IF p_max_uses IS NOT NULL AND v_total + v_reserved >= p_max_uses THEN
+        IF v_expired > 0 THEN
+            UPDATE promo_usage_totals SET reserved = v_reserved WHERE promo_code = p_code;
+        END IF;
+        RETURN false;
+    END IF;
+
+    IF p_per_user_limit IS NOT NULL THEN
+        SELECT
+            (SELECT count(*) FROM promo_usages WHERE promo_code = p_code AND user_id = p_user_id)
+          + (SELECT count(*) FROM promo_reservations WHERE promo_code = p_code AND user_id = p_user_id)
+        INTO v_user_uses;
+
+        IF v_user_uses >= p_per_user_limit THEN
+            IF v_expired > 0 THEN
+                UPDATE promo_usage_totals SET reserved = v_reserved WHERE promo_code = p_code;
+            END IF;
+            RETURN false;
+        END IF;
+    END IF;
+
+    INSERT INTO promo_reservations (hold_id, promo_code, user_id, expires_at)
+    VALUES (p_hold_id, p_code, p_user_id, now() + make_interval(secs => p_ttl_seconds));
+
+    UPDATE promo_usage_totals SET reserved = v_reserved + 1 WHERE promo_code = p_code;
+    RETURN true;
+END;
+$$;
@@ -0,0 +1,43 @@
+-- Изменения каталога промокодов → NOTIFY promos_changed (bot/promos/catalog.py).
+-- payload — код; при массовых изменениях (импорт пачкой) — '*' (полная перезагрузка).
+-- Statement-level триггеры с transition tables: один NOTIFY-пакет на statement,
+-- а не на каждую строку COPY.
+
+CREATE OR REPLACE FUNCTION promos_notify() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_count integer;
+    v_code text;
+BEGIN
+    SELECT count(*) INTO v_count FROM changed;
+
+    IF v_count > 100 THEN
+        PERFORM pg_notify('promos_changed', '*');
+    ELSE
+        FOR v_code IN SELECT DISTINCT code FROM changed LOOP
+            PERFORM pg_notify('promos_changed', v_code);
+        END LOOP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+-- transition table допускает только одно событие на триггер
+DROP TRIGGER IF EXISTS promos_notify_insert ON promos;
+CREATE TRIGGER promos_notify_insert
+AFTER INSERT ON promos
+REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION promos_notify();
+
+DROP TRIGGER IF EXISTS promos_notify_update ON promos;
+CREATE TRIGGER promos_notify_update
+AFTER UPDATE ON promos
+REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION promos_notify();
+
+DROP TRIGGER IF EXISTS promos_notify_delete ON promos;
+CREATE TRIGGER promos_notify_delete
+AFTER DELETE ON promos
+REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION promos_notify();
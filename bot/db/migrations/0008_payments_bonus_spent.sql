@@ -0,0 +1,3 @@
+-- списанные бонусы хранятся в строке платежа: после рестарта (и в вебхуке)
+-- финализация берёт их отсюда, а не из памяти процесса
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS bonus_spent integer NOT NULL DEFAULT 0;
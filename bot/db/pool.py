@@ -1,5 +1,21 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import AsyncIterator
+
 import asyncpg
-from dataclasses import dataclass
+
+from bot.db.statements import statement_cache_size
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    return float(raw) if raw not in (None, "") else default
+
 
 @dataclass(frozen=True)
 class PgConfig:
@@ -10,19 +26,171 @@ class PgConfig:
     password: str
     sslmode: str = "disable"
 
+    # пул
+    min_size: int = 2
+    max_size: int = 10
+    command_timeout: float = 30.0
+    acquire_timeout: float = 10.0
+    max_inactive_connection_lifetime: float = 300.0
+    statement_cache_size: int | None = None  # None → по числу зарегистрированных запросов
+
+    # параметры сессии на каждом соединении
+    application_name: str = "store-bot"
+    statement_timeout_ms: int = 15_000
+    lock_timeout_ms: int = 5_000
+    idle_in_transaction_timeout_ms: int = 30_000
+
+    @classmethod
+    def from_env(cls) -> "PgConfig":
+        cache_size = os.getenv("PG_STATEMENT_CACHE_SIZE")
+        return cls(
+            host=os.getenv("PG_HOST"),
+            port=int(os.getenv("PG_PORT", "5432")),
+            database=os.getenv("PG_DB"),
+            user=os.getenv("PG_USER"),
+            password=os.getenv("PG_PASS"),
+            sslmode=os.getenv("PG_SSLMODE", "disable"),
+            min_size=int(os.getenv("PG_POOL_MIN", "2")),
+            max_size=int(os.getenv("PG_POOL_MAX", "10")),
+            command_timeout=_env_float("PG_COMMAND_TIMEOUT", 30.0),
+            acquire_timeout=_env_float("PG_ACQUIRE_TIMEOUT", 10.0),
+            max_inactive_connection_lifetime=_env_float("PG_MAX_INACTIVE_LIFETIME", 300.0),
+            statement_cache_size=int(cache_size) if cache_size else None,
+            application_name=os.getenv("PG_APPLICATION_NAME", "store-bot"),
+            statement_timeout_ms=int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "15000")),
+            lock_timeout_ms=int(os.getenv("PG_LOCK_TIMEOUT_MS", "5000")),
+            idle_in_transaction_timeout_ms=int(os.getenv("PG_IDLE_IN_TX_TIMEOUT_MS", "30000")),
+        )
+
+    def replica_from_env(self) -> "PgConfig | None":
+        """Read-реплика (PG_REPLICA_HOST); остальное — как у primary, если не задано."""
+        host = os.getenv("PG_REPLICA_HOST")
+        if not host:
+            return None
+        return replace(
+            self,
+            host=host,
+            port=int(os.getenv("PG_REPLICA_PORT", str(self.port))),
+            user=os.getenv("PG_REPLICA_USER") or self.user,
+            password=os.getenv("PG_REPLICA_PASS") or self.password,
+            min_size=int(os.getenv("PG_REPLICA_POOL_MIN", "1")),
+            max_size=int(os.getenv("PG_REPLICA_POOL_MAX", str(self.max_size))),
+            application_name=f"{self.application_name}-ro",
+        )
+
+
 def _ssl_arg(sslmode: str):
     return None if sslmode == "disable" else True
 
-async def create_pool(cfg: PgConfig) -> asyncpg.Pool:
-    return await asyncpg.create_pool(
+
+class InstrumentedPool:
+    """
+    Обёртка над asyncpg.Pool с таймаутом acquire по умолчанию и счётчиками
+    ожидания: во время распродаж по ним видно, что пул упёрся в max_size.
+    Остальные методы (close, get_size, ...) проксируются в сам пул.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, *, acquire_timeout: float | None = None):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def __getattr__(self, name: str):
+        return getattr(self._pool, name)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, *, timeout: float | None = None) -> AsyncIterator[asyncpg.Connection]:
+        if timeout is None:
+            timeout = self.acquire_timeout
+
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            conn = await self._pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.waiting -= 1
+            self.acquires += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "waiting": self.waiting,
+            "acquires": self.acquires,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_avg_ms": round(self.wait_total / self.acquires * 1000, 2) if self.acquires else 0.0,
+            "acquire_wait_max_ms": round(self.wait_max * 1000, 2),
+        }
+
+
+async def create_pool(cfg: PgConfig) -> InstrumentedPool:
+    pool = await asyncpg.create_pool(
+        host=cfg.host,
+        port=cfg.port,
+        database=cfg.database,
+        user=cfg.user,
+        password=cfg.password,
+        ssl=_ssl_arg(cfg.sslmode),
+        min_size=cfg.min_size,
+        max_size=cfg.max_size,
+        max_queries=50_000,
+        max_inactive_connection_lifetime=cfg.max_inactive_connection_lifetime,
+        command_timeout=cfg.command_timeout,
+        # параметры сессии уходят в startup-пакете соединения — без лишнего round trip
+        server_settings={
+            "application_name": cfg.application_name,
+            "statement_timeout": str(cfg.statement_timeout_ms),
+            "lock_timeout": str(cfg.lock_timeout_ms),
+            "idle_in_transaction_session_timeout": str(cfg.idle_in_transaction_timeout_ms),
+        },
+        # кэш prepared statements asyncpg под весь реестр запросов
+        statement_cache_size=(
+            cfg.statement_cache_size if cfg.statement_cache_size is not None else statement_cache_size()
+        ),
+    )
+    return InstrumentedPool(pool, acquire_timeout=cfg.acquire_timeout)
+
+
+async def connect(cfg: PgConfig) -> asyncpg.Connection:
+    """Одиночное соединение вне пула (миграции, CLI)."""
+    return await asyncpg.connect(
         host=cfg.host,
         port=cfg.port,
         database=cfg.database,
         user=cfg.user,
         password=cfg.password,
         ssl=_ssl_arg(cfg.sslmode),
-        min_size=1,
-        max_size=10,
-        command_timeout=30,
+        command_timeout=None,
+        server_settings={"application_name": f"{cfg.application_name}-migrate"},
     )
 
+
+async def warm_pool(pool: InstrumentedPool) -> None:
+    """
+    Держит min_size соединений одновременно и пингует каждое: на старте
+    проверяем доступность PG и сразу открываем min_size соединений.
+    """
+    async def ping() -> None:
+        async with pool.acquire() as conn:
+            await conn.execute("SELECT 1;")
+
+    await asyncio.gather(*(ping() for _ in range(max(pool.get_min_size(), 1))))
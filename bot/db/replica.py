@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+import asyncpg
+
+T = TypeVar("T")
+
+# Отставание реплики в секундах; 0, если всё полученное WAL уже применено
+# (иначе на простаивающем primary pg_last_xact_replay_timestamp() «стареет»).
+_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END::float8
+"""
+
+
+class ReplicaRouter:
+    """
+    Чтения, которые терпят лаг, идут на реплику, пока она здорова:
+    отвечает на health-check и отстаёт не больше max_lag секунд.
+    Ошибка запроса на реплике — сразу повтор на primary и реплика
+    считается нездоровой до следующей успешной проверки.
+    """
+
+    def __init__(
+        self,
+        primary: asyncpg.Pool,
+        replica: asyncpg.Pool,
+        *,
+        max_lag: float = 5.0,
+        check_interval: float = 5.0,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+        self.healthy = False  # до первой проверки читаем с primary
+        self.lag: float | None = None
+        self._task: asyncio.Task | None = None
+
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.replica_errors = 0
+
+    async def run(self, fn: Callable[[asyncpg.Pool], Awaitable[T]]) -> T:
+        if not self.healthy:
+            self.primary_reads += 1
+            return await fn(self.primary)
+
+        try:
+            result = await fn(self.replica)
+        except Exception as e:
+            self.replica_errors += 1
+            self.healthy = False
+            print(f"[replica] read failed, falling back to primary: {type(e).__name__}: {e}")
+            self.primary_reads += 1
+            return await fn(self.primary)
+
+        self.replica_reads += 1
+        return result
+
+    async def check(self) -> bool:
+        try:
+            async with self.replica.acquire(timeout=self.check_interval) as conn:
+                self.lag = float(await conn.fetchval(_LAG_SQL, timeout=self.check_interval))
+        except Exception as e:
+            if self.healthy:
+                print(f"[replica] health check failed: {type(e).__name__}: {e}")
+            self.lag = None
+            self.healthy = False
+            return False
+
+        healthy = self.lag <= self.max_lag
+        if healthy != self.healthy:
+            print(f"[replica] {'healthy' if healthy else 'lagging'} (lag={self.lag:.1f}s)")
+        self.healthy = healthy
+        return healthy
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "lag_s": self.lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "replica_errors": self.replica_errors,
+        }
+
+
+_router: ReplicaRouter | None = None
+
+
+def set_router(router: ReplicaRouter | None) -> None:
+    global _router
+    _router = router
+
+
+def lag_window() -> float:
+    """Сколько после своей записи читать с primary (read-your-writes)."""
+    return _router.max_lag if _router is not None else 0.0
+
+
+async def read(pool: asyncpg.Pool, fn: Callable[[asyncpg.Pool], Awaitable[T]]) -> T:
+    """Чтение, терпящее лаг: через реплику, если она настроена для этого primary."""
+    if _router is None or _router.primary is not pool:
+        return await fn(pool)
+    return await _router.run(fn)
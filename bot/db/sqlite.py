@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Схема локального бэкенда (single-node / нагрузочные тесты).
+# Имена таблиц и колонок — как в PostgreSQL.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id              INTEGER PRIMARY KEY,
+    username        TEXT,
+    first_name      TEXT,
+    last_name       TEXT,
+    first_seen      TEXT,
+    last_seen       TEXT,
+    total_purchases INTEGER NOT NULL DEFAULT 0,
+    total_spent_rub INTEGER NOT NULL DEFAULT 0,
+    ref             INTEGER,
+    bonus_balance   INTEGER NOT NULL DEFAULT 0,
+    invited_count   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_ref_idx ON users (ref);
+
+CREATE TABLE IF NOT EXISTS promos (
+    code             TEXT PRIMARY KEY,
+    type             TEXT NOT NULL,
+    value            INTEGER NOT NULL,
+    active           INTEGER NOT NULL DEFAULT 1,
+    expires_at       TEXT,
+    max_uses         INTEGER,
+    per_user_limit   INTEGER,
+    allowed_products TEXT  -- JSON-массив или NULL
+);
+
+CREATE TABLE IF NOT EXISTS promo_usages (
+    promo_code TEXT NOT NULL,
+    user_id    INTEGER NOT NULL,
+    used_at    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS promo_usages_code_user_idx ON promo_usages (promo_code, user_id);
+
+-- счётчик использований (как migrations/0005 в PG); бэкфилл до создания
+-- триггера — для баз, где использования появились раньше счётчика
+CREATE TABLE IF NOT EXISTS promo_usage_totals (
+    promo_code TEXT PRIMARY KEY,
+    total_uses INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO promo_usage_totals (promo_code, total_uses)
+SELECT promo_code, COUNT(*) FROM promo_usages GROUP BY promo_code;
+CREATE TRIGGER IF NOT EXISTS promo_usages_totals AFTER INSERT ON promo_usages
+BEGIN
+    INSERT INTO promo_usage_totals (promo_code, total_uses) VALUES (NEW.promo_code, 1)
+    ON CONFLICT (promo_code) DO UPDATE SET total_uses = total_uses + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS promo_usages_totals_delete AFTER DELETE ON promo_usages
+BEGIN
+    UPDATE promo_usage_totals SET total_uses = MAX(total_uses - 1, 0)
+    WHERE promo_code = OLD.promo_code;
+END;
+
+-- резервы промокодов (expires_at — unix time)
+CREATE TABLE IF NOT EXISTS promo_reservations (
+    hold_id    TEXT PRIMARY KEY,
+    promo_code TEXT NOT NULL,
+    user_id    INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS promo_reservations_code_user_idx ON promo_reservations (promo_code, user_id);
+
+CREATE TABLE IF NOT EXISTS platega_orders (
+    transaction_id TEXT PRIMARY KEY,
+    data           TEXT NOT NULL,
+    created_at     TEXT
+);
+CREATE INDEX IF NOT EXISTS platega_orders_created_idx ON platega_orders (created_at);
+"""
+
+
+class SqliteDb:
+    """
+    Одно соединение SQLite (WAL) в собственном потоке.
+
+    Все запросы выполняются последовательно в этом потоке, поэтому
+    event loop не блокируется, а транзакции не пересекаются.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _run_tx(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Выполняет fn(conn) в одной транзакции в потоке БД."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_tx, fn)
+
+    async def checkpoint(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._executor,
+            lambda: self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)"),
+        )
+
+
+_dbs: dict[str, SqliteDb] = {}
+
+
+def get_sqlite_db(path: str) -> SqliteDb:
+    """Одна SqliteDb на файл (users, promos и заказы делят соединение)."""
+    db = _dbs.get(path)
+    if db is None:
+        db = _dbs[path] = SqliteDb(path)
+    return db
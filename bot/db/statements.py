@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+# Реестр SQL горячих запросов: имя → текст.
+#
+# asyncpg держит на каждом соединении LRU-кэш серверных prepared statements
+# по тексту запроса. Репозитории регистрируют свои запросы здесь как
+# константы модуля (текст всегда один и тот же → попадание в кэш);
+# размер кэша пула считается по реестру, чтобы горячие запросы не вытеснялись.
+# Каждый запрос готовится на соединении при первом вызове и дальше
+# переиспользуется — отдельного прогрева не нужно.
+STATEMENTS: dict[str, str] = {}
+
+# запас под ad-hoc запросы (select 1, EXPLAIN и т.п.), чтобы они не вытесняли горячие
+_CACHE_HEADROOM = 16
+
+
+def sql(name: str, text: str) -> str:
+    STATEMENTS[name] = text
+    return text
+
+
+def statement_cache_size() -> int:
+    return len(STATEMENTS) + _CACHE_HEADROOM
+
@@ -9,6 +9,7 @@ from bot.utils.media import START_IMAGE, CATALOG_IMAGE, PROFILE_IMAGE
 from bot.utils.render import show_photo, show_text
 from bot.data.products import get_category, get_products_by_category, get_product
 from bot.users import user_service
+from bot.payments.price_table import price_table
 
 from bot.promos.state import USER_PROMO, AWAITING_PROMO_FOR_PRODUCT, PromoState
 from bot.promos import promo_service
@@ -72,13 +73,18 @@ async def go_home(cq: CallbackQuery):
         allow_answer=False,
     )
 
-@router.callback_query(NavCb.filter(F.page == "profile"))
-async def go_profile(cq: CallbackQuery):
+@router.callback_query(NavCb.filter(F.page == "profile"), flags={"profile": True})
+async def go_profile(cq: CallbackQuery, profile: dict | None = None):
     await cq.answer()
 
     pool = getattr(cq.bot, "db_pool", None)
-    profile = await user_service.get_profile(cq.from_user.id, pool=pool)
-    invited_count = await user_service.count_invited(cq.from_user.id, pool=pool)
+    if profile is None:
+        profile = await user_service.get_profile(cq.from_user.id, pool=pool)
+
+    # счётчик приходит вместе с профилем; отдельный запрос — только если его нет
+    invited_count = profile.get("invited_count")
+    if invited_count is None:
+        invited_count = await user_service.count_invited(cq.from_user.id, pool=pool)
 
     ref_id = profile.get("ref")
     bonus_balance = int(profile.get("bonus_balance", 0) or 0)
@@ -122,8 +128,8 @@ async def go_chatgpt_plans(cq: CallbackQuery):
     )
 
 
-@router.callback_query(NavCb.filter(F.page == "product"))
-async def go_product(cq: CallbackQuery, callback_data: NavCb):
+@router.callback_query(NavCb.filter(F.page == "product"), flags={"profile": True})
+async def go_product(cq: CallbackQuery, callback_data: NavCb, profile: dict | None = None):
     await cq.answer()
 
     pid = callback_data.payload
@@ -133,8 +139,10 @@ async def go_product(cq: CallbackQuery, callback_data: NavCb):
         return
 
     # --- бонусы пользователя (баланс + применённые к этому товару) ---
-    pool = getattr(cq.bot, "db_pool", None)
-    profile = await user_service.get_profile(cq.from_user.id, pool=pool)
+    # профиль обычно уже прочитан middleware вместе с upsert (flags={"profile": True})
+    if profile is None:
+        pool = getattr(cq.bot, "db_pool", None)
+        profile = await user_service.get_profile(cq.from_user.id, pool=pool)
     bonus_balance = int(profile.get("bonus_balance", 0) or 0)
 
     bonus_applied = BONUS_USE.get(cq.from_user.id, {}).get(product.id, 0)
@@ -155,7 +163,11 @@ async def go_product(cq: CallbackQuery, callback_data: NavCb):
         else:
             price_text = f"{product.price_rub} ₽"
 
-    text = product_text(product.title, product.description, price_text)
+    # цена в крипте — из таблицы цен (без запросов к Crypto Pay; нет курсов — строки нет)
+    final_rub = state.final_price_rub if has_promo and state.final_price_rub is not None else price_after_bonus
+    crypto_prices = price_table.card_prices(final_rub, product.id)
+
+    text = product_text(product.title, product.description, price_text, crypto_prices)
 
     back_page, back_payload = _product_back_target(product.id)
 
@@ -281,6 +293,7 @@ async def go_category(cq: CallbackQuery, callback_data: NavCb):
 
     if len(products) == 1:
         product = products[0]
+        # профиль нужен только карточке товара — go_product прочитает его сам
         await go_product(cq, NavCb(page="product", payload=product.id))
         return
 
@@ -330,8 +343,8 @@ async def ref_link(cq: CallbackQuery):
         "Если друг ещё не совершал покупки — вы закрепитесь как пригласивший, от чего вам будут начислятся бонусы в размере 10% от покупок всех приглашенных вами друзей!"
     )
 
-@router.callback_query(BonusCb.filter(F.action == "use"))
-async def bonus_use(cq: CallbackQuery, callback_data: BonusCb):
+@router.callback_query(BonusCb.filter(F.action == "use"), flags={"profile": True})
+async def bonus_use(cq: CallbackQuery, callback_data: BonusCb, profile: dict | None = None):
     await cq.answer()
 
     pid = callback_data.product_id
@@ -339,8 +352,9 @@ async def bonus_use(cq: CallbackQuery, callback_data: BonusCb):
     if not product:
         return
 
-    pool = getattr(cq.bot, "db_pool", None)
-    profile = await user_service.get_profile(cq.from_user.id, pool=pool)
+    if profile is None:
+        pool = getattr(cq.bot, "db_pool", None)
+        profile = await user_service.get_profile(cq.from_user.id, pool=pool)
     bonus_balance = int(profile.get("bonus_balance", 0) or 0)
 
     amount = min(bonus_balance, int(product.price_rub))
@@ -350,11 +364,11 @@ async def bonus_use(cq: CallbackQuery, callback_data: BonusCb):
     if st and st.product_id == pid:
         USER_PROMO.pop(cq.from_user.id, None)
 
-    await go_product(cq, NavCb(page="product", payload=pid))
+    await go_product(cq, NavCb(page="product", payload=pid), profile=profile)
 
 
-@router.callback_query(BonusCb.filter(F.action == "clear"))
-async def bonus_clear(cq: CallbackQuery, callback_data: BonusCb):
+@router.callback_query(BonusCb.filter(F.action == "clear"), flags={"profile": True})
+async def bonus_clear(cq: CallbackQuery, callback_data: BonusCb, profile: dict | None = None):
     await cq.answer()
 
     pid = callback_data.product_id
@@ -364,4 +378,4 @@ async def bonus_clear(cq: CallbackQuery, callback_data: BonusCb):
     if st and st.product_id == pid:
         USER_PROMO.pop(cq.from_user.id, None)
 
-    await go_product(cq, NavCb(page="product", payload=pid))
+    await go_product(cq, NavCb(page="product", payload=pid), profile=profile)
@@ -1,19 +1,29 @@
-import asyncio
 import json
+import math
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from aiogram import Router
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery
 
-from bot.config import TICKETS_CHAT_ID, PAYMENTS_ENABLED
+from bot.config import (
+    TICKETS_CHAT_ID,
+    PAYMENTS_ENABLED,
+    STORAGE_BACKEND,
+    SQLITE_PATH,
+    PROMO_HOLD_TTL,
+    PLATEGA_PAYMENT_TTL,
+    PLATEGA_POLL_CONCURRENCY,
+    PLATEGA_POLL_MIN_GAP_MS,
+)
 from bot.data.products import get_product
 from bot.keyboards.callbacks import PayCb
 from bot.keyboards.payments import pay_invoice_kb, purchase_done_kb
 from bot.payments.methods import PAYMENT_METHODS
-from bot.payments.rates_cache import convert, quantize_amount
+from bot.payments.price_table import crypto_price
 from bot.promos import promo_service
+from bot.promos.service import PromoError
 from bot.promos.state import USER_PROMO
 from bot.services.crypto_pay import crypto_pay
 from bot.users import user_service
@@ -22,6 +32,9 @@ from bot.utils.tickets import send_ticket_to_group
 
 from bot.bonuses.state import BONUS_USE
 from bot.payments.platega_orders import PlategaOrders, PendingPlategaOrder
+from bot.payments.platega_scheduler import PlategaScheduler
+from bot.payments.platega_status import platega_status
+from bot.utils import metrics
 
 # === PG payments (PostgreSQL primary; JSON остается как временный fallback) ===
 import asyncpg
@@ -29,23 +42,67 @@ from bot.payments.pg_storage import PgPaymentsStorage, PaymentCreate
 
 
 _PG_POOL: asyncpg.Pool | None = None
+_PG_PAYMENTS: PgPaymentsStorage | None = None
 
 
 def set_pg_pool(pool: asyncpg.Pool) -> None:
     """Прокидываем asyncpg pool из main.py (в PROD)."""
-    global _PG_POOL
+    global _PG_POOL, _PG_PAYMENTS
     _PG_POOL = pool
+    _PG_PAYMENTS = PgPaymentsStorage(pool) if pool else None
 
 
 def _pg_payments() -> PgPaymentsStorage | None:
-    return PgPaymentsStorage(_PG_POOL) if _PG_POOL else None
+    return _PG_PAYMENTS
 
 
 router = Router()
-platega_orders = PlategaOrders()
+if STORAGE_BACKEND == "sqlite":
+    from bot.db.sqlite import get_sqlite_db
+    from bot.payments.sqlite_orders import SqlitePlategaOrders
+
+    platega_orders = SqlitePlategaOrders(get_sqlite_db(SQLITE_PATH))
+else:
+    platega_orders = PlategaOrders(ttl=PLATEGA_PAYMENT_TTL)
+
+
+async def _apply_purchase_stepwise(
+    buyer_id: int,
+    amount_rub: int,
+    spent: int,
+    bonus_earned: int,
+    promo_code: str | None,
+    promo_hold_id: str | None = None,
+) -> None:
+    """Пошаговый вариант финализации: test-режим (JSON) и fallback, если PG-транзакция не прошла."""
+    # 1) Списать бонусы (если применялись)
+    if spent > 0:
+        await user_service.deduct_bonus(buyer_id, spent, pool=_PG_POOL)
+
+    # 2) Учесть покупку
+    await user_service.add_purchase(buyer_id, amount_rub, pool=_PG_POOL)
+
+    # 3) Начислить бонусы покупателю (10% от финальной суммы)
+    if amount_rub > 0:
+        await user_service.add_bonus(
+            user_id=buyer_id,
+            amount=bonus_earned,
+            pool=_PG_POOL,
+        )
+
+        # 4) Начислить бонусы рефереру (если есть ref)
+        profile = await user_service.get_profile(buyer_id, pool=_PG_POOL, primary=True)
+        ref_id = profile.get("ref")
+        if ref_id:
+            await user_service.add_bonus(
+                user_id=int(ref_id),
+                amount=bonus_earned,
+                pool=_PG_POOL,
+            )
 
-# простая память для активных рублёвых платежей (ускоритель; НЕ источник истины)
-_PENDING_PLATEGA: dict[str, dict] = {}
+    # 5) Промокод пометить использованным
+    if promo_code:
+        await promo_service.mark_used(promo_code, buyer_id, promo_hold_id)
 
 
 async def _finalize_purchase(
@@ -59,6 +116,7 @@ async def _finalize_purchase(
     final_price_rub: int | None = None,
     promo_code: str | None = None,
     bonus_spent: int | None = None,
+    promo_hold_id: str | None = None,
 ):
     """
     Финализация покупки: уведомления, записи в БД, списание/начисление бонусов.
@@ -81,34 +139,33 @@ async def _finalize_purchase(
     amount_rub = int(final_price_rub or (product.price_rub if product else 0) or 0)
     spent = int(bonus_spent or 0)
 
-    # 1) Списать бонусы (если применялись)
-    if spent > 0:
-        await user_service.deduct_bonus(buyer_id, spent, pool=_PG_POOL)
-
-    # 2) Учесть покупку
-    await user_service.add_purchase(buyer_id, amount_rub, pool=_PG_POOL)
-
-    # 3) Начислить бонусы покупателю (10% от финальной суммы)
-    if amount_rub > 0:
-        await user_service.add_bonus(
-            user_id=buyer_id,
-            amount=int(amount_rub * 0.10),
-            pool=_PG_POOL,
-        )
+    bonus_earned = int(amount_rub * 0.10) if amount_rub > 0 else 0
 
-        # 4) Начислить бонусы рефереру (если есть ref)
-        profile = await user_service.get_profile(buyer_id, pool=_PG_POOL)
-        ref_id = profile.get("ref")
-        if ref_id:
-            await user_service.add_bonus(
-                user_id=int(ref_id),
-                amount=int(amount_rub * 0.10),
-                pool=_PG_POOL,
+    # 1-5) Бонусы, покупка, бонус рефереру, промокод — одной транзакцией в PG
+    finalized = None
+    pg = _pg_payments()
+    if pg:
+        try:
+            finalized = await pg.finalize_purchase(
+                buyer_id=buyer_id,
+                amount_rub=amount_rub,
+                bonus_spent=spent,
+                bonus_earned=bonus_earned,
+                referrer_bonus=bonus_earned,
+                promo_code=promo_code,
+                promo_hold_id=promo_hold_id,
             )
+        except Exception as e:
+            # транзакция откатилась целиком — ниже применяем по шагам (с fallback на JSON)
+            print(f"[payments] finalize tx failed: {type(e).__name__}: {e}")
 
-    # 5) Промокод пометить использованным
-    if promo_code:
-        await promo_service.mark_used(promo_code, buyer_id)
+    if finalized is None:
+        await _apply_purchase_stepwise(buyer_id, amount_rub, spent, bonus_earned, promo_code, promo_hold_id)
+    else:
+        # транзакция шла мимо UserService — сбрасываем кэш профилей сами
+        user_service.invalidate_profile(buyer_id)
+        if finalized.referrer_credited and finalized.ref_id:
+            user_service.invalidate_profile(int(finalized.ref_id))
 
     # 6) Очистить стейты (промо/бонусы) для пользователя
     USER_PROMO.pop(buyer_id, None)
@@ -165,102 +222,94 @@ async def _finalize_purchase(
     )
 
 
-async def _poll_platega_status(tx_id: str, bot):
+async def _check_platega_tx(tx_id: str, meta: dict) -> bool:
     """
-    Проверяем /transaction/{id} пока не станет CONFIRMED / CANCELED / CHARGEBACK.
+    Одна проверка /transaction/{id} для планировщика: True — статус финальный.
     Успешный — CONFIRMED, неуспешный — CANCELED, возврат — CHARGEBACK.
     """
-    meta = _PENDING_PLATEGA.get(tx_id)
-    if not meta:
-        meta = platega_orders.get(tx_id)
-        if not meta:
-            return
+    bot = _BOT
 
-    ticket_id = meta["ticket_id"]
-    buyer_id = meta["buyer_id"]
-    buyer_username = meta.get("buyer_username")
-    product_id = meta["product_id"]
-    promo_code = meta.get("promo_code")
-    final_price_rub = meta.get("final_price_rub")
-    bonus_spent = meta.get("bonus_spent", 0)
+    # общий с вебхуком single-flight запрос (финальный статус — из кэша)
+    st = await platega_status.get(tx_id)
 
-    message_chat_id = meta.get("message_chat_id")
-    message_id = meta.get("message_id")
+    status = (st.get("status") or "").upper()
 
-    # 30 минут, проверка раз в 5 секунд
-    for _ in range(30 * 60 // 5):
-        try:
-            from bot.services.platega_pay import platega_pay  # lazy import
-            st = await platega_pay.get_transaction(tx_id)
-        except Exception:
-            await asyncio.sleep(5)
-            continue
+    if status == "CONFIRMED":
+        message_chat_id = meta.get("message_chat_id")
+        message_id = meta.get("message_id")
+        if message_chat_id and message_id:
+            try:
+                await bot.delete_message(message_chat_id, message_id)
+            except TelegramBadRequest:
+                pass
 
-        status = (st.get("status") or "").upper()
-
-        if status == "CONFIRMED":
-            if message_chat_id and message_id:
-                try:
-                    await bot.delete_message(message_chat_id, message_id)
-                except TelegramBadRequest:
-                    pass
-
-            # идемпотентность: финализируем только если мы первые отметили paid
-            pg = _pg_payments()
-            if pg:
-                try:
-                    first = await pg.mark_paid(uuid.UUID(str(tx_id)))
-                except Exception:
-                    return
-
-                if not first:
-                    _PENDING_PLATEGA.pop(tx_id, None)
-                    platega_orders.pop(tx_id)
-                    return
-
-            await _finalize_purchase(
-                bot=bot,
-                ticket_id=ticket_id,
-                buyer_id=buyer_id,
-                buyer_username=buyer_username,
-                product_id=product_id,
-                amount_asset=str(final_price_rub or 0),
-                asset="RUB",
-                final_price_rub=int(final_price_rub or 0),
-                promo_code=promo_code,
-                bonus_spent=int(bonus_spent or 0),
-            )
+        # идемпотентность: финализируем только если мы первые отметили paid
+        pg = _pg_payments()
+        if pg:
+            try:
+                first = await pg.mark_paid(uuid.UUID(str(tx_id)))
+            except Exception as e:
+                # не финальный исход: планировщик/повторный вебхук проверят ещё раз
+                print(f"[payments] mark_paid {tx_id} failed: {type(e).__name__}: {e}")
+                return False
 
-            _PENDING_PLATEGA.pop(tx_id, None)
-            platega_orders.pop(tx_id)
-            return
+            if not first:
+                await platega_orders.pop(tx_id)
+                return True
+
+        final_price_rub = meta.get("final_price_rub")
+        await _finalize_purchase(
+            bot=bot,
+            ticket_id=meta["ticket_id"],
+            buyer_id=meta["buyer_id"],
+            buyer_username=meta.get("buyer_username"),
+            product_id=meta["product_id"],
+            amount_asset=str(final_price_rub or 0),
+            asset="RUB",
+            final_price_rub=int(final_price_rub or 0),
+            promo_code=meta.get("promo_code"),
+            bonus_spent=int(meta.get("bonus_spent") or 0),
+            promo_hold_id=meta.get("promo_hold_id"),
+        )
 
-        if status in ("CANCELED", "CHARGEBACK"):
-            pg = _pg_payments()
-            if pg:
-                try:
-                    await pg.mark_expired(uuid.UUID(str(tx_id)))
-                except Exception:
-                    pass
+        await platega_orders.pop(tx_id)
+        return True
 
+    if status in ("CANCELED", "CHARGEBACK"):
+        pg = _pg_payments()
+        if pg:
             try:
-                await bot.send_message(
-                    buyer_id,
-                    "Платёж не завершён (отменён/возврат). Попробуйте ещё раз."
-                )
+                await pg.mark_expired(uuid.UUID(str(tx_id)))
             except Exception:
                 pass
 
-            _PENDING_PLATEGA.pop(tx_id, None)
-            platega_orders.pop(tx_id)
-            return
+        # слот промокода возвращаем сразу, не дожидаясь TTL резерва
+        promo_hold_id = meta.get("promo_hold_id")
+        if promo_hold_id:
+            try:
+                await promo_service.release(promo_hold_id)
+            except Exception:
+                pass
 
-        await asyncio.sleep(5)
+        try:
+            await bot.send_message(
+                meta["buyer_id"],
+                "Платёж не завершён (отменён/возврат). Попробуйте ещё раз."
+            )
+        except Exception:
+            pass
+
+        await platega_orders.pop(tx_id)
+        return True
 
-    _PENDING_PLATEGA.pop(tx_id, None)
+    return False
+
+
+async def _expire_platega_tx(tx_id: str, meta: dict) -> None:
+    """Ссылка прожила PLATEGA_PAYMENT_TTL без финального статуса (поздний вебхук всё ещё примем)."""
     try:
-        await bot.send_message(
-            buyer_id,
+        await _BOT.send_message(
+            meta["buyer_id"],
             "⌛️ Ссылка на оплату устарела.\n\n"
             "Если вы *уже оплатили* — ничего делать не нужно, мы проверим оплату автоматически.\n"
             "Если не оплачивали — откройте товар и создайте новый платёж.\n\n"
@@ -271,6 +320,137 @@ async def _poll_platega_status(tx_id: str, bot):
         pass
 
 
+# активные рублёвые платежи: одна очередь проверок статуса на все (ускоритель; НЕ источник истины)
+platega_scheduler = PlategaScheduler(
+    _check_platega_tx,
+    _expire_platega_tx,
+    ttl=PLATEGA_PAYMENT_TTL,
+    max_inflight=PLATEGA_POLL_CONCURRENCY,
+    min_gap=PLATEGA_POLL_MIN_GAP_MS / 1000,
+)
+metrics.register("platega_scheduler", platega_scheduler.stats)
+
+_BOT = None
+
+# срок жизни счёта CryptoBot (expires_in)
+CRYPTO_INVOICE_TTL = 30 * 60
+
+
+def start_platega_scheduler(bot) -> None:
+    global _BOT
+    _BOT = bot
+    platega_scheduler.start()
+
+
+def _poll_invoice(invoice, now: datetime, **kwargs) -> bool:
+    """
+    Ставит счёт на polling не дольше его оставшегося срока жизни:
+    invoice.poll() берёт полный таймаут менеджера, а после рестарта
+    счёту осталось меньше (или уже больше, чем таймаут по умолчанию).
+    """
+    expires = getattr(invoice, "expiration_date", None) or (
+        invoice.created_at + timedelta(seconds=CRYPTO_INVOICE_TTL)
+    )
+    remaining = (expires - now).total_seconds()
+    if remaining <= 0:
+        return False
+
+    invoice.poll(**kwargs)
+    # у aiosend таймаут задаётся только на менеджер — правим задачу счёта
+    task = getattr(crypto_pay, "_invoice_tasks", {}).get(invoice.invoice_id)
+    if task is not None:
+        task.timeout = math.ceil(remaining)
+    return True
+
+
+async def recover_pending_payments() -> None:
+    """
+    После рестарта: просроченные pending-платежи — в expired одним запросом,
+    живые — обратно на проверку статуса с оставшимся сроком жизни.
+    SBP — в планировщик, счета CryptoBot — в его polling (по getInvoices пачками).
+    Без PG источник — platega_orders (крипта в JSON-режиме не хранится).
+    """
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=max(PLATEGA_PAYMENT_TTL, CRYPTO_INVOICE_TTL))
+
+    # локальный журнал чистим в любом режиме (в PROD он дублирует PG)
+    stale_local = await platega_orders.expire_before(cutoff.replace(tzinfo=None).isoformat())
+
+    pg = _pg_payments()
+    if pg is None:
+        orders = await platega_orders.all()
+        for tx_id, order in orders.items():
+            try:
+                created = datetime.fromisoformat(order["created_at"]).replace(tzinfo=timezone.utc)
+            except (KeyError, TypeError, ValueError):
+                created = now
+            platega_scheduler.add(tx_id, order, age=(now - created).total_seconds())
+        print(f"[payments] recovered {len(orders)} pending SBP, expired {stale_local} (local)")
+        return
+
+    expired = await pg.expire_stale(cutoff)
+    rows = await pg.list_pending(cutoff)
+
+    invoice_ids: list[int] = []
+    sbp = 0
+    for row in rows:
+        if row["payment_method"] == "crypto":
+            if (row["ticket_id"] or "").isdigit():
+                invoice_ids.append(int(row["ticket_id"]))
+            continue
+
+        platega_scheduler.add(
+            str(row["order_id"]),
+            {
+                "ticket_id": row["ticket_id"],
+                "buyer_id": row["user_id"],
+                "buyer_username": None,  # доберём через bot.get_chat в _finalize_purchase
+                "product_id": row["product_id"],
+                "promo_code": row["promo_code"],
+                "final_price_rub": row["final_price_rub"],
+                "bonus_spent": row["bonus_spent"],
+                "promo_hold_id": str(row["promo_hold_id"]) if row["promo_hold_id"] else None,
+            },
+            age=(now - row["created_at"]).total_seconds(),
+        )
+        sbp += 1
+
+    polled = 0
+    for i in range(0, len(invoice_ids), 1000):  # getInvoices: не больше 1000 за запрос
+        batch = invoice_ids[i:i + 1000]
+        try:
+            # без count API отдаёт только 100 счетов
+            invoices = await crypto_pay.get_invoices(invoice_ids=batch, count=len(batch))
+        except Exception as e:
+            print(f"[payments] crypto recovery failed: {type(e).__name__}: {e}")
+            break
+        for invoice in invoices:
+            if invoice.status in ("active", "paid"):  # InvoiceStatus — str-enum
+                if _poll_invoice(invoice, now, message=None):
+                    polled += 1
+
+    print(f"[payments] recovered {sbp} pending SBP, {polled} crypto invoices; expired {expired}")
+
+
+async def _reserve_promo_hold(user_id: int, st) -> str | None:
+    """
+    Новый резерв слота промокода под создаваемый платёж.
+
+    У каждого платежа свой hold: два оплаченных платежа не делят один слот,
+    а отмена одного не снимает резерв другого. Резерв прошлого неоплаченного
+    платежа этого выбора отпускаем — он заменён новым.
+    """
+    if st.hold_id:
+        await promo_service.release(st.hold_id)
+        st.hold_id = None
+
+    hold_id = str(uuid.uuid4())
+    if not await promo_service.reserve(st.promo_code, user_id, hold_id, PROMO_HOLD_TTL):
+        return None  # у кода нет лимитов
+    st.hold_id = hold_id
+    return hold_id
+
+
 @router.callback_query(PayCb.filter())
 async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
     # test-режим: платежи отключены
@@ -281,8 +461,8 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
             await cq.answer("Товар не найден", show_alert=True)
             return
 
-        # бонусы 
-        prof = await user_service.get_profile(cq.from_user.id, pool=_PG_POOL)
+        # бонусы: баланс перед списанием — только с primary, мимо кэша
+        prof = await user_service.get_profile(cq.from_user.id, pool=_PG_POOL, primary=True)
         bonus_balance = int(prof.get("bonus_balance", 0) or 0)
 
         selected = BONUS_USE.get(cq.from_user.id, {}).get(product.id, 0)
@@ -332,7 +512,8 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
         return
 
     # --- бонусы: выбранная сумма списания ---
-    prof = await user_service.get_profile(cq.from_user.id, pool=_PG_POOL)
+    # баланс перед списанием — только с primary, мимо кэша
+    prof = await user_service.get_profile(cq.from_user.id, pool=_PG_POOL, primary=True)
     bonus_balance = int(prof.get("bonus_balance", 0) or 0)
 
     selected = BONUS_USE.get(cq.from_user.id, {}).get(product.id, 0)
@@ -348,6 +529,16 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
         final_price_rub = int(price_after_bonus)
         promo_code = None
 
+    # --- резерв слота промокода на время жизни платежа (лимиты max_uses/per_user) ---
+    promo_hold_id = None
+    if promo_code:
+        try:
+            promo_hold_id = await _reserve_promo_hold(cq.from_user.id, st)
+        except PromoError as e:
+            USER_PROMO.pop(cq.from_user.id, None)
+            await cq.answer(f"❌ {e}", show_alert=True)
+            return
+
     # === RUB (Platega) ===
     if method.code == "rub":
         ticket_id = uuid.uuid4().hex[:8].upper()
@@ -360,29 +551,37 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
             "promo_code": promo_code,
             "final_price_rub": final_price_rub,
             "bonus_spent": bonus_spent,
+            "promo_hold_id": promo_hold_id,
         })
 
         return_url = "https://t.me/berloga_programmistov"
         failed_url = "https://t.me/berloga_programmistov"
 
         from bot.services.platega_pay import platega_pay  # lazy import
-        resp = await platega_pay.create_sbp_payment(
-            amount_rub=final_price_rub,
-            description=f"{product.title} | Ticket #{ticket_id}",
-            payload=payload,
-            return_url=return_url,
-            failed_url=failed_url,
-            payment_method=2,
-        )
+        try:
+            resp = await platega_pay.create_sbp_payment(
+                amount_rub=final_price_rub,
+                description=f"{product.title} | Ticket #{ticket_id}",
+                payload=payload,
+                return_url=return_url,
+                failed_url=failed_url,
+                payment_method=2,
+            )
+        except Exception:
+            if promo_hold_id:
+                await promo_service.release(promo_hold_id)
+            raise
 
         tx_id = resp.get("transactionId")
         pay_url = resp.get("redirect")
 
         if not tx_id or not pay_url:
+            if promo_hold_id:
+                await promo_service.release(promo_hold_id)
             await cq.answer("Не удалось создать платёж. Попробуйте ещё раз.", show_alert=True)
             return
 
-        platega_orders.put(
+        await platega_orders.put(
             tx_id,
             PendingPlategaOrder(
                 ticket_id=ticket_id,
@@ -392,10 +591,12 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
                 promo_code=promo_code,
                 final_price_rub=final_price_rub,
                 created_at=datetime.utcnow().isoformat(),
+                promo_hold_id=promo_hold_id,
+                bonus_spent=bonus_spent,
             )
         )
 
-        _PENDING_PLATEGA[tx_id] = {
+        meta = {
             "ticket_id": ticket_id,
             "buyer_id": cq.from_user.id,
             "buyer_username": cq.from_user.username,
@@ -403,6 +604,7 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
             "promo_code": promo_code,
             "final_price_rub": final_price_rub,
             "bonus_spent": bonus_spent,
+            "promo_hold_id": promo_hold_id,
             "message_chat_id": cq.message.chat.id if cq.message else None,
             "message_id": cq.message.message_id if cq.message else None,
         }
@@ -420,12 +622,14 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
                         promo_code=promo_code,
                         final_price_rub=final_price_rub,
                         payment_method="sbp",
+                        promo_hold_id=promo_hold_id,
+                        bonus_spent=bonus_spent,
                     )
                 )
             except Exception:
                 pass
 
-        asyncio.create_task(_poll_platega_status(tx_id, cq.bot))
+        platega_scheduler.add(tx_id, meta)
 
         caption = (
             f"💳 *Оплата через {method.title}*\n\n"
@@ -454,9 +658,11 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
     asset = method.asset
 
     try:
-        amount_crypto = await convert(float(final_price_rub), "RUB", asset)
-        amount_crypto = quantize_amount(amount_crypto, asset)
+        # цена по прайсу — из таблицы, иначе один precomputed курс RUB→asset
+        amount_crypto = await crypto_price(final_price_rub, asset, product.id)
     except Exception:
+        if promo_hold_id:
+            await promo_service.release(promo_hold_id)
         await cq.answer("Не удалось получить курс. Попробуйте ещё раз.", show_alert=True)
         return
 
@@ -471,15 +677,21 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
         "promo_code": promo_code,
         "final_price_rub": final_price_rub,
         "bonus_spent": bonus_spent,
+        "promo_hold_id": promo_hold_id,
     })
 
-    invoice = await crypto_pay.create_invoice(
-        amount=float(amount_crypto),
-        asset=asset,
-        description=product.title,
-        payload=payload,
-        expires_in=1800,
-    )
+    try:
+        invoice = await crypto_pay.create_invoice(
+            amount=float(amount_crypto),
+            asset=asset,
+            description=product.title,
+            payload=payload,
+            expires_in=CRYPTO_INVOICE_TTL,
+        )
+    except Exception:
+        if promo_hold_id:
+            await promo_service.release(promo_hold_id)
+        raise
 
     # создаём запись в PostgreSQL (pending)
     pg = _pg_payments()
@@ -494,6 +706,8 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
                     promo_code=promo_code,
                     final_price_rub=final_price_rub,
                     payment_method="crypto",
+                    promo_hold_id=promo_hold_id,
+                    bonus_spent=bonus_spent,
                 )
             )
         except Exception:
@@ -526,7 +740,7 @@ async def pay_handler(cq: CallbackQuery, callback_data: PayCb):
 
 
 @crypto_pay.invoice_paid()
-async def on_invoice_paid(invoice, message):
+async def on_invoice_paid(invoice, message=None):
     data = json.loads(invoice.payload)
 
     buyer_id = data["buyer_id"]
@@ -536,6 +750,7 @@ async def on_invoice_paid(invoice, message):
     final_price_rub = int(data.get("final_price_rub") or 0)
     bonus_spent = int(data.get("bonus_spent") or 0)
     order_id = data.get("order_id")
+    promo_hold_id = data.get("promo_hold_id")
 
     # для крипты тоже: не дублить финализацию
     pg = _pg_payments()
@@ -547,13 +762,15 @@ async def on_invoice_paid(invoice, message):
         except Exception:
             return
 
-    try:
-        await message.delete()
-    except TelegramBadRequest:
-        pass
+    # счета, восстановленные после рестарта, приходят без сообщения
+    if message is not None:
+        try:
+            await message.delete()
+        except TelegramBadRequest:
+            pass
 
     await _finalize_purchase(
-        bot=message.bot,
+        bot=message.bot if message is not None else _BOT,
         buyer_id=buyer_id,
         buyer_username=buyer_username,
         product_id=product_id,
@@ -562,4 +779,5 @@ async def on_invoice_paid(invoice, message):
         final_price_rub=final_price_rub,
         promo_code=promo_code,
         bonus_spent=bonus_spent,
+        promo_hold_id=promo_hold_id,
     )
@@ -23,7 +23,9 @@ async def show_start(message: Message):
     )
 
 
-@router.message(CommandStart())
+# flags={"profile": True}: пользователь записывается синхронно (не write-behind),
+# иначе try_set_ref для нового пользователя не найдёт его строку в users
+@router.message(CommandStart(), flags={"profile": True})
 async def start_cmd(message: Message, command: CommandObject):
     ref_id = None
 
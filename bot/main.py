@@ -1,21 +1,37 @@
-import os
 import asyncio
 
 from aiogram import Bot, Dispatcher
 
-from bot.config import load_config, APP_ENV, IS_PROD, PAYMENTS_ENABLED
+from bot.config import (
+    load_config,
+    APP_ENV,
+    IS_PROD,
+    PAYMENTS_ENABLED,
+    PG_MIGRATE_ON_START,
+    PG_REPLICA_MAX_LAG,
+    PG_REPLICA_CHECK_INTERVAL,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_TOKEN,
+)
 from bot.handlers.start import router as start_router
 from bot.handlers.catalog import router as catalog_router
 from bot.handlers import payments, info
 
 from bot.middlewares.users import UserTrackingMiddleware
+from bot.users import user_service, user_storage, user_tracker
 
 from bot.services.crypto_pay import crypto_pay
 from bot.webhooks.platega_webhook import start_platega_webhook_server
+from bot.webhooks.metrics_server import start_metrics_server
 
-from bot.db.pool import PgConfig, create_pool
+from bot.db.pool import PgConfig, connect, create_pool, warm_pool
+from bot.db.migrate import pending, register_statements, run_migrations
+from bot.db import replica
 
-from bot.promos import set_pg_pool as set_promos_pg_pool
+from bot.payments.rates_cache import rates_cache
+from bot.promos import set_pg_pool as set_promos_pg_pool, start_catalog, promo_catalog
+from bot.utils import metrics
 
 
 async def main():
@@ -25,36 +41,79 @@ async def main():
     dp = Dispatcher()
 
     pool = None
+    pg_cfg = None
+    replica_pool = None
+    replica_router = None
     bot.db_pool = None
 
     # --- PostgreSQL pool (только в PROD) ---
     if IS_PROD:
-        pg_cfg = PgConfig(
-            host=os.getenv("PG_HOST"),
-            port=int(os.getenv("PG_PORT", "5432")),
-            database=os.getenv("PG_DB"),
-            user=os.getenv("PG_USER"),
-            password=os.getenv("PG_PASS"),
-            sslmode=os.getenv("PG_SSLMODE", "disable"),
-        )
+        pg_cfg = PgConfig.from_env()
+
+        # весь SQL репозиториев регистрируется до создания пула (размер кэша statements)
+        register_statements()
+
+        # схема до пула: соединения открываются уже к актуальной схеме.
+        # Без автозапуска миграций не стартуем на старой схеме: репозитории
+        # читают колонки/таблицы из миграций (users.invited_count, replay_applied, ...)
+        conn = await connect(pg_cfg)
+        try:
+            if PG_MIGRATE_ON_START:
+                await run_migrations(conn)
+            else:
+                missing = await pending(conn)
+                if missing:
+                    names = ", ".join(f"{m.version}_{m.name}" for m in missing)
+                    raise RuntimeError(f"PG schema is behind, run `python -m bot.db.migrate`: {names}")
+        finally:
+            await conn.close()
 
         pool = await create_pool(pg_cfg)
         dp["db_pool"] = pool
         bot.db_pool = pool
 
-        # тест соединения (потом уберём)
-        await pool.execute("select 1;")
-        print("PG: OK")
+        # min_size соединений открыты и пропингованы до первого апдейта
+        await warm_pool(pool)
+        metrics.register("pg_pool", pool.stats)
+        print(f"PG: OK (pool {pool.get_size()}/{pg_cfg.max_size})")
+
+        # read-реплика (опционально): недоступна на старте — работаем только с primary
+        replica_cfg = pg_cfg.replica_from_env()
+        if replica_cfg is not None:
+            try:
+                replica_pool = await create_pool(replica_cfg)
+            except Exception as e:
+                print(f"PG replica: unavailable ({type(e).__name__}: {e}), reads stay on primary")
+            else:
+                replica_router = replica.ReplicaRouter(
+                    pool,
+                    replica_pool,
+                    max_lag=PG_REPLICA_MAX_LAG,
+                    check_interval=PG_REPLICA_CHECK_INTERVAL,
+                )
+                await replica_router.check()
+                replica_router.start()
+                replica.set_router(replica_router)
+                metrics.register("pg_replica", replica_router.stats)
+                metrics.register("pg_replica_pool", replica_pool.stats)
+                print(f"PG replica: {'OK' if replica_router.healthy else 'not ready'}")
 
         # прокидываем pool в сервисы
         payments.set_pg_pool(pool)
         set_promos_pg_pool(pool)
+
+        # записи, ушедшие в fallback в прошлом запуске
+        await user_service.replay(pool)
     else:
         print(f"APP_ENV={APP_ENV} → DB отключена (работаем на JSON), платежи: {'ON' if PAYMENTS_ENABLED else 'OFF'}")
 
     # --- middlewares ---
     dp.message.middleware(UserTrackingMiddleware())
     dp.callback_query.middleware(UserTrackingMiddleware())
+    user_tracker.start()
+
+    # каталог промокодов в памяти (с PG — плюс LISTEN на изменения)
+    await start_catalog(pg_cfg)
 
     # --- routers ---
     dp.include_router(start_router)
@@ -62,6 +121,22 @@ async def main():
     dp.include_router(payments.router)
     dp.include_router(info.router)
 
+    # проверки статуса рублёвых платежей — одна очередь на все
+    if PAYMENTS_ENABLED:
+        # курсы крипты: сохранённый снимок + фоновое обновление
+        await rates_cache.start()
+        payments.start_platega_scheduler(bot)
+        # pending-платежи прошлого запуска (polling-задачи умерли вместе с процессом)
+        try:
+            await payments.recover_pending_payments()
+        except Exception as e:
+            print(f"[payments] recovery failed: {type(e).__name__}: {e}")
+
+    # метрики — только на внутреннем адресе (или с токеном)
+    metrics_runner = None
+    if IS_PROD and METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT, METRICS_TOKEN)
+
     try:
         # Платежные фоновые задачи — только в PROD и только если платежи включены.
         if IS_PROD and PAYMENTS_ENABLED:
@@ -89,6 +164,22 @@ async def main():
 
 
     finally:
+        # дописываем буфер трекинга до закрытия пула
+        await user_tracker.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await payments.platega_scheduler.stop()
+        await rates_cache.stop()
+        if PAYMENTS_ENABLED:
+            from bot.services.platega_pay import platega_pay  # lazy import
+            await platega_pay.close()
+        await promo_catalog.stop()
+        await user_storage.compact()
+        if replica_router is not None:
+            replica.set_router(None)
+            await replica_router.stop()
+        if replica_pool is not None:
+            await replica_pool.close()
         if pool is not None:
             await pool.close()
 
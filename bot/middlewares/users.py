@@ -1,8 +1,9 @@
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import TelegramObject
 from typing import Callable, Dict, Any
 
-from bot.users import user_service
+from bot.users import user_service, user_tracker
 
 
 class UserTrackingMiddleware(BaseMiddleware):
@@ -26,6 +27,18 @@ class UserTrackingMiddleware(BaseMiddleware):
                     except Exception:
                         pool = None
 
-            await user_service.track(user, pool=pool)
+            wants_profile = get_flag(data, "profile")
+            profile = user_service.cached_profile(user.id) if wants_profile else None
+
+            if wants_profile and profile is None:
+                # хендлеру нужен профиль, в кэше его нет: upsert + чтение одним запросом
+                user_tracker.discard(user.id)
+                data["profile"] = await user_service.track_and_get_profile(user, pool=pool)
+            else:
+                # write-behind: запись уходит в буфер, хендлер её не ждёт
+                user_tracker.track(user, pool=pool)
+                if profile is not None:
+                    # профиль из кэша — БД на этом апдейте не трогаем
+                    data["profile"] = profile
 
         return await handler(event, data)
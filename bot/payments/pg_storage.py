@@ -8,6 +8,8 @@ from typing import Optional, Literal
 
 import asyncpg
 
+from bot.db.statements import sql
+
 
 PaymentMethod = Literal["sbp", "crypto"]
 PaymentStatus = Literal["pending", "paid", "expired"]
@@ -24,6 +26,97 @@ class PaymentCreate:
     payment_method: PaymentMethod
     status: PaymentStatus = "pending"
     created_at: Optional[datetime] = None
+    promo_hold_id: Optional[str] = None  # резерв промокода (promo_reservations)
+    bonus_spent: int = 0
+
+
+_CREATE_SQL = sql("payments.create", """
+INSERT INTO payments (
+    order_id, ticket_id, user_id, product_id, promo_code,
+    final_price_rub, payment_method, status, created_at, promo_hold_id, bonus_spent
+)
+VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11)
+ON CONFLICT (order_id) DO NOTHING
+""")
+
+_MARK_PAID_SQL = sql("payments.mark_paid", """
+UPDATE payments
+SET status='paid'
+WHERE order_id=$1 AND status <> 'paid'
+""")
+
+_MARK_EXPIRED_SQL = sql("payments.mark_expired", """
+UPDATE payments
+SET status='expired'
+WHERE order_id=$1 AND status <> 'paid'
+""")
+
+_GET_STATUS_SQL = sql("payments.get_status", "SELECT status FROM payments WHERE order_id=$1")
+
+_GET_ORDER_SQL = sql("payments.get_order", """
+SELECT ticket_id, user_id, product_id, promo_code, final_price_rub, promo_hold_id, bonus_spent
+FROM payments
+WHERE order_id = $1
+""")
+
+# восстановление после рестарта: оба по частичному индексу payments_pending_idx
+_LIST_PENDING_SQL = sql("payments.list_pending", """
+SELECT order_id, ticket_id, user_id, product_id, promo_code, final_price_rub,
+       promo_hold_id, bonus_spent, payment_method, created_at
+FROM payments
+WHERE status = 'pending' AND created_at >= $1
+ORDER BY created_at
+""")
+
+_EXPIRE_STALE_SQL = sql("payments.expire_stale", """
+UPDATE payments
+SET status='expired'
+WHERE status = 'pending' AND created_at < $1
+""")
+
+# Финализация покупки одним statement (одна транзакция):
+# списание/начисление бонусов покупателю, учёт покупки, бонус рефереру,
+# использование промокода (+ коммит его резерва). Либо применяется всё, либо ничего.
+_FINALIZE_SQL = sql("payments.finalize", """
+WITH buyer AS (
+    UPDATE users
+    SET bonus_balance = GREATEST(bonus_balance - $3, 0) + $4,
+        total_purchases = total_purchases + 1,
+        total_spent_rub = total_spent_rub + $2,
+        last_seen = now()
+    WHERE id = $1
+    RETURNING ref, bonus_balance
+), referrer AS (
+    UPDATE users
+    SET bonus_balance = bonus_balance + $5
+    WHERE id = (SELECT ref FROM buyer) AND $5 > 0
+    RETURNING id
+), promo AS (
+    INSERT INTO promo_usages (promo_code, user_id, used_at)
+    SELECT upper($6::text), $1, now()
+    WHERE $6::text IS NOT NULL
+), held AS (
+    DELETE FROM promo_reservations
+    WHERE hold_id = $7::uuid
+    RETURNING promo_code
+), unreserve AS (
+    UPDATE promo_usage_totals t
+    SET reserved = greatest(t.reserved - 1, 0)
+    FROM held
+    WHERE t.promo_code = held.promo_code
+)
+SELECT
+    (SELECT ref FROM buyer) AS ref_id,
+    (SELECT bonus_balance FROM buyer) AS bonus_balance,
+    EXISTS (SELECT 1 FROM referrer) AS referrer_credited
+""")
+
+
+@dataclass(frozen=True)
+class PurchaseFinalized:
+    ref_id: Optional[int]
+    bonus_balance: Optional[int]  # баланс покупателя после покупки
+    referrer_credited: bool
 
 
 class PgPaymentsStorage:
@@ -33,17 +126,9 @@ class PgPaymentsStorage:
     async def create_payment(self, p: PaymentCreate) -> None:
         created_at = p.created_at or datetime.now(timezone.utc)
 
-        sql = """
-        INSERT INTO payments (
-            order_id, ticket_id, user_id, product_id, promo_code,
-            final_price_rub, payment_method, status, created_at
-        )
-        VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9)
-        ON CONFLICT (order_id) DO NOTHING
-        """
         async with self.pool.acquire() as conn:
             await conn.execute(
-                sql,
+                _CREATE_SQL,
                 p.order_id,
                 p.ticket_id,
                 p.user_id,
@@ -53,30 +138,65 @@ class PgPaymentsStorage:
                 p.payment_method,
                 p.status,
                 created_at,
+                p.promo_hold_id,
+                p.bonus_spent,
             )
 
     async def mark_paid(self, order_id: uuid.UUID) -> bool:
-        sql = """
-        UPDATE payments
-        SET status='paid'
-        WHERE order_id=$1 AND status <> 'paid'
-        """
         async with self.pool.acquire() as conn:
-            res = await conn.execute(sql, order_id)
+            res = await conn.execute(_MARK_PAID_SQL, order_id)
         # res: "UPDATE <n>"
         return res.split()[-1].isdigit() and int(res.split()[-1]) > 0
 
     async def mark_expired(self, order_id: uuid.UUID) -> bool:
-        sql = """
-        UPDATE payments
-        SET status='expired'
-        WHERE order_id=$1 AND status <> 'paid'
-        """
         async with self.pool.acquire() as conn:
-            res = await conn.execute(sql, order_id)
+            res = await conn.execute(_MARK_EXPIRED_SQL, order_id)
         return res.split()[-1].isdigit() and int(res.split()[-1]) > 0
 
+    async def finalize_purchase(
+        self,
+        buyer_id: int,
+        amount_rub: int,
+        bonus_spent: int,
+        bonus_earned: int,
+        referrer_bonus: int,
+        promo_code: Optional[str],
+        promo_hold_id: Optional[str] = None,
+    ) -> PurchaseFinalized:
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                _FINALIZE_SQL,
+                buyer_id,
+                amount_rub,
+                bonus_spent,
+                bonus_earned,
+                referrer_bonus,
+                promo_code,
+                promo_hold_id,
+            )
+
+        return PurchaseFinalized(
+            ref_id=row["ref_id"],
+            bonus_balance=row["bonus_balance"],
+            referrer_credited=bool(row["referrer_credited"]),
+        )
+
+    async def list_pending(self, since: datetime) -> list[dict]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(_LIST_PENDING_SQL, since)
+        return [dict(r) for r in rows]
+
+    async def expire_stale(self, before: datetime) -> int:
+        """Все pending старше before → expired одним UPDATE; возвращает число строк."""
+        async with self.pool.acquire() as conn:
+            res = await conn.execute(_EXPIRE_STALE_SQL, before)
+        return int(res.split()[-1]) if res.split()[-1].isdigit() else 0
+
     async def get_status(self, order_id: uuid.UUID) -> Optional[str]:
-        sql = "SELECT status FROM payments WHERE order_id=$1"
         async with self.pool.acquire() as conn:
-            return await conn.fetchval(sql, order_id)
+            return await conn.fetchval(_GET_STATUS_SQL, order_id)
+
+    async def get_order(self, order_id: uuid.UUID) -> Optional[dict]:
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(_GET_ORDER_SQL, order_id)
+        return dict(row) if row else None
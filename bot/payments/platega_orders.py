@@ -1,8 +1,10 @@
-import json
-import os
+import asyncio
 from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
 from typing import Any
 
+from bot.utils.journal import JsonJournal
+
 @dataclass
 class PendingPlategaOrder:
     ticket_id: str
@@ -12,35 +14,92 @@ class PendingPlategaOrder:
     promo_code: str | None
     final_price_rub: int
     created_at: str  # ISO string
+    promo_hold_id: str | None = None
+    bonus_spent: int = 0
 
 class PlategaOrders:
-    def __init__(self, path: str = "data/platega_orders.json"):
+    """
+    Ожидающие заказы Platega в памяти + append-only журнал (platega_orders.json.journal).
+
+    platega_orders.json читается один раз, put/pop дописывают в журнал одну
+    строку (pop отсутствующего ключа ничего не пишет), get — без I/O.
+    Раз в compact_every записей журнал сворачивается в атомарный снапшот;
+    заказы старше ttl при этом (и при загрузке) выбрасываются.
+    """
+
+    def __init__(self, path: str = "data/platega_orders.json", *, ttl: float = 30 * 60, compact_every: int = 500):
         self.path = path
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        self._journal = JsonJournal(path, compact_every=compact_every)
+        self._data: dict[str, Any] | None = None
+
+    async def _load(self) -> dict[str, Any]:
+        if self._data is None:
+            self._data = await self._journal.load()
+            if self._prune(self._cutoff()):
+                await self._journal.compact(dict(self._data))
+        return self._data
+
+    def _cutoff(self) -> str:
+        # created_at — naive UTC ISO, строки сравниваются как даты
+        return (datetime.utcnow() - timedelta(seconds=self.ttl)).isoformat()
+
+    def _prune(self, cutoff_iso: str) -> int:
+        stale = [k for k, v in self._data.items() if (v.get("created_at") or "") < cutoff_iso]
+        for k in stale:
+            del self._data[k]
+        return len(stale)
 
-    def _load(self) -> dict[str, Any]:
-        if not os.path.exists(self.path):
-            return {}
-        with open(self.path, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-
-    def _save(self, data: dict[str, Any]) -> None:
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-    def put(self, transaction_id: str, order: PendingPlategaOrder) -> None:
-        data = self._load()
-        data[transaction_id] = asdict(order)
-        self._save(data)
-
-    def pop(self, transaction_id: str) -> dict[str, Any] | None:
-        data = self._load()
-        item = data.pop(transaction_id, None)
-        self._save(data)
+    def _append(self, transaction_id: str, value: dict[str, Any] | None) -> asyncio.Future:
+        written = self._journal.append([(transaction_id, value)])
+        if self._journal.needs_compaction:
+            self._prune(self._cutoff())
+            written = self._journal.compact(dict(self._data))
+        return written
+
+    async def put(self, transaction_id: str, order: PendingPlategaOrder) -> None:
+        async with self._lock:
+            data = await self._load()
+            # новое значение не меняется на месте — файловый поток сериализует его позже
+            data[transaction_id] = value = asdict(order)
+            written = self._append(transaction_id, value)
+        await written
+
+    async def pop(self, transaction_id: str) -> dict[str, Any] | None:
+        async with self._lock:
+            data = await self._load()
+            item = data.pop(transaction_id, None)
+            if item is None:
+                return None
+            written = self._append(transaction_id, None)
+        await written
         return item
 
-    def get(self, transaction_id: str) -> dict[str, Any] | None:
-        return self._load().get(transaction_id)
+    async def get(self, transaction_id: str) -> dict[str, Any] | None:
+        async with self._lock:
+            data = await self._load()
+            return data.get(transaction_id)
+
+    async def all(self) -> dict[str, dict[str, Any]]:
+        async with self._lock:
+            return dict(await self._load())
+
+    async def expire_before(self, cutoff_iso: str) -> int:
+        """Удаляет заказы с created_at < cutoff_iso одной записью снапшота."""
+        async with self._lock:
+            await self._load()
+            removed = self._prune(cutoff_iso)
+            if not removed:
+                return 0
+            written = self._journal.compact(dict(self._data))
+        await written
+        return removed
+
+    async def compact(self) -> None:
+        async with self._lock:
+            if self._data is None:
+                return
+            self._prune(self._cutoff())
+            written = self._journal.compact(dict(self._data))
+        await written
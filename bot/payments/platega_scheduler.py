@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+# (возраст платежа до, интервал проверки), секунды: часто в первые минуты,
+# когда оплачивают большинство, дальше всё реже. ~100 запросов за 30 минут вместо 360.
+BACKOFF: tuple[tuple[float | None, float], ...] = (
+    (60, 5),
+    (5 * 60, 10),
+    (15 * 60, 20),
+    (None, 30),
+)
+
+CheckFn = Callable[[str, dict], Awaitable[bool]]
+ExpireFn = Callable[[str, dict], Awaitable[None]]
+
+
+def backoff_interval(age: float) -> float:
+    for until, interval in BACKOFF:
+        if until is None or age < until:
+            return interval
+    return BACKOFF[-1][1]
+
+
+@dataclass
+class _Entry:
+    tx_id: str
+    meta: dict
+    started: float  # monotonic: момент создания платежа
+    deadline: float  # monotonic: после него — on_expire
+    due: float = 0.0
+    inflight: bool = False
+    checks: int = 0
+
+
+class PlategaScheduler:
+    """
+    Единый планировщик проверок статуса Platega вместо задачи на каждый платёж.
+
+    Куча (due, seq, tx_id) с ближайшими проверками; одна фоновая задача
+    забирает созревшие и запускает on_check не больше max_inflight
+    одновременно и не чаще раза в min_gap секунд. on_check → True: статус
+    финальный, платёж снимается; False/исключение — следующая проверка по
+    BACKOFF (с джиттером ±10%). Истёк ttl — on_expire и снятие.
+    """
+
+    def __init__(
+        self,
+        on_check: CheckFn,
+        on_expire: ExpireFn,
+        *,
+        ttl: float = 30 * 60,
+        max_inflight: int = 4,
+        min_gap: float = 0.1,
+    ):
+        self.on_check = on_check
+        self.on_expire = on_expire
+        self.ttl = ttl
+        self.max_inflight = max(max_inflight, 1)
+        self.min_gap = max(min_gap, 0.0)
+
+        self._entries: dict[str, _Entry] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._seq = 0
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._running: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+        self._last_dispatch = 0.0
+        self._inflight = 0
+
+        self.checks = 0
+        self.errors = 0
+        self.completed = 0
+        self.expired = 0
+
+    # --- очередь ---
+
+    def add(self, tx_id: str, meta: dict, *, age: float = 0.0, first_check: float | None = None) -> None:
+        """
+        Поставить платёж на проверку. age — сколько он уже живёт (после рестарта):
+        от него считаются остаток ttl и ступень BACKOFF.
+        """
+        now = time.monotonic()
+        started = now - max(age, 0.0)
+        entry = self._entries.get(tx_id)
+        if entry is None:
+            entry = self._entries[tx_id] = _Entry(tx_id, meta, started, started + self.ttl)
+        else:
+            entry.meta = meta
+        delay = backoff_interval(now - started) if first_check is None else first_check
+        self._push(entry, min(now + delay, entry.deadline))
+
+    def remove(self, tx_id: str) -> None:
+        """Платёж финализирован в другом месте (вебхук) — запись в куче отбросится при выборке."""
+        self._entries.pop(tx_id, None)
+
+    def get(self, tx_id: str) -> dict | None:
+        entry = self._entries.get(tx_id)
+        return entry.meta if entry else None
+
+    def __contains__(self, tx_id: str) -> bool:
+        return tx_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _push(self, entry: _Entry, due: float) -> None:
+        entry.due = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, entry.tx_id))
+        if self._heap[0][2] == entry.tx_id:
+            self._wake.set()
+
+    def _pop_due(self, now: float) -> _Entry | None:
+        while self._heap and self._heap[0][0] <= now:
+            due, _, tx_id = heapq.heappop(self._heap)
+            entry = self._entries.get(tx_id)
+            # снятые и перепланированные (устаревшие записи кучи) пропускаем
+            if entry is None or entry.inflight or entry.due != due:
+                continue
+            return entry
+        return None
+
+    # --- фоновая задача ---
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            entry = self._pop_due(now)
+            if entry is None:
+                timeout = (self._heap[0][0] - now) if self._heap else None
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if now >= entry.deadline:
+                self._entries.pop(entry.tx_id, None)
+                self.expired += 1
+                self._spawn(self._expire(entry))
+                continue
+
+            # не больше max_inflight запросов и не два в один момент
+            await self._slots.acquire()
+            gap = self._last_dispatch + self.min_gap - time.monotonic()
+            if gap > 0:
+                await asyncio.sleep(gap)
+            self._last_dispatch = time.monotonic()
+
+            if self._entries.get(entry.tx_id) is not entry:
+                self._slots.release()  # сняли, пока ждали слот
+                continue
+            entry.inflight = True
+            self._inflight += 1
+            self._spawn(self._check(entry))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _check(self, entry: _Entry) -> None:
+        done = False
+        try:
+            self.checks += 1
+            entry.checks += 1
+            done = await self.on_check(entry.tx_id, entry.meta)
+        except Exception as e:
+            self.errors += 1
+            print(f"[platega] status check {entry.tx_id} failed: {type(e).__name__}: {e}")
+        finally:
+            entry.inflight = False
+            self._inflight -= 1
+            self._slots.release()
+
+        if self._entries.get(entry.tx_id) is not entry:
+            return
+        if done:
+            self._entries.pop(entry.tx_id, None)
+            self.completed += 1
+            return
+
+        now = time.monotonic()
+        interval = backoff_interval(now - entry.started) * random.uniform(0.9, 1.1)
+        self._push(entry, min(now + interval, entry.deadline))
+
+    async def _expire(self, entry: _Entry) -> None:
+        try:
+            await self.on_expire(entry.tx_id, entry.meta)
+        except Exception as e:
+            print(f"[platega] expire {entry.tx_id} failed: {type(e).__name__}: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает выборку; начатые проверки (и финализации) доживают."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "pending": len(self._entries),
+            "inflight": self._inflight,
+            "next_due_in_s": round(self._heap[0][0] - now, 2) if self._heap else None,
+            "checks": self.checks,
+            "errors": self.errors,
+            "completed": self.completed,
+            "expired": self.expired,
+        }
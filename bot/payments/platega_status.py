@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from bot.utils import metrics
+
+# после этих статусов транзакция больше не меняется (для наших целей)
+TERMINAL_STATUSES = frozenset({"CONFIRMED", "CANCELED", "CHARGEBACK"})
+
+FetchFn = Callable[[str], Awaitable[dict[str, Any]]]
+
+
+class StatusResolver:
+    """
+    Single-flight запрос статуса транзакции Platega.
+
+    Параллельные get(tx_id) (вебхук и планировщик) ждут один и тот же
+    upstream-запрос и получают один результат/одну ошибку. Финальный
+    статус кэшируется (LRU + TTL) — дальнейшие проверки без запроса.
+    """
+
+    def __init__(self, fetch: FetchFn, *, terminal_ttl: float = 60 * 60, maxsize: int = 10_000):
+        self.fetch = fetch
+        self.terminal_ttl = terminal_ttl
+        self.maxsize = maxsize
+
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._terminal: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+        self.upstream = 0
+        self.shared = 0
+        self.cache_hits = 0
+
+    async def get(self, tx_id: str) -> dict[str, Any]:
+        cached = self._terminal.get(tx_id)
+        if cached is not None:
+            if time.monotonic() - cached[0] < self.terminal_ttl:
+                self.cache_hits += 1
+                return cached[1]
+            del self._terminal[tx_id]
+
+        task = self._inflight.get(tx_id)
+        if task is None:
+            task = self._inflight[tx_id] = asyncio.create_task(self._resolve(tx_id))
+        else:
+            self.shared += 1
+        # отмена одного ждущего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _resolve(self, tx_id: str) -> dict[str, Any]:
+        try:
+            self.upstream += 1
+            st = await self.fetch(tx_id)
+        finally:
+            self._inflight.pop(tx_id, None)
+
+        if (st.get("status") or "").upper() in TERMINAL_STATUSES:
+            self._terminal[tx_id] = (time.monotonic(), st)
+            self._terminal.move_to_end(tx_id)
+            if len(self._terminal) > self.maxsize:
+                self._terminal.popitem(last=False)
+        return st
+
+    def stats(self) -> dict:
+        return {
+            "upstream": self.upstream,
+            "shared": self.shared,
+            "cache_hits": self.cache_hits,
+            "inflight": len(self._inflight),
+            "terminal_cached": len(self._terminal),
+        }
+
+
+async def _fetch(tx_id: str) -> dict[str, Any]:
+    from bot.services.platega_pay import platega_pay  # lazy import
+    return await platega_pay.get_transaction(tx_id)
+
+
+platega_status = StatusResolver(_fetch)
+metrics.register("platega_status", platega_status.stats)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, Iterable, Tuple
+
+from bot.data.products import PRODUCTS, Product
+from bot.payments.methods import PAYMENT_METHODS
+from bot.payments.rates_cache import RatesUnavailable, quantize_amount, rates_cache
+from bot.utils import metrics
+
+# через что считать кросс-курс, если у Crypto Pay нет пары RUB↔asset
+_PIVOTS = ("USD", "USDT")
+
+
+def cross_rate(rates: Dict[Tuple[str, str], float], source: str, target: str) -> float | None:
+    """1 source = N target: прямой курс, обратный или через _PIVOTS."""
+
+    def pair(a: str, b: str) -> float | None:
+        if a == b:
+            return 1.0
+        direct = rates.get((a, b))
+        if direct:
+            return direct
+        inverse = rates.get((b, a))
+        return 1.0 / inverse if inverse else None
+
+    rate = pair(source, target)
+    if rate is not None:
+        return rate
+    for pivot in _PIVOTS:
+        a, b = pair(source, pivot), pair(pivot, target)
+        if a and b:
+            return a * b
+    return None
+
+
+class PriceTable:
+    """
+    Цены всех товаров во всех включённых крипто-активах.
+
+    Пересчитывается целиком при каждом обновлении курсов (подписка на
+    rates_cache): кросс-курсы RUB→asset выводятся один раз, цены по
+    прайсу — сразу квантованные. Оплата и карточка товара делают поиск
+    в словаре; нестандартная сумма (промо/бонусы) — одно умножение.
+    """
+
+    def __init__(self, products: Iterable[Product], assets: Iterable[str]):
+        self.products = {p.id: p for p in products}
+        self.assets = tuple(assets)
+
+        # заменяются одним присваиванием
+        self._rates: Dict[str, float] = {}
+        self._prices: Dict[Tuple[str, str], float] = {}
+        self.fetched_at = 0.0
+        self.rebuilds = 0
+
+    def rebuild(self, rates: Dict[Tuple[str, str], float], fetched_at: float) -> None:
+        rub_rates = {}
+        for asset in self.assets:
+            rate = cross_rate(rates, "RUB", asset)
+            if rate is not None:
+                rub_rates[asset] = rate
+            else:
+                print(f"[prices] no RUB→{asset} rate")
+
+        prices = {
+            (p.id, asset): quantize_amount(p.price_rub * rate, asset)
+            for p in self.products.values()
+            for asset, rate in rub_rates.items()
+        }
+        self._rates, self._prices, self.fetched_at = rub_rates, prices, fetched_at
+        self.rebuilds += 1
+
+    @property
+    def fresh(self) -> bool:
+        return bool(self._rates) and time.time() - self.fetched_at <= rates_cache.max_stale
+
+    def price(self, amount_rub: int, asset: str, product_id: str | None = None) -> float:
+        """Сумма в asset за amount_rub; без сети. Нет свежего курса — RatesUnavailable."""
+        if not self.fresh:
+            raise RatesUnavailable("price table is empty or stale")
+
+        product = self.products.get(product_id) if product_id else None
+        if product is not None and int(amount_rub) == product.price_rub:
+            cached = self._prices.get((product.id, asset))
+            if cached is not None:
+                return cached
+
+        rate = self._rates.get(asset)
+        if rate is None:
+            raise RatesUnavailable(f"no RUB→{asset} rate")
+        return quantize_amount(float(amount_rub) * rate, asset)
+
+    def card_prices(self, amount_rub: int, product_id: str | None = None) -> Dict[str, float]:
+        """Для карточки товара: {asset: сумма}, пусто — если курсов нет."""
+        if not self.fresh:
+            return {}
+        return {asset: self.price(amount_rub, asset, product_id) for asset in self.assets if asset in self._rates}
+
+    def stats(self) -> dict:
+        return {
+            "assets": list(self._rates),
+            "entries": len(self._prices),
+            "rebuilds": self.rebuilds,
+            "fresh": self.fresh,
+        }
+
+
+price_table = PriceTable(
+    PRODUCTS,
+    [m.asset for m in PAYMENT_METHODS.values() if m.enabled and m.asset != "RUB"],
+)
+rates_cache.subscribe(price_table.rebuild)
+metrics.register("prices", price_table.stats)
+
+
+async def crypto_price(amount_rub: int, asset: str, product_id: str | None = None) -> float:
+    """
+    Сумма к оплате для checkout. get_rates() не ходит в сеть, кроме холодного
+    старта без снимка, и отказывает по пределу устаревания.
+    """
+    await rates_cache.get_rates()
+    return price_table.price(amount_rub, asset, product_id)
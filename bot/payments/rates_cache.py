@@ -1,67 +1,193 @@
 import asyncio
 import time
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Dict, Tuple
+from typing import Callable, Dict, Tuple
 
+from bot.config import RATES_REFRESH_INTERVAL, RATES_MAX_STALE
 from bot.services.crypto_pay import crypto_pay
+from bot.utils import metrics
+from bot.utils.files import read_json, write_json
 
-_TTL_SECONDS = 30
 
-_lock = asyncio.Lock()
-_cached_at = 0.0
-_rates: Dict[Tuple[str, str], float] = {}
+class RatesUnavailable(RuntimeError):
+    """Свежих (не старше max_stale) курсов нет — котировать нельзя."""
 
 
-def _now() -> float:
-    return time.monotonic()
-
-
-async def _refresh_rates() -> None:
-    """
-    Обновляет кеш курсов из Crypto Pay.
-    get_exchange_rates() -> список объектов ExchangeRate (source, target, rate).
+class RatesCache:
     """
-    global _cached_at, _rates
+    Курсы Crypto Pay по схеме stale-while-revalidate.
 
-    rates_list = await crypto_pay.get_exchange_rates()  # :contentReference[oaicite:1]{index=1}
+    Фоновая задача обновляет снимок раз в refresh_interval (при ошибке —
+    повтор через 5 с). Читатели берут текущий снимок без lock'а и без сети;
+    устаревший снимок отдаётся, пока он не старше max_stale, дальше —
+    RatesUnavailable. Снимок пишется в data/rates.json: после рестарта
+    первый платёж не ждёт upstream.
+    """
 
-    new_map: Dict[Tuple[str, str], float] = {}
-    for r in rates_list:
-        src = getattr(r, "source", None)
-        tgt = getattr(r, "target", None)
-        rate = getattr(r, "rate", None)
-        if not src or not tgt or rate is None:
-            continue
+    def __init__(self, path: str = "data/rates.json", *, refresh_interval: float = 30, max_stale: float = 600):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.max_stale = max_stale
+
+        # снимок заменяется целиком: (курсы, time.time() получения)
+        self._rates: Dict[Tuple[str, str], float] = {}
+        self._fetched_at = 0.0
+        self._refreshing: asyncio.Task | None = None
+        self._task: asyncio.Task | None = None
+        self._subscribers: list[Callable[[Dict[Tuple[str, str], float], float], None]] = []
+
+        self.refreshes = 0
+        self.errors = 0
+        self.last_error: str | None = None
+
+    @property
+    def age(self) -> float | None:
+        return time.time() - self._fetched_at if self._rates else None
+
+    async def _fetch(self) -> None:
+        """
+        get_exchange_rates() -> список объектов ExchangeRate (source, target, rate).
+        """
+        rates_list = await crypto_pay.get_exchange_rates()
+
+        new_map: Dict[Tuple[str, str], float] = {}
+        for r in rates_list:
+            src = getattr(r, "source", None)
+            tgt = getattr(r, "target", None)
+            rate = getattr(r, "rate", None)
+            if not src or not tgt or rate is None:
+                continue
+            try:
+                new_map[(str(src).upper(), str(tgt).upper())] = float(rate)
+            except Exception:
+                continue
+
+        if not new_map:
+            raise RuntimeError("empty exchange rates response")
+
+        self._rates, self._fetched_at = new_map, time.time()
+        self.refreshes += 1
+        self._notify()
+        try:
+            await write_json(
+                self.path,
+                {"fetched_at": self._fetched_at, "rates": [[s, t, v] for (s, t), v in new_map.items()]},
+            )
+        except Exception as e:
+            print(f"[rates] snapshot write failed: {type(e).__name__}: {e}")
+
+    def refresh(self) -> asyncio.Task:
+        """Single-flight обновление: параллельные вызовы ждут один запрос."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._fetch())
+            self._refreshing.add_done_callback(self._on_refreshed)
+        return self._refreshing
+
+    def _on_refreshed(self, task: asyncio.Task) -> None:
+        # ошибку забираем здесь: фоновое обновление из get_rates никто не ждёт
+        if task.cancelled() or task.exception() is None:
+            return
+        e = task.exception()
+        self.errors += 1
+        self.last_error = f"{type(e).__name__}: {e}"
+        print(f"[rates] refresh failed: {self.last_error}")
+
+    async def load_snapshot(self) -> None:
+        data = await read_json(self.path)
         try:
-            new_map[(str(src).upper(), str(tgt).upper())] = float(rate)
-        except Exception:
-            continue
+            rates = {(str(s), str(t)): float(v) for s, t, v in data.get("rates", [])}
+            fetched_at = float(data.get("fetched_at") or 0)
+        except (TypeError, ValueError):
+            return
+        if rates and fetched_at > self._fetched_at:
+            self._rates, self._fetched_at = rates, fetched_at
+            self._notify()
+
+    def subscribe(self, fn: Callable[[Dict[Tuple[str, str], float], float], None]) -> None:
+        """fn(rates, fetched_at) вызывается синхронно после каждой замены снимка."""
+        self._subscribers.append(fn)
+        if self._rates:
+            fn(self._rates, self._fetched_at)
+
+    def _notify(self) -> None:
+        for fn in self._subscribers:
+            try:
+                fn(self._rates, self._fetched_at)
+            except Exception as e:
+                print(f"[rates] subscriber failed: {type(e).__name__}: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.shield(self.refresh())
+                delay = self.refresh_interval
+            except Exception:
+                delay = min(5, self.refresh_interval)  # залогировано в _on_refreshed
+            await asyncio.sleep(delay)
+
+    async def start(self) -> None:
+        await self.load_snapshot()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get_rates(self) -> Dict[Tuple[str, str], float]:
+        if not self._rates:
+            # холодный старт без сохранённого снимка — единственный случай ожидания сети
+            await asyncio.shield(self.refresh())
+        elif self._task is None and self.age > self.refresh_interval:
+            # фоновая задача не запущена: обновляем, не задерживая читателя
+            self.refresh()
+
+        if self.age > self.max_stale:
+            raise RatesUnavailable(f"exchange rates are {self.age:.0f}s old (max {self.max_stale:.0f}s)")
+        return self._rates
+
+    async def get_rate(self, source: str, target: str) -> float:
+        """
+        Возвращает курс: 1 source = rate target.
+        Если прямого нет, пытается использовать обратный (инверсию).
+        """
+        src = source.upper()
+        tgt = target.upper()
+        rates = await self.get_rates()
+
+        direct = rates.get((src, tgt))
+        if direct is not None:
+            return direct
 
-    _rates = new_map
-    _cached_at = _now()
+        inverse = rates.get((tgt, src))
+        if inverse is not None and inverse != 0:
+            return 1.0 / inverse
 
+        raise RuntimeError(f"No exchange rate for {src}->{tgt}")
 
-async def get_rate(source: str, target: str) -> float:
-    """
-    Возвращает курс: 1 source = rate target.
-    Если прямого нет, пытается использовать обратный (инверсию).
-    """
-    src = source.upper()
-    tgt = target.upper()
+    def stats(self) -> dict:
+        age = self.age
+        return {
+            "pairs": len(self._rates),
+            "age_s": round(age, 1) if age is not None else None,
+            "stale": age is None or age > self.max_stale,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
 
-    async with _lock:
-        if (_now() - _cached_at) > _TTL_SECONDS or not _rates:
-            await _refresh_rates()
 
-        direct = _rates.get((src, tgt))
-        if direct is not None:
-            return direct
+rates_cache = RatesCache(refresh_interval=RATES_REFRESH_INTERVAL, max_stale=RATES_MAX_STALE)
+metrics.register("rates", rates_cache.stats)
 
-        inverse = _rates.get((tgt, src))
-        if inverse is not None and inverse != 0:
-            return 1.0 / inverse
 
-    raise RuntimeError(f"No exchange rate for {src}->{tgt}")
+async def get_rate(source: str, target: str) -> float:
+    return await rates_cache.get_rate(source, target)
 
 
 async def convert(amount: float, source: str, target: str) -> float:
@@ -79,4 +205,4 @@ def quantize_amount(amount: float, asset: str) -> float:
     else:
         q = Decimal("0.000001")  # запасной вариант
 
-    return float(Decimal(str(amount)).quantize(q, rounding=ROUND_HALF_UP))
\ No newline at end of file
+    return float(Decimal(str(amount)).quantize(q, rounding=ROUND_HALF_UP))
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict
+from typing import Any
+
+from bot.db.sqlite import SqliteDb
+from bot.payments.platega_orders import PendingPlategaOrder
+
+
+class SqlitePlategaOrders:
+    """Тот же интерфейс, что у PlategaOrders, поверх SQLite."""
+
+    def __init__(self, db: SqliteDb):
+        self.db = db
+
+    async def put(self, transaction_id: str, order: PendingPlategaOrder) -> None:
+        await self.db.run(
+            lambda conn: conn.execute(
+                """
+                INSERT INTO platega_orders (transaction_id, data, created_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (transaction_id) DO UPDATE
+                SET data = excluded.data, created_at = excluded.created_at
+                """,
+                (transaction_id, json.dumps(asdict(order), ensure_ascii=False), order.created_at),
+            )
+        )
+
+    async def pop(self, transaction_id: str) -> dict[str, Any] | None:
+        def tx(conn):
+            row = conn.execute(
+                "DELETE FROM platega_orders WHERE transaction_id = ? RETURNING data",
+                (transaction_id,),
+            ).fetchone()
+            return json.loads(row["data"]) if row else None
+
+        return await self.db.run(tx)
+
+    async def all(self) -> dict[str, dict[str, Any]]:
+        rows = await self.db.run(
+            lambda conn: conn.execute("SELECT transaction_id, data FROM platega_orders").fetchall()
+        )
+        return {row["transaction_id"]: json.loads(row["data"]) for row in rows}
+
+    async def expire_before(self, cutoff_iso: str) -> int:
+        return await self.db.run(
+            lambda conn: conn.execute(
+                "DELETE FROM platega_orders WHERE created_at < ?",
+                (cutoff_iso,),
+            ).rowcount
+        )
+
+    async def get(self, transaction_id: str) -> dict[str, Any] | None:
+        row = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT data FROM platega_orders WHERE transaction_id = ?",
+                (transaction_id,),
+            ).fetchone()
+        )
+        return json.loads(row["data"]) if row else None
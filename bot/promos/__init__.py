@@ -2,15 +2,35 @@ from pathlib import Path
 
 from bot.promos.service import PromoService
 from bot.promos.storage import JsonPromoStorage
+from bot.promos.catalog import PromoCatalog
+from bot.config import STORAGE_BACKEND, SQLITE_PATH, PROMO_NEGATIVE_TTL, PROMO_NEGATIVE_CACHE_SIZE
+from bot.utils import metrics
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
 
-# JSON fallback (временно / для test-режима)
-json_storage = JsonPromoStorage(
-    promos_path=str(DATA_DIR / "promos.json"),
-    usage_path=str(DATA_DIR / "promo_usage.json"),
+# Локальный fallback (JSON или SQLite — см. STORAGE_BACKEND)
+if STORAGE_BACKEND == "sqlite":
+    from bot.db.sqlite import get_sqlite_db
+    from bot.promos.sqlite_storage import SqlitePromoStorage
+
+    local_storage = SqlitePromoStorage(
+        get_sqlite_db(SQLITE_PATH),
+        seed_path=str(DATA_DIR / "promos.json"),
+    )
+else:
+    local_storage = JsonPromoStorage(
+        promos_path=str(DATA_DIR / "promos.json"),
+        usage_path=str(DATA_DIR / "promo_usage.json"),
+    )
+
+# каталог промокодов в памяти: get_promo не ходит ни в PG, ни на диск
+promo_catalog = PromoCatalog(
+    local_storage,
+    negative_ttl=PROMO_NEGATIVE_TTL,
+    negative_maxsize=PROMO_NEGATIVE_CACHE_SIZE,
 )
+metrics.register("promo_catalog", promo_catalog.stats)
 
 _pg_pool = None
 
@@ -22,35 +42,56 @@ def set_pg_pool(pool) -> None:
 
 class PromoStorageProxy:
     def __init__(self):
-        self._pg_storage = None
+        self._pg_storages = {}
 
-    def _pg(self):
+    def _pg(self, pool=None):
+        pool = pool or _pg_pool
+        if pool is None:
+            return None
         # Ленивая инициализация, чтобы в test-режиме вообще не трогать PG-код.
-        if self._pg_storage is None and _pg_pool is not None:
+        if pool not in self._pg_storages:
             from bot.promos.pg_storage import PgPromoStorage  # lazy import
-            self._pg_storage = PgPromoStorage(_pg_pool)
-        return self._pg_storage
+            self._pg_storages[pool] = PgPromoStorage(pool)
+        return self._pg_storages[pool]
 
     async def get_promo(self, code):
+        return await promo_catalog.get(code)
+
+    async def get_usage(self, code, user_id):
+        if _pg_pool is not None:
+            from bot.db import replica  # lazy import
+
+            # счётчики для показа/валидации терпят лаг реплики
+            return await replica.read(_pg_pool, lambda p: self._pg(p).get_usage(code, user_id))
+        return await local_storage.get_usage(code, user_id)
+
+    async def increment_usage(self, code, user_id, hold_id=None):
         pg = self._pg()
         if pg:
-            promo = await pg.get_promo(code)
-            if promo:
-                return promo
-        return await json_storage.get_promo(code)
+            await pg.increment_usage(code, user_id, hold_id)
+            return
+        await local_storage.increment_usage(code, user_id, hold_id)
 
-    async def get_usage(self, code):
+    async def reserve(self, code, user_id, hold_id, max_uses, per_user_limit, ttl_seconds):
+        # резерв — только primary: решение о лимите не должно зависеть от лага
         pg = self._pg()
-        if pg:
-            return await pg.get_usage(code)
-        return await json_storage.get_usage(code)
+        storage = pg if pg else local_storage
+        return await storage.reserve(code, user_id, hold_id, max_uses, per_user_limit, ttl_seconds)
 
-    async def increment_usage(self, code, user_id):
+    async def release(self, hold_id):
         pg = self._pg()
         if pg:
-            await pg.increment_usage(code, user_id)
+            await pg.release(hold_id)
             return
-        await json_storage.increment_usage(code, user_id)
+        await local_storage.release(hold_id)
+
+
+_storage_proxy = PromoStorageProxy()
+promo_service = PromoService(_storage_proxy)
 
 
-promo_service = PromoService(PromoStorageProxy())
+async def start_catalog(pg_cfg=None) -> None:
+    """Прогрев каталога на старте; pg_cfg — слушатель NOTIFY (только с PG)."""
+    await promo_catalog.load(_storage_proxy._pg())
+    if pg_cfg is not None and _pg_pool is not None:
+        promo_catalog.start_listener(pg_cfg)
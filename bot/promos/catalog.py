@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from bot.promos.model import PromoCode
+
+NOTIFY_CHANNEL = "promos_changed"
+
+
+class PromoCatalog:
+    """
+    Каталог промокодов в памяти процесса.
+
+    - на старте загружается целиком: из PG (если есть) и из локального
+      хранилища (promos.json / SQLite); PG приоритетнее, как раньше в прокси;
+    - PG-часть актуализируется по LISTEN promos_changed (триггер на promos,
+      migrations/0007): payload — код или '*' (перезагрузить всё);
+    - promos.json перечитывается при смене mtime (проверка не чаще раза в секунду);
+    - пока каталог полон и слушатель жив, неизвестный код — сразу None без запроса.
+      Если слушатель отвалился, промахи идут в PG через negative cache с TTL.
+    """
+
+    def __init__(
+        self,
+        local_storage: Any,
+        *,
+        negative_ttl: float = 300.0,
+        negative_maxsize: int = 50_000,
+        file_check_interval: float = 1.0,
+    ):
+        self.local_storage = local_storage
+        self.negative_ttl = negative_ttl
+        self.negative_maxsize = max(negative_maxsize, 1)
+        self.file_check_interval = file_check_interval
+
+        self._pg_storage = None
+        self._pg: dict[str, PromoCode] = {}
+        self._local: dict[str, PromoCode] = {}
+        self._negative: OrderedDict[str, float] = OrderedDict()
+
+        self.version = 0
+        self._pg_complete = False  # PG-часть загружена и изменения приходят по NOTIFY
+        self._reloading = False
+        self._pending: set[str] = set()
+
+        self._file_path: str | None = getattr(local_storage, "promos_path", None)
+        self._file_mtime: float | None = None
+        self._file_checked_at = 0.0
+
+        self._listen_cfg = None
+        self._listener_task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.lookups = 0  # промахи, ушедшие в хранилище
+
+    # --- чтение ---
+
+    @property
+    def complete(self) -> bool:
+        return self._pg_storage is None or self._pg_complete
+
+    async def get(self, code: str) -> PromoCode | None:
+        code = code.strip().upper()
+        await self._check_file()
+
+        promo = self._pg.get(code) or self._local.get(code)
+        if promo is not None:
+            self.hits += 1
+            return promo
+
+        if self.complete:
+            self.negative_hits += 1
+            return None
+
+        expires_at = self._negative.get(code)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                self.negative_hits += 1
+                return None
+            self._negative.pop(code, None)
+
+        self.lookups += 1
+        try:
+            promo = await self._pg_storage.get_promo(code)
+        except Exception:
+            promo = None
+
+        if promo is not None:
+            self._pg[code] = promo
+        else:
+            self._negative[code] = time.monotonic() + self.negative_ttl
+            while len(self._negative) > self.negative_maxsize:
+                self._negative.popitem(last=False)
+        return promo
+
+    # --- загрузка ---
+
+    async def load(self, pg_storage=None) -> None:
+        """Полная загрузка на старте (pg_storage=None — только локальный каталог)."""
+        self._pg_storage = pg_storage
+        await self._reload_local()
+        if pg_storage is not None:
+            try:
+                await self._reload_pg()
+            except Exception as e:
+                # каталог неполон — промахи пойдут в PG через negative cache
+                print(f"[promos] catalog preload from PG failed: {type(e).__name__}: {e}")
+
+    def invalidate(self) -> None:
+        """Для изменений в обход PG-триггера и mtime (например, импорт в SQLite)."""
+        self._file_mtime = None
+        self._file_checked_at = 0.0
+        self._negative.clear()
+        if self._pg_storage is not None:
+            self._spawn(self._reload_pg())
+
+    async def _reload_local(self) -> None:
+        if self._file_path is not None:
+            try:
+                self._file_mtime = os.stat(self._file_path).st_mtime
+            except OSError:
+                self._file_mtime = None
+        self._local = await self.local_storage.load_promos()
+        self._negative.clear()
+        self.version += 1
+
+    async def _check_file(self) -> None:
+        if self._file_path is None:
+            return
+        now = time.monotonic()
+        if now - self._file_checked_at < self.file_check_interval:
+            return
+        self._file_checked_at = now
+
+        try:
+            mtime = os.stat(self._file_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._file_mtime:
+            try:
+                await self._reload_local()
+            except Exception as e:
+                # файл правят руками — битый JSON не должен ронять проверку промокода
+                print(f"[promos] reload {self._file_path} failed: {type(e).__name__}: {e}")
+
+    async def _reload_pg(self) -> None:
+        self._reloading = True
+        try:
+            self._pg = await self._pg_storage.load_promos()
+            self._negative.clear()
+            self.version += 1
+        finally:
+            self._reloading = False
+
+        # изменения, пришедшие во время загрузки, могли в неё не попасть
+        pending, self._pending = self._pending, set()
+        for code in pending:
+            await self._refresh_code(code)
+
+    async def _refresh_code(self, code: str) -> None:
+        if self._reloading:
+            self._pending.add(code)
+            return
+
+        try:
+            promo = await self._pg_storage.get_promo(code)
+        except Exception:
+            # изменение не применилось: код читаем из PG, пока слушатель не переподключится
+            self._pg.pop(code, None)
+            self._pg_complete = False
+            raise
+        if promo is None:
+            self._pg.pop(code, None)
+        else:
+            self._pg[code] = promo
+        self._negative.pop(code, None)
+        self.version += 1
+
+    # --- LISTEN/NOTIFY ---
+
+    def start_listener(self, cfg) -> None:
+        """cfg — PgConfig: слушателю нужно своё соединение вне пула."""
+        self._listen_cfg = cfg
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    def _spawn(self, coro) -> None:
+        async def run() -> None:
+            try:
+                await coro
+            except Exception as e:
+                print(f"[promos] catalog refresh failed: {type(e).__name__}: {e}")
+        asyncio.create_task(run())
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        if payload == "*":
+            self._spawn(self._reload_pg())
+        else:
+            self._spawn(self._refresh_code(payload.strip().upper()))
+
+    async def _listen(self) -> None:
+        from bot.db.pool import connect  # lazy import
+
+        delay = 1.0
+        while True:
+            conn = None
+            try:
+                conn = await connect(self._listen_cfg)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _conn: lost.set())
+                await conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+
+                # подписались — теперь перезагрузка не пропустит изменений
+                await self._reload_pg()
+                self._pg_complete = True
+                delay = 1.0
+                print(f"[promos] catalog: {len(self._pg)} PG + {len(self._local)} local, listening")
+
+                await lost.wait()
+                print("[promos] catalog listener lost connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[promos] catalog listener error: {type(e).__name__}: {e}")
+            finally:
+                self._pg_complete = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "pg_codes": len(self._pg),
+            "local_codes": len(self._local),
+            "complete": self.complete,
+            "negative_size": len(self._negative),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "lookups": self.lookups,
+        }
@@ -0,0 +1,273 @@
+"""
+Массовая генерация промокодов по общему шаблону.
+
+    python -m bot.promos.generate --count 100000 --type percent --value 15 \\
+        --expires 2026-12-31T23:59:59 --products gpt_business_1m --max-uses 1 \\
+        --prefix SALE- --out sale_codes.txt
+
+Коды уникальны в пачке и относительно уже существующих (проверка в памяти
+до загрузки). Загрузка — одним COPY в одной транзакции (PG) или одной
+атомарной записью файла (JSON) / одной транзакцией (SQLite).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import sys
+import time
+from datetime import datetime, timezone
+
+from bot.data.products import get_product
+from bot.promos.model import PromoCode, PromoType
+
+# 32 символа без 0/O/1/I: младшие 5 бит байта → символ без смещения распределения
+ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+_BYTE_TO_CHAR = bytes(ord(ALPHABET[b & 31]) for b in range(256))
+
+_PROMO_COLUMNS = [
+    "code", "type", "value", "active", "expires_at", "max_uses", "per_user_limit", "allowed_products",
+]
+
+
+def generate_codes(count: int, *, length: int = 10, prefix: str = "", existing=frozenset()) -> list[str]:
+    """count уникальных кодов prefix + length случайных символов, не пересекающихся с existing."""
+    # не больше ~1% заполнения пространства — иначе коды легко подобрать перебором
+    if len(ALPHABET) ** length < count * 100:
+        raise ValueError(f"length={length} слишком мал для {count} кодов")
+
+    prefix = prefix.upper()
+    seen: set[str] = set()
+    codes: list[str] = []
+    while len(codes) < count:
+        need = count - len(codes)
+        raw = secrets.token_bytes(need * length).translate(_BYTE_TO_CHAR).decode("ascii")
+        for i in range(0, need * length, length):
+            code = prefix + raw[i:i + length]
+            if code in seen or code in existing:
+                continue
+            seen.add(code)
+            codes.append(code)
+    return codes
+
+
+def build_promos(codes: list[str], template: PromoCode) -> list[PromoCode]:
+    return [
+        PromoCode(
+            code=code,
+            type=template.type,
+            value=template.value,
+            active=template.active,
+            expires_at=template.expires_at,
+            max_uses=template.max_uses,
+            per_user_limit=template.per_user_limit,
+            allowed_products=template.allowed_products,
+        )
+        for code in codes
+    ]
+
+
+# --- PostgreSQL ---
+
+async def pg_existing_codes(conn) -> set[str]:
+    return {r["code"] for r in await conn.fetch("SELECT code FROM promos")}
+
+
+async def load_pg(conn, promos: list[PromoCode]) -> None:
+    # COPY в транзакции: дубликат (гонка с другим импортом) откатывает всю пачку;
+    # триггер каталога шлёт один NOTIFY '*' на весь COPY
+    records = [
+        (
+            p.code,
+            p.type.value,
+            p.value,
+            p.active,
+            p.expires_at.replace(tzinfo=timezone.utc) if p.expires_at else None,
+            p.max_uses,
+            p.per_user_limit,
+            list(p.allowed_products) if p.allowed_products is not None else None,
+        )
+        for p in promos
+    ]
+    async with conn.transaction():
+        await conn.copy_records_to_table("promos", records=records, columns=_PROMO_COLUMNS)
+
+
+# --- JSON ---
+
+def _read_promos_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    # строго: битый файл не перезаписываем только новыми кодами
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def json_existing_codes(path: str) -> set[str]:
+    return {code.strip().upper() for code in _read_promos_json(path)}
+
+
+def load_json(path: str, promos: list[PromoCode]) -> None:
+    from bot.utils.files import write_json_sync
+
+    data = _read_promos_json(path)
+    for p in promos:
+        data[p.code] = {
+            "type": p.type.value,
+            "value": p.value,
+            "active": p.active,
+            "expires_at": p.expires_at.isoformat() if p.expires_at else None,
+            "max_uses": p.max_uses,
+            "per_user_limit": p.per_user_limit,
+            "allowed_products": list(p.allowed_products) if p.allowed_products is not None else None,
+        }
+    # tmp + rename: бот видит либо старый файл, либо новый целиком (и перечитает по mtime)
+    write_json_sync(path, data, indent=2)
+
+
+# --- SQLite ---
+
+def sqlite_existing_codes(conn) -> set[str]:
+    return {row[0] for row in conn.execute("SELECT code FROM promos")}
+
+
+def load_sqlite(conn, promos: list[PromoCode]) -> None:
+    with conn:
+        conn.executemany(
+            f"INSERT INTO promos ({', '.join(_PROMO_COLUMNS)}) VALUES ({', '.join('?' * len(_PROMO_COLUMNS))})",
+            [
+                (
+                    p.code,
+                    p.type.value,
+                    p.value,
+                    1 if p.active else 0,
+                    p.expires_at.isoformat() if p.expires_at else None,
+                    p.max_uses,
+                    p.per_user_limit,
+                    json.dumps(list(p.allowed_products)) if p.allowed_products is not None else None,
+                )
+                for p in promos
+            ],
+        )
+
+
+# --- CLI ---
+
+def _template(args: argparse.Namespace) -> PromoCode:
+    products = None
+    if args.products:
+        products = [p.strip() for p in args.products.split(",") if p.strip()]
+        unknown = [p for p in products if get_product(p) is None]
+        if unknown:
+            raise SystemExit(f"неизвестные товары: {', '.join(unknown)}")
+
+    expires_at = None
+    if args.expires:
+        # как в promos.json: naive UTC
+        expires_at = datetime.fromisoformat(args.expires)
+        if expires_at.tzinfo is not None:
+            expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return PromoCode(
+        code="",
+        type=PromoType(args.type),
+        value=args.value,
+        active=not args.inactive,
+        expires_at=expires_at,
+        max_uses=args.max_uses,
+        per_user_limit=args.per_user,
+        allowed_products=products,
+    )
+
+
+async def _run(args: argparse.Namespace) -> None:
+    template = _template(args)
+    started = time.perf_counter()
+
+    if args.target == "pg":
+        from bot.db.pool import PgConfig, connect
+
+        conn = await connect(PgConfig.from_env())
+        try:
+            existing = await pg_existing_codes(conn)
+            codes = generate_codes(args.count, length=args.length, prefix=args.prefix, existing=existing)
+            generated = time.perf_counter()
+            if not args.dry_run:
+                await load_pg(conn, build_promos(codes, template))
+        finally:
+            await conn.close()
+    elif args.target == "sqlite":
+        import sqlite3
+        from bot.config import SQLITE_PATH
+        from bot.db.sqlite import SCHEMA
+
+        conn = sqlite3.connect(SQLITE_PATH)
+        try:
+            conn.executescript(SCHEMA)
+            existing = sqlite_existing_codes(conn)
+            codes = generate_codes(args.count, length=args.length, prefix=args.prefix, existing=existing)
+            generated = time.perf_counter()
+            if not args.dry_run:
+                load_sqlite(conn, build_promos(codes, template))
+        finally:
+            conn.close()
+    else:
+        existing = json_existing_codes(args.json_path)
+        codes = generate_codes(args.count, length=args.length, prefix=args.prefix, existing=existing)
+        generated = time.perf_counter()
+        if not args.dry_run:
+            load_json(args.json_path, build_promos(codes, template))
+
+    loaded = time.perf_counter()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write("\n".join(codes) + "\n")
+
+    print(
+        f"[promos] {len(codes)} codes → {args.target}"
+        f"{' (dry run)' if args.dry_run else ''}: "
+        f"generate {generated - started:.2f}s, load {loaded - generated:.2f}s"
+    )
+    if args.target == "sqlite" and not args.dry_run:
+        print("[promos] SQLite: запущенный бот увидит новые коды после перезапуска")
+
+
+def main() -> None:
+    from bot.config import IS_PROD, STORAGE_BACKEND
+
+    parser = argparse.ArgumentParser(prog="python -m bot.promos.generate")
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--type", choices=[t.value for t in PromoType], required=True)
+    parser.add_argument("--value", type=int, required=True)
+    parser.add_argument("--expires", help="ISO-дата/время окончания (UTC)")
+    parser.add_argument("--products", help="id товаров через запятую (по умолчанию — любые)")
+    parser.add_argument("--max-uses", type=int, default=1, help="лимит на код (по умолчанию одноразовые)")
+    parser.add_argument("--per-user", type=int, default=None)
+    parser.add_argument("--inactive", action="store_true", help="создать выключенными")
+    parser.add_argument("--prefix", default="")
+    parser.add_argument("--length", type=int, default=10, help="случайная часть кода")
+    parser.add_argument(
+        "--target",
+        choices=["pg", "json", "sqlite"],
+        default="pg" if IS_PROD else STORAGE_BACKEND,
+    )
+    parser.add_argument("--json-path", default="data/promos.json")
+    parser.add_argument("--out", help="файл со списком кодов (по одному в строке)")
+    parser.add_argument("--dry-run", action="store_true", help="только сгенерировать")
+    args = parser.parse_args()
+
+    if args.count <= 0:
+        raise SystemExit("--count must be positive")
+
+    try:
+        asyncio.run(_run(args))
+    except ValueError as e:
+        print(f"[promos] {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
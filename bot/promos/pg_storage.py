@@ -5,33 +5,86 @@ from typing import Optional
 
 import asyncpg
 
+from bot.db.statements import sql
 from bot.promos.model import PromoCode, PromoType
 
+_GET_PROMO_SQL = sql("promos.get", """
+SELECT
+    code,
+    type,
+    value,
+    active,
+    expires_at,
+    max_uses,
+    per_user_limit,
+    allowed_products
+FROM promos
+WHERE code = $1
+""")
+
+# total — из счётчика (migrations/0005), по пользователю — index-only scan
+# по (promo_code, user_id): стоимость не растёт с числом использований кода
+_GET_USAGE_SQL = sql("promos.get_usage", """
+SELECT
+    COALESCE((SELECT total_uses FROM promo_usage_totals WHERE promo_code = $1), 0) AS total_uses,
+    (SELECT count(*) FROM promo_usages WHERE promo_code = $1 AND user_id = $2) AS user_uses
+""")
+
+# весь каталог — прогрев PromoCatalog на старте и перезагрузка по NOTIFY '*'
+_LOAD_ALL_SQL = """
+SELECT code, type, value, active, expires_at, max_uses, per_user_limit, allowed_products
+FROM promos
+"""
+
+# использование + коммит резерва (если был) одним statement
+_INCREMENT_USAGE_SQL = sql("promos.increment_usage", """
+WITH held AS (
+    DELETE FROM promo_reservations
+    WHERE hold_id = $4::uuid
+    RETURNING promo_code
+), unreserve AS (
+    UPDATE promo_usage_totals t
+    SET reserved = greatest(t.reserved - 1, 0)
+    FROM held
+    WHERE t.promo_code = held.promo_code
+)
+INSERT INTO promo_usages (promo_code, user_id, used_at)
+VALUES ($1, $2, $3)
+""")
+
+# проверка лимитов + резерв (migrations/0006_promo_reservations.sql)
+_RESERVE_SQL = sql("promos.reserve", "SELECT promo_reserve($1, $2, $3, $4, $5, $6)")
+
+_RELEASE_SQL = sql("promos.release", """
+WITH held AS (
+    DELETE FROM promo_reservations
+    WHERE hold_id = $1
+    RETURNING promo_code
+)
+UPDATE promo_usage_totals t
+SET reserved = greatest(t.reserved - 1, 0)
+FROM held
+WHERE t.promo_code = held.promo_code
+""")
+
 
 class PgPromoStorage:
     def __init__(self, pool: asyncpg.Pool):
         self.pool = pool
 
     async def get_promo(self, code: str) -> Optional[PromoCode]:
-        sql = """
-        SELECT
-            code,
-            type,
-            value,
-            active,
-            expires_at,
-            max_uses,
-            per_user_limit,
-            allowed_products
-        FROM promos
-        WHERE code = $1
-        """
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(sql, code.upper())
+            row = await conn.fetchrow(_GET_PROMO_SQL, code.upper())
 
-        if not row:
-            return None
+        return self._to_promo(row) if row else None
+
+    async def load_promos(self) -> dict[str, PromoCode]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(_LOAD_ALL_SQL)
+        return {row["code"]: self._to_promo(row) for row in rows}
 
+    @staticmethod
+    def _to_promo(row) -> PromoCode:
         return PromoCode(
             code=row["code"],
             type=PromoType(row["type"]),
@@ -43,31 +96,43 @@ class PgPromoStorage:
             allowed_products=row["allowed_products"],
         )
 
-    async def get_usage(self, code: str) -> dict:
-        sql = """
-        SELECT user_id
-        FROM promo_usages
-        WHERE promo_code = $1
-        """
+    async def get_usage(self, code: str, user_id: int) -> tuple[int, int]:
+        """(всего использований, использований этим пользователем)"""
         async with self.pool.acquire() as conn:
-            rows = await conn.fetch(sql, code.upper())
+            row = await conn.fetchrow(_GET_USAGE_SQL, code.upper(), user_id)
 
-        usage = {"total_uses": len(rows), "users": {}}
-        for r in rows:
-            uid = str(r["user_id"])
-            usage["users"][uid] = usage["users"].get(uid, 0) + 1
+        return int(row["total_uses"]), int(row["user_uses"])
 
-        return usage
-
-    async def increment_usage(self, code: str, user_id: int) -> None:
-        sql = """
-        INSERT INTO promo_usages (promo_code, user_id, used_at)
-        VALUES ($1, $2, $3)
-        """
+    async def increment_usage(self, code: str, user_id: int, hold_id: str | None = None) -> None:
         async with self.pool.acquire() as conn:
             await conn.execute(
-                sql,
+                _INCREMENT_USAGE_SQL,
                 code.upper(),
                 user_id,
                 datetime.now(timezone.utc),
+                hold_id,
             )
+
+    async def reserve(
+        self,
+        code: str,
+        user_id: int,
+        hold_id: str,
+        max_uses: int | None,
+        per_user_limit: int | None,
+        ttl_seconds: int,
+    ) -> bool:
+        async with self.pool.acquire() as conn:
+            return bool(await conn.fetchval(
+                _RESERVE_SQL,
+                code.upper(),
+                user_id,
+                hold_id,
+                max_uses,
+                per_user_limit,
+                ttl_seconds,
+            ))
+
+    async def release(self, hold_id: str) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(_RELEASE_SQL, hold_id)
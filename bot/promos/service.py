@@ -22,22 +22,23 @@ class PromoService:
             raise PromoError("Промокод неактивен")
 
         if promo.expires_at is not None:
-            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            # promos.json хранит naive UTC, PG (timestamptz) отдаёт aware
+            now = datetime.now(timezone.utc)
+            if promo.expires_at.tzinfo is None:
+                now = now.replace(tzinfo=None)
             if promo.expires_at < now:
                 raise PromoError("Срок действия промокода истёк")
 
         if promo.allowed_products is not None and product.id not in promo.allowed_products:
             raise PromoError("Промокод не подходит для этого товара")
 
-        usage = await self.storage.get_usage(promo.code)
+        total_uses, user_uses = await self.storage.get_usage(promo.code, user_id)
 
-        if promo.max_uses is not None and int(usage.get("total_uses", 0)) >= int(promo.max_uses):
+        if promo.max_uses is not None and total_uses >= int(promo.max_uses):
             raise PromoError("Лимит использований промокода исчерпан")
 
-        if promo.per_user_limit is not None:
-            user_count = int(usage.get("users", {}).get(str(user_id), 0))
-            if user_count >= int(promo.per_user_limit):
-                raise PromoError("Вы уже использовали этот промокод")
+        if promo.per_user_limit is not None and user_uses >= int(promo.per_user_limit):
+            raise PromoError("Вы уже использовали этот промокод")
 
         return promo
 
@@ -70,5 +71,27 @@ class PromoService:
             description=desc,
         )
 
-    async def mark_used(self, code: str, user_id: int) -> None:
-        await self.storage.increment_usage(code, user_id)
+    async def reserve(self, code: str, user_id: int, hold_id: str, ttl_seconds: int) -> bool:
+        """
+        Резерв слота под платёж (атомарно с проверкой лимитов).
+        False — у кода нет лимитов, резерв не нужен; PromoError — лимит исчерпан.
+        """
+        promo = await self.storage.get_promo(code)
+        if not promo:
+            raise PromoError("Промокод не найден")
+
+        if promo.max_uses is None and promo.per_user_limit is None:
+            return False
+
+        ok = await self.storage.reserve(
+            promo.code, user_id, hold_id, promo.max_uses, promo.per_user_limit, ttl_seconds
+        )
+        if not ok:
+            raise PromoError("Лимит использований промокода исчерпан")
+        return True
+
+    async def release(self, hold_id: str) -> None:
+        await self.storage.release(hold_id)
+
+    async def mark_used(self, code: str, user_id: int, hold_id: str | None = None) -> None:
+        await self.storage.increment_usage(code, user_id, hold_id)
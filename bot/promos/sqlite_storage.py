@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from bot.db.sqlite import SqliteDb
+from bot.promos.model import PromoCode, PromoType
+from bot.promos.storage import _parse_dt
+
+
+class SqlitePromoStorage:
+    """
+    Промокоды и их использования в SQLite.
+
+    Если таблица promos пуста, при первом обращении в неё импортируется
+    promos.json (seed_path) — чтобы test-режим работал с теми же кодами.
+    """
+
+    def __init__(self, db: SqliteDb, seed_path: str | None = None):
+        self.db = db
+        self.seed_path = seed_path
+        self._seeded = False
+
+    async def _ensure_seeded(self) -> None:
+        if self._seeded:
+            return
+
+        def tx(conn):
+            if conn.execute("SELECT 1 FROM promos LIMIT 1").fetchone():
+                return
+            if not self.seed_path or not os.path.exists(self.seed_path):
+                return
+            with open(self.seed_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO promos
+                    (code, type, value, active, expires_at, max_uses, per_user_limit, allowed_products)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        code.strip().upper(),
+                        p["type"],
+                        int(p["value"]),
+                        1 if p.get("active", True) else 0,
+                        p.get("expires_at") or None,
+                        p.get("max_uses"),
+                        p.get("per_user_limit"),
+                        json.dumps(p["allowed_products"]) if p.get("allowed_products") is not None else None,
+                    )
+                    for code, p in raw.items()
+                ],
+            )
+
+        await self.db.run(tx)
+        self._seeded = True
+
+    async def get_promo(self, code: str) -> Optional[PromoCode]:
+        code = code.strip().upper()
+        await self._ensure_seeded()
+
+        row = await self.db.run(
+            lambda conn: conn.execute("SELECT * FROM promos WHERE code = ?", (code,)).fetchone()
+        )
+        return self._to_promo(row) if row else None
+
+    async def load_promos(self) -> dict[str, PromoCode]:
+        await self._ensure_seeded()
+
+        rows = await self.db.run(lambda conn: conn.execute("SELECT * FROM promos").fetchall())
+        return {row["code"]: self._to_promo(row) for row in rows}
+
+    @staticmethod
+    def _to_promo(row) -> PromoCode:
+        return PromoCode(
+            code=row["code"],
+            type=PromoType(row["type"]),
+            value=int(row["value"]),
+            active=bool(row["active"]),
+            expires_at=_parse_dt(row["expires_at"]),
+            max_uses=row["max_uses"],
+            per_user_limit=row["per_user_limit"],
+            allowed_products=json.loads(row["allowed_products"]) if row["allowed_products"] else None,
+        )
+
+    async def get_usage(self, code: str, user_id: int) -> tuple[int, int]:
+        """(всего использований, использований этим пользователем)"""
+        code = code.strip().upper()
+
+        row = await self.db.run(
+            lambda conn: conn.execute(
+                """
+                SELECT
+                    COALESCE((SELECT total_uses FROM promo_usage_totals WHERE promo_code = ?), 0) AS total_uses,
+                    (SELECT COUNT(*) FROM promo_usages WHERE promo_code = ? AND user_id = ?) AS user_uses
+                """,
+                (code, code, user_id),
+            ).fetchone()
+        )
+
+        return int(row["total_uses"]), int(row["user_uses"])
+
+    async def increment_usage(self, code: str, user_id: int, hold_id: str | None = None) -> None:
+        code = code.strip().upper()
+        used_at = datetime.now(timezone.utc).isoformat()
+
+        def tx(conn):
+            if hold_id is not None:
+                conn.execute("DELETE FROM promo_reservations WHERE hold_id = ?", (hold_id,))
+            conn.execute(
+                "INSERT INTO promo_usages (promo_code, user_id, used_at) VALUES (?, ?, ?)",
+                (code, user_id, used_at),
+            )
+
+        await self.db.run(tx)
+
+    async def reserve(
+        self,
+        code: str,
+        user_id: int,
+        hold_id: str,
+        max_uses: int | None,
+        per_user_limit: int | None,
+        ttl_seconds: int,
+    ) -> bool:
+        code = code.strip().upper()
+        now = time.time()
+
+        # db.run — транзакция BEGIN IMMEDIATE: проверка и резерв не пересекаются с другими
+        def tx(conn) -> bool:
+            extended = conn.execute(
+                "UPDATE promo_reservations SET expires_at = MAX(expires_at, ?) WHERE hold_id = ? AND expires_at > ?",
+                (now + ttl_seconds, hold_id, now),
+            )
+            if extended.rowcount:
+                return True
+
+            conn.execute(
+                "DELETE FROM promo_reservations WHERE promo_code = ? AND expires_at <= ?",
+                (code, now),
+            )
+
+            if max_uses is not None:
+                row = conn.execute(
+                    """
+                    SELECT
+                        COALESCE((SELECT total_uses FROM promo_usage_totals WHERE promo_code = ?), 0)
+                      + (SELECT COUNT(*) FROM promo_reservations WHERE promo_code = ?)
+                    """,
+                    (code, code),
+                ).fetchone()
+                if row[0] >= int(max_uses):
+                    return False
+
+            if per_user_limit is not None:
+                row = conn.execute(
+                    """
+                    SELECT
+                        (SELECT COUNT(*) FROM promo_usages WHERE promo_code = ? AND user_id = ?)
+                      + (SELECT COUNT(*) FROM promo_reservations WHERE promo_code = ? AND user_id = ?)
+                    """,
+                    (code, user_id, code, user_id),
+                ).fetchone()
+                if row[0] >= int(per_user_limit):
+                    return False
+
+            conn.execute(
+                "INSERT OR REPLACE INTO promo_reservations (hold_id, promo_code, user_id, expires_at) VALUES (?, ?, ?, ?)",
+                (hold_id, code, user_id, now + ttl_seconds),
+            )
+            return True
+
+        return await self.db.run(tx)
+
+    async def release(self, hold_id: str) -> None:
+        await self.db.run(
+            lambda conn: conn.execute("DELETE FROM promo_reservations WHERE hold_id = ?", (hold_id,))
+        )
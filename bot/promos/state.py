@@ -7,6 +7,7 @@ class PromoState:
     promo_code: Optional[str] = None
     final_price_rub: Optional[int] = None
     discount_rub: Optional[int] = None
+    hold_id: Optional[str] = None  # резерв последнего неоплаченного платежа этого выбора
 
 
 # выбранный промокод по пользователю (память процесса)
@@ -1,11 +1,11 @@
 import asyncio
-import json
-import os
+import time
 from dataclasses import asdict
 from datetime import datetime
 from typing import Any, Optional
 
 from bot.promos.model import PromoCode, PromoType
+from bot.utils.files import read_json, write_json
 
 
 def _parse_dt(value: Any) -> Optional[datetime]:
@@ -20,33 +20,38 @@ class JsonPromoStorage:
         self.promos_path = promos_path
         self.usage_path = usage_path
         self._lock = asyncio.Lock()
+        # promo_usage.json пишем только мы — держим в памяти после первого чтения
+        self._usage: dict | None = None
+        # резервы: hold_id → (code, user_id, monotonic-дедлайн); один процесс — память достаточна
+        self._holds: dict[str, tuple[str, int, float]] = {}
 
-    def _read_json(self, path: str) -> dict:
-        if not os.path.exists(path):
-            return {}
-        with open(path, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-
-
-    def _atomic_write_json(self, path: str, data: dict) -> None:
-        tmp = f"{path}.tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, path)
+    async def _read_usage(self) -> dict:
+        if self._usage is None:
+            self._usage = await read_json(self.usage_path)
+        return self._usage
 
     async def get_promo(self, code: str) -> Optional[PromoCode]:
         code = code.strip().upper()
-        async with self._lock:
-            all_promos = self._read_json(self.promos_path)
+        # promos.json правят руками — читаем с диска (в файловом потоке)
+        all_promos = await read_json(self.promos_path)
 
         raw = all_promos.get(code)
 
         if not raw:
             return None
 
+        return self._to_promo(code, raw)
+
+    async def load_promos(self) -> dict[str, PromoCode]:
+        all_promos = await read_json(self.promos_path)
+        return {
+            code.strip().upper(): self._to_promo(code.strip().upper(), raw)
+            for code, raw in all_promos.items()
+            if raw
+        }
+
+    @staticmethod
+    def _to_promo(code: str, raw: dict) -> PromoCode:
         return PromoCode(
             code=code,
             type=PromoType(raw["type"]),
@@ -58,20 +63,70 @@ class JsonPromoStorage:
             allowed_products=raw.get("allowed_products"),
         )
 
-    async def get_usage(self, code: str) -> dict:
+    async def get_usage(self, code: str, user_id: int) -> tuple[int, int]:
+        """(всего использований, использований этим пользователем)"""
         code = code.strip().upper()
         async with self._lock:
-            usage = self._read_json(self.usage_path)
-            return usage.get(code, {"total_uses": 0, "users": {}})
+            usage = await self._read_usage()
+            entry = usage.get(code, {})
+            return int(entry.get("total_uses", 0)), int(entry.get("users", {}).get(str(user_id), 0))
 
-    async def increment_usage(self, code: str, user_id: int) -> None:
+    async def reserve(
+        self,
+        code: str,
+        user_id: int,
+        hold_id: str,
+        max_uses: int | None,
+        per_user_limit: int | None,
+        ttl_seconds: int,
+    ) -> bool:
+        code = code.strip().upper()
+        now = time.monotonic()
+
+        async with self._lock:
+            hold = self._holds.get(hold_id)
+            if hold is not None and hold[2] > now:
+                self._holds[hold_id] = (hold[0], hold[1], max(hold[2], now + ttl_seconds))
+                return True
+
+            self._holds = {h: v for h, v in self._holds.items() if v[2] > now}
+            held = [v for v in self._holds.values() if v[0] == code]
+
+            usage = await self._read_usage()
+            entry = usage.get(code, {})
+
+            if max_uses is not None and int(entry.get("total_uses", 0)) + len(held) >= int(max_uses):
+                return False
+
+            if per_user_limit is not None:
+                user_uses = int(entry.get("users", {}).get(str(user_id), 0))
+                user_uses += sum(1 for v in held if v[1] == user_id)
+                if user_uses >= int(per_user_limit):
+                    return False
+
+            self._holds[hold_id] = (code, user_id, now + ttl_seconds)
+            return True
+
+    async def release(self, hold_id: str) -> None:
+        async with self._lock:
+            self._holds.pop(hold_id, None)
+
+    async def increment_usage(self, code: str, user_id: int, hold_id: str | None = None) -> None:
         code = code.strip().upper()
         uid = str(user_id)
 
         async with self._lock:
-            usage = self._read_json(self.usage_path)
+            if hold_id is not None:
+                self._holds.pop(hold_id, None)
+            usage = await self._read_usage()
             entry = usage.get(code, {"total_uses": 0, "users": {}})
-            entry["total_uses"] = int(entry.get("total_uses", 0)) + 1
-            entry["users"][uid] = int(entry["users"].get(uid, 0)) + 1
-            usage[code] = entry
-            self._atomic_write_json(self.usage_path, usage)
+            users = entry.get("users", {})
+            # copy-on-write: снапшот, отданный на запись, не меняется
+            usage[code] = {
+                "total_uses": int(entry.get("total_uses", 0)) + 1,
+                "users": {**users, uid: int(users.get(uid, 0)) + 1},
+            }
+            written = write_json(self.usage_path, dict(usage))
+
+        # подряд идущие записи одного файла сливаются в одну
+        await written
@@ -1,33 +1,127 @@
-import aiohttp
+import asyncio
+import random
+import time
+from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
-from bot.config import load_config
+import aiohttp
+
+from bot.config import load_config, PLATEGA_BASE_URL
+from bot.utils import metrics
 
 cfg = load_config()
 
 
+@dataclass(frozen=True)
+class CallPolicy:
+    """Таймауты (секунды) и ретраи одного типа вызова."""
+
+    connect: float
+    read: float
+    total: float
+    retries: int = 0  # только для идемпотентных запросов
+    backoff: float = 0.3  # база экспоненциальной паузы, с full jitter
+
+
+# создание платежа не повторяем (не идемпотентно) и ждём дольше;
+# статус — короткие таймауты и пара повторов
+CREATE_POLICY = CallPolicy(connect=3, read=20, total=25)
+STATUS_POLICY = CallPolicy(connect=2, read=5, total=8, retries=2)
+
+
+class RetryBudget:
+    """
+    Повторы — не больше ratio от числа запросов (плюс небольшой запас):
+    при деградации upstream ретраи не умножают на него нагрузку.
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = reserve
+
+    def on_request(self) -> None:
+        self._tokens = min(self._tokens + self.ratio, self.reserve)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class PlategaError(RuntimeError):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        # сеть/таймаут (status=None), 429 и 5xx — повторяем; прочие 4xx — нет
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
 class PlategaClient:
     """
     Platega API:
     - POST /transaction/process
     - GET  /transaction/{id}
-    Base URL: https://app.platega.io/  
-    """
+    Base URL: PLATEGA_BASE_URL (по умолчанию https://app.platega.io)
 
-    BASE_URL = "https://app.platega.io"
+    Одна сессия на процесс: пул соединений с лимитом на хост, keep-alive
+    и DNS-кэш; таймауты и ретраи — по типу вызова (CallPolicy); задержки
+    по эндпоинтам — в метриках (platega_http).
+    """
 
-    def __init__(self, merchant_id: str, secret: str):
+    def __init__(
+        self,
+        merchant_id: str,
+        secret: str,
+        *,
+        base_url: str = PLATEGA_BASE_URL,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30,
+        dns_ttl: int = 300,
+        create_policy: CallPolicy = CREATE_POLICY,
+        status_policy: CallPolicy = STATUS_POLICY,
+        retry_budget: RetryBudget | None = None,
+    ):
         self.merchant_id = merchant_id
         self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.create_policy = create_policy
+        self.status_policy = status_policy
+        self.retry_budget = retry_budget or RetryBudget()
+
         self._session: Optional[aiohttp.ClientSession] = None
+        self._latency = {"create": metrics.LatencyHistogram(), "status": metrics.LatencyHistogram()}
+        self._errors = {"create": 0, "status": 0}
+        self.retries = 0
+        self.retries_denied = 0
 
     async def _get_session(self) -> aiohttp.ClientSession:
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30)
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_ttl,
             )
+            # таймауты задаются на каждый запрос (CallPolicy)
+            self._session = aiohttp.ClientSession(connector=connector)
         return self._session
 
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     def _headers(self) -> Dict[str, str]:
         return {
             "X-MerchantId": self.merchant_id,
@@ -35,6 +129,41 @@ class PlategaClient:
             "Content-Type": "application/json",
         }
 
+    async def _request(self, endpoint: str, policy: CallPolicy, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        s = await self._get_session()
+        url = f"{self.base_url}{path}"
+        timeout = aiohttp.ClientTimeout(total=policy.total, sock_connect=policy.connect, sock_read=policy.read)
+
+        self.retry_budget.on_request()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                async with s.request(method, url, headers=self._headers(), timeout=timeout, **kwargs) as r:
+                    # классифицируем по HTTP-статусу до разбора тела: тело ошибки может быть не JSON
+                    if r.status >= 400:
+                        body = await r.text(errors="replace")
+                        raise PlategaError(f"Platega {endpoint} error {r.status}: {body[:500]}", r.status)
+                    return await r.json(content_type=None)
+            except PlategaError as e:
+                err = e
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                err = PlategaError(f"Platega {endpoint} error: {type(e).__name__}: {e}")
+                err.__cause__ = e
+            finally:
+                self._latency[endpoint].observe((time.perf_counter() - started) * 1000)
+
+            self._errors[endpoint] += 1
+            if not err.retryable or attempt >= policy.retries:
+                raise err
+            if not self.retry_budget.try_spend():
+                self.retries_denied += 1
+                raise err
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, policy.backoff * 2 ** attempt))
+
     async def create_sbp_payment(
         self,
         amount_rub: int,
@@ -44,8 +173,6 @@ class PlategaClient:
         failed_url: str,
         payment_method: int = 2,
     ) -> Dict[str, Any]:
-        s = await self._get_session()
-        url = f"{self.BASE_URL}/transaction/process"
         body = {
             "paymentMethod": payment_method,
             "paymentDetails": {"amount": int(amount_rub), "currency": "RUB"},
@@ -54,21 +181,22 @@ class PlategaClient:
             "failedUrl": failed_url,
             "payload": payload,
         }
-
-        async with s.post(url, headers=self._headers(), json=body) as r:
-            data = await r.json(content_type=None)
-            if r.status >= 400:
-                raise RuntimeError(f"Platega create error {r.status}: {data}")
-            return data  # transactionId, redirect, status, expiresIn... 
+        # transactionId, redirect, status, expiresIn...
+        return await self._request("create", self.create_policy, "POST", "/transaction/process", json=body)
 
     async def get_transaction(self, transaction_id: str) -> Dict[str, Any]:
-        s = await self._get_session()
-        url = f"{self.BASE_URL}/transaction/{transaction_id}"
-        async with s.get(url, headers=self._headers()) as r:
-            data = await r.json(content_type=None)
-            if r.status >= 400:
-                raise RuntimeError(f"Platega status error {r.status}: {data}")
-            return data  # status, qr, paymentDetails... 
+        # status, qr, paymentDetails...
+        return await self._request("status", self.status_policy, "GET", f"/transaction/{transaction_id}")
+
+    def stats(self) -> dict:
+        return {
+            "latency": {name: h.snapshot() for name, h in self._latency.items()},
+            "errors": dict(self._errors),
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "retry_budget": round(self.retry_budget.tokens, 2),
+        }
 
 
 platega_pay = PlategaClient(cfg.platega_merchant_id, cfg.platega_secret)
+metrics.register("platega_http", platega_pay.stats)
@@ -1,9 +1,49 @@
 from pathlib import Path
 from bot.users.storage import JsonUserStorage
+from bot.users.cache import ProfileCache
 from bot.users.service import UserService
+from bot.users.tracker import UserTracker
+from bot.users.replay import ReplayLog
+from bot.db.breaker import CircuitBreaker
+from bot.config import (
+    USER_TRACK_FLUSH_MS,
+    USER_TRACK_BATCH,
+    STORAGE_BACKEND,
+    SQLITE_PATH,
+    PROFILE_CACHE_SIZE,
+    PROFILE_CACHE_TTL,
+    PG_BREAKER_FAILURES,
+    PG_BREAKER_RESET,
+    PG_BREAKER_CALL_TIMEOUT,
+)
+from bot.utils import metrics
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
 
-user_storage = JsonUserStorage(str(DATA_DIR / "users.json"))
-user_service = UserService(user_storage)
+if STORAGE_BACKEND == "sqlite":
+    from bot.db.sqlite import get_sqlite_db
+    from bot.users.sqlite_storage import SqliteUserStorage
+
+    user_storage = SqliteUserStorage(get_sqlite_db(SQLITE_PATH))
+else:
+    user_storage = JsonUserStorage(str(DATA_DIR / "users.json"))
+user_service = UserService(
+    user_storage,
+    cache=ProfileCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL),
+    breaker=CircuitBreaker(
+        "users_pg",
+        failure_threshold=PG_BREAKER_FAILURES,
+        reset_timeout=PG_BREAKER_RESET,
+        call_timeout=PG_BREAKER_CALL_TIMEOUT,
+    ),
+    replay_log=ReplayLog(str(DATA_DIR / "users_replay.jsonl")),
+)
+metrics.register("profile_cache", user_service.cache.stats)
+metrics.register("users_pg_breaker", user_service.breaker.stats)
+metrics.register("users_replay", user_service.replay_log.stats)
+user_tracker = UserTracker(
+    user_service,
+    flush_interval_ms=USER_TRACK_FLUSH_MS,
+    max_batch=USER_TRACK_BATCH,
+)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+
+class ProfileCache:
+    """
+    LRU + TTL кэш профилей пользователей.
+
+    - single-flight: одновременные промахи по одному user_id делают один запрос;
+    - invalidate() отменяет и запись, и незавершённую загрузку
+      (её результат уже не попадёт в кэш);
+    - loader возвращает (профиль, cacheable): профиль из fallback-хранилища
+      отдаётся ожидающим, но в кэш не кладётся.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        self.maxsize = max(maxsize, 1)
+        self.ttl = ttl
+
+        self._entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._loading: dict[int, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # промахи, которые дождались чужой загрузки
+
+    def peek(self, user_id: int) -> dict | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, profile = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(profile)
+
+    async def get(self, user_id: int, loader: Callable[[], Awaitable[tuple[dict, bool]]]) -> dict:
+        profile = self.peek(user_id)
+        if profile is not None:
+            return profile
+
+        fut = self._loading.get(user_id)
+        if fut is not None:
+            self.coalesced += 1
+            return dict(await asyncio.shield(fut))
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = fut
+        try:
+            profile, cacheable = await loader()
+        except BaseException as e:
+            if self._loading.get(user_id) is fut:
+                del self._loading[user_id]
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()  # ошибку получит вызывающий; ожидающие — через await
+            raise
+
+        if self._loading.get(user_id) is fut:
+            del self._loading[user_id]
+            if cacheable:
+                self.put(user_id, profile)
+        fut.set_result(profile)
+        return dict(profile)
+
+    def put(self, user_id: int, profile: dict) -> None:
+        if not profile:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, dict(profile))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids: int) -> None:
+        for uid in user_ids:
+            self._entries.pop(uid, None)
+            self._loading.pop(uid, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
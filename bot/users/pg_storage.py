@@ -1,87 +1,213 @@
 from __future__ import annotations
 
+from datetime import datetime
+
 import asyncpg
 
+from bot.db.statements import sql
+
+_UPSERT_SQL = sql("users.upsert", """
+INSERT INTO users (id, username, first_name, last_name, first_seen, last_seen)
+VALUES ($1, $2, $3, $4, now(), now())
+ON CONFLICT (id) DO UPDATE
+SET
+    username = EXCLUDED.username,
+    first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    last_seen = now();
+""")
+
+_UPSERT_RETURNING_SQL = sql("users.upsert_returning", """
+INSERT INTO users (id, username, first_name, last_name, first_seen, last_seen)
+VALUES ($1, $2, $3, $4, now(), now())
+ON CONFLICT (id) DO UPDATE
+SET
+    username = EXCLUDED.username,
+    first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    last_seen = now()
+RETURNING id, username, first_name, last_name,
+          total_purchases, total_spent_rub, ref, bonus_balance, invited_count;
+""")
+
+_UPSERT_MANY_SQL = sql("users.upsert_many", """
+INSERT INTO users (id, username, first_name, last_name, first_seen, last_seen)
+SELECT u.id, u.username, u.first_name, u.last_name, u.seen_at, u.seen_at
+FROM unnest($1::bigint[], $2::text[], $3::text[], $4::text[], $5::timestamptz[])
+    AS u(id, username, first_name, last_name, seen_at)
+ON CONFLICT (id) DO UPDATE
+SET
+    username = EXCLUDED.username,
+    first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    last_seen = EXCLUDED.last_seen;
+""")
+
+_ADD_PURCHASE_SQL = sql("users.add_purchase", """
+UPDATE users
+SET total_purchases = total_purchases + 1,
+    total_spent_rub = total_spent_rub + $2,
+    last_seen = now()
+WHERE id = $1;
+""")
+
+# ref и счётчик приглашённых у реферера меняются одним statement
+# (колонка users.invited_count и её backfill — migrations/0001 и 0003)
+_SET_REF_SQL = sql("users.set_ref", """
+WITH upd AS (
+    UPDATE users
+    SET ref = $2
+    WHERE id = $1
+    AND ref IS NULL
+    AND total_spent_rub = 0
+    RETURNING ref
+), inc AS (
+    UPDATE users
+    SET invited_count = invited_count + 1
+    WHERE id IN (SELECT ref FROM upd)
+)
+SELECT count(*) FROM upd;
+""")
+
+_GET_PROFILE_SQL = sql("users.get_profile", """
+SELECT id, username, first_name, last_name, total_purchases, total_spent_rub, ref, bonus_balance,
+       invited_count
+FROM users
+WHERE id = $1;
+""")
+
+# счётчик поддерживается в try_set_ref
+_COUNT_INVITED_SQL = sql("users.count_invited", "SELECT invited_count FROM users WHERE id = $1;")
+
+_ADD_BONUS_SQL = sql("users.add_bonus", """
+UPDATE users
+SET bonus_balance = bonus_balance + $2
+WHERE id = $1;
+""")
+
+_DEDUCT_BONUS_SQL = sql("users.deduct_bonus", """
+UPDATE users
+SET bonus_balance = GREATEST(bonus_balance - $2, 0)
+WHERE id = $1;
+""")
+
+# idempotency keys записей из ReplayLog (таблица — migrations/0004_replay_applied.sql)
+_CLAIM_REPLAY_KEYS_SQL = sql("users.replay_claim", """
+INSERT INTO replay_applied (key)
+SELECT unnest($1::text[])
+ON CONFLICT (key) DO NOTHING
+RETURNING key;
+""")
+
+_REPLAY_BATCH = 500
+
 
 class PgUserStorage:
     def __init__(self, pool: asyncpg.Pool):
         self.pool = pool
 
     async def upsert_user(self, user) -> None:
-        sql = """
-        INSERT INTO users (id, username, first_name, last_name, first_seen, last_seen)
-        VALUES ($1, $2, $3, $4, now(), now())
-        ON CONFLICT (id) DO UPDATE
-        SET
-            username = EXCLUDED.username,
-            first_name = EXCLUDED.first_name,
-            last_name = EXCLUDED.last_name,
-            last_seen = now();
-        """
         async with self.pool.acquire() as conn:
-            await conn.execute(sql, user.id, user.username, user.first_name, user.last_name)
+            await conn.execute(_UPSERT_SQL, user.id, user.username, user.first_name, user.last_name)
+
+    async def upsert_user_returning(self, user) -> dict:
+        """upsert + чтение профиля за один round trip."""
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                _UPSERT_RETURNING_SQL, user.id, user.username, user.first_name, user.last_name
+            )
+
+        return dict(row) if row else {}
+
+    async def upsert_users(self, users) -> None:
+        """Пачечный upsert (один round trip на всю пачку)."""
+        if not users:
+            return
+
+        # сортируем по id, чтобы параллельные пачки брали блокировки в одном порядке
+        users = sorted(users, key=lambda u: u.id)
+
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                _UPSERT_MANY_SQL,
+                [u.id for u in users],
+                [u.username for u in users],
+                [u.first_name for u in users],
+                [u.last_name for u in users],
+                [u.seen_at for u in users],
+            )
 
     async def add_purchase(self, user_id: int, amount_rub: int) -> None:
-        sql = """
-        UPDATE users
-        SET total_purchases = total_purchases + 1,
-            total_spent_rub = total_spent_rub + $2,
-            last_seen = now()
-        WHERE id = $1;
-        """
         async with self.pool.acquire() as conn:
-            await conn.execute(sql, user_id, amount_rub)
+            await conn.execute(_ADD_PURCHASE_SQL, user_id, amount_rub)
 
     async def try_set_ref(self, user_id: int, ref_id: int) -> bool:
         if user_id == ref_id:
             return False
 
-        sql = """
-        UPDATE users
-        SET ref = $2
-        WHERE id = $1
-        AND ref IS NULL
-        AND total_spent_rub = 0;
-        """
-
         async with self.pool.acquire() as conn:
-            result = await conn.execute(sql, user_id, ref_id)
+            updated = await conn.fetchval(_SET_REF_SQL, user_id, ref_id)
+
+        return bool(updated)
 
-        # result будет типа: "UPDATE 1"
-        return result.endswith("1")
-    
     async def get_profile(self, user_id: int) -> dict | None:
-        sql = """
-        SELECT id, username, first_name, last_name, total_purchases, total_spent_rub, ref
-        FROM users
-        WHERE id = $1;
-        """
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(sql, user_id)
+            row = await conn.fetchrow(_GET_PROFILE_SQL, user_id)
 
         return dict(row) if row else None
 
     async def count_invited(self, ref_id: int) -> int:
-        sql = "SELECT COUNT(*) FROM users WHERE ref = $1;"
         async with self.pool.acquire() as conn:
-            count = await conn.fetchval(sql, ref_id)
+            count = await conn.fetchval(_COUNT_INVITED_SQL, ref_id)
         return int(count or 0)
 
     async def add_bonus(self, user_id: int, amount: int) -> None:
-        sql = """
-        UPDATE users
-        SET bonus_balance = bonus_balance + $2
-        WHERE id = $1;
-        """
         async with self.pool.acquire() as conn:
-            await conn.execute(sql, user_id, amount)
+            await conn.execute(_ADD_BONUS_SQL, user_id, amount)
 
     async def deduct_bonus(self, user_id: int, amount: int) -> None:
-        sql = """
-        UPDATE users
-        SET bonus_balance = GREATEST(bonus_balance - $2, 0)
-        WHERE id = $1;
+        async with self.pool.acquire() as conn:
+            await conn.execute(_DEDUCT_BONUS_SQL, user_id, amount)
+
+    async def apply_replay(self, records: list[dict]) -> int:
+        """
+        Догоняет PG записями из ReplayLog. Пачка — одна транзакция:
+        сначала забираем ещё не применённые keys, затем применяем только их по порядку.
         """
+        applied = 0
         async with self.pool.acquire() as conn:
-            await conn.execute(sql, user_id, amount)
+            for i in range(0, len(records), _REPLAY_BATCH):
+                batch = records[i:i + _REPLAY_BATCH]
+                async with conn.transaction():
+                    rows = await conn.fetch(_CLAIM_REPLAY_KEYS_SQL, [r["key"] for r in batch])
+                    fresh = {r["key"] for r in rows}
+                    for rec in batch:
+                        if rec["key"] in fresh:
+                            await self._apply_op(conn, rec["op"], rec["args"])
+                            applied += 1
+
+        return applied
 
+    @staticmethod
+    async def _apply_op(conn: asyncpg.Connection, op: str, args: dict) -> None:
+        if op == "upsert_many":
+            users = sorted(args["users"], key=lambda u: u[0])
+            await conn.execute(
+                _UPSERT_MANY_SQL,
+                [u[0] for u in users],
+                [u[1] for u in users],
+                [u[2] for u in users],
+                [u[3] for u in users],
+                [datetime.fromisoformat(u[4]) for u in users],
+            )
+        elif op == "add_purchase":
+            await conn.execute(_ADD_PURCHASE_SQL, args["user_id"], args["amount_rub"])
+        elif op == "try_set_ref":
+            if args["user_id"] != args["ref_id"]:
+                await conn.fetchval(_SET_REF_SQL, args["user_id"], args["ref_id"])
+        elif op == "add_bonus":
+            await conn.execute(_ADD_BONUS_SQL, args["user_id"], args["amount"])
+        elif op == "deduct_bonus":
+            await conn.execute(_DEDUCT_BONUS_SQL, args["user_id"], args["amount"])
+        else:
+            print(f"[replay] unknown op {op!r}, skipped")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+from bot.utils.files import run_io
+
+
+class ReplayLog:
+    """
+    Durable-журнал записей, которые не дошли до PG (ушли в локальный fallback).
+
+    Строка — {"key": <idempotency key>, "op": ..., "args": {...}, "at": ...}.
+    drain() забирает журнал (rename в *.replaying, новые записи идут уже в
+    свежий файл), отдаёт записи в apply и удаляет файл только после успеха;
+    повторная отправка безопасна — PG применяет каждый key не более одного раза.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.replaying_path = f"{path}.replaying"
+        self._lock = asyncio.Lock()
+        self.pending = 0  # записано с момента последнего drain (для метрик)
+
+    async def append(self, op: str, args: dict[str, Any]) -> None:
+        rec = {
+            "key": uuid.uuid4().hex,
+            "op": op,
+            "args": args,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        await run_io(self._append_sync, json.dumps(rec, ensure_ascii=False))
+        self.pending += 1
+
+    def _append_sync(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _take_sync(self) -> list[dict]:
+        if os.path.exists(self.path):
+            if os.path.exists(self.replaying_path):
+                # прошлый drain не завершился — дописываем новое в его конец
+                with open(self.path, "r", encoding="utf-8") as src, \
+                        open(self.replaying_path, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.replaying_path)
+
+        if not os.path.exists(self.replaying_path):
+            return []
+
+        records = []
+        with open(self.replaying_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # оборванная строка — запись не была подтверждена
+        return records
+
+    async def drain(self, apply: Callable[[list[dict]], Awaitable[int]]) -> int:
+        async with self._lock:
+            records = await run_io(self._take_sync)
+            if not records:
+                return 0
+
+            applied = await apply(records)
+            await run_io(os.remove, self.replaying_path)
+            self.pending = 0
+            return applied
+
+    def stats(self) -> dict:
+        return {"pending": self.pending}
@@ -1,84 +1,288 @@
 from __future__ import annotations
 
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
 import asyncpg
 
+from bot.db import replica
+from bot.db.breaker import CircuitBreaker
+from bot.users.cache import ProfileCache
+from bot.users.replay import ReplayLog
 from bot.users.storage import JsonUserStorage
 from bot.users.pg_storage import PgUserStorage
 
 
 class UserService:
-    def __init__(self, storage: JsonUserStorage):
+    def __init__(
+        self,
+        storage: JsonUserStorage,
+        cache: ProfileCache | None = None,
+        breaker: CircuitBreaker | None = None,
+        replay_log: ReplayLog | None = None,
+    ):
         self.storage = storage  # JSON fallback
+        self._pg_storages: dict[asyncpg.Pool, PgUserStorage] = {}
+        self._primary_pool: asyncpg.Pool | None = None
+        # после своей записи пользователь читается с primary, пока реплика может отставать
+        self._pinned: dict[int, float] = {}
+        # профили читаются на каждом клике, а меняются только нашими же записями ниже
+        self.cache = cache or ProfileCache()
+        # пока PG лежит, не ждём таймаут на каждом вызове — сразу в fallback
+        self.breaker = breaker or CircuitBreaker("users_pg")
+        self.breaker.on_close = self._schedule_replay
+        # записи, ушедшие в fallback при настроенном PG, догоняются после восстановления
+        self.replay_log = replay_log
+        self._replay_task: asyncio.Task | None = None
 
-    async def track(self, user, pool: asyncpg.Pool | None = None) -> None:
-        if pool is None:
-            await self.storage.upsert_user(user)
+    def _pg(self, pool: asyncpg.Pool) -> PgUserStorage:
+        # один репозиторий на пул (primary/реплика), а не новый объект на каждый вызов
+        pg = self._pg_storages.get(pool)
+        if pg is None:
+            pg = self._pg_storages[pool] = PgUserStorage(pool)
+        return pg
+
+    def _touched(self, *user_ids: int) -> None:
+        self.cache.invalidate(*user_ids)
+
+        window = replica.lag_window()
+        if window <= 0:
             return
+        now = time.monotonic()
+        if len(self._pinned) > 10_000:
+            self._pinned = {uid: t for uid, t in self._pinned.items() if t > now}
+        for uid in user_ids:
+            self._pinned[uid] = now + window
 
-        try:
-            await PgUserStorage(pool).upsert_user(user)
-        except Exception:
-            # мягкий fallback — бот не падает
-            await self.storage.upsert_user(user)
+    def _is_pinned(self, user_id: int) -> bool:
+        until = self._pinned.get(user_id)
+        return until is not None and until > time.monotonic()
 
-    async def add_purchase(self, user_id: int, amount_rub: int, pool: asyncpg.Pool | None = None) -> None:
+    async def _read(
+        self,
+        pool: asyncpg.Pool | None,
+        pg_call: Callable[[PgUserStorage], Awaitable[Any]],
+        local_call: Callable[[], Awaitable[Any]],
+        *,
+        lag_ok: bool = False,
+    ) -> Any:
+        result, _ = await self._read_sourced(pool, pg_call, local_call, lag_ok=lag_ok)
+        return result
+
+    async def _read_sourced(
+        self,
+        pool: asyncpg.Pool | None,
+        pg_call: Callable[[PgUserStorage], Awaitable[Any]],
+        local_call: Callable[[], Awaitable[Any]],
+        *,
+        lag_ok: bool = False,
+    ) -> tuple[Any, bool]:
+        """(результат, authoritative): False — ответ из JSON fallback при настроенном PG."""
         if pool is None:
-            await self.storage.add_purchase(user_id, amount_rub)
-            return
+            return await local_call(), True
+
+        async def call() -> Any:
+            if lag_ok:
+                return await replica.read(pool, lambda p: pg_call(self._pg(p)))
+            return await pg_call(self._pg(pool))
 
         try:
-            await PgUserStorage(pool).add_purchase(user_id, amount_rub)
+            return await self.breaker.call(call), True
         except Exception:
-            await self.storage.add_purchase(user_id, amount_rub)
+            # мягкий fallback — бот не падает
+            return await local_call(), False
 
-    async def try_set_ref(self, user_id: int, ref_id: int, pool: asyncpg.Pool | None = None) -> bool:
+    async def _write(
+        self,
+        pool: asyncpg.Pool | None,
+        op: str,
+        args: dict,
+        pg_call: Callable[[PgUserStorage], Awaitable[Any]],
+        local_call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        result, _ = await self._write_sourced(pool, op, args, pg_call, local_call)
+        return result
+
+    async def _write_sourced(
+        self,
+        pool: asyncpg.Pool | None,
+        op: str,
+        args: dict,
+        pg_call: Callable[[PgUserStorage], Awaitable[Any]],
+        local_call: Callable[[], Awaitable[Any]],
+    ) -> tuple[Any, bool]:
         if pool is None:
-            return await self.storage.try_set_ref(user_id, ref_id)
+            return await local_call(), True
 
+        self._primary_pool = pool
         try:
-            return await PgUserStorage(pool).try_set_ref(user_id, ref_id)
+            return await self.breaker.call(lambda: pg_call(self._pg(pool))), True
         except Exception:
-            return await self.storage.try_set_ref(user_id, ref_id)
+            result = await local_call()
+            # по таймауту запрос отменяется вместе с транзакцией, поэтому
+            # повтор из журнала не задваивает запись (кроме гонки с самим COMMIT)
+            if self.replay_log is not None:
+                await self.replay_log.append(op, args)
+            return result, False
 
-    async def get_profile(self, user_id: int, pool: asyncpg.Pool | None = None) -> dict:
-        if pool is None:
-            return await self.storage.get_profile(user_id)
+    def _schedule_replay(self) -> None:
+        if self.replay_log is None or self._primary_pool is None:
+            return
+        if self._replay_task is not None and not self._replay_task.done():
+            return
+        self._replay_task = asyncio.create_task(self.replay(self._primary_pool))
+
+    async def replay(self, pool: asyncpg.Pool | None) -> int:
+        """Применяет накопленный ReplayLog к PG (на старте и при закрытии breaker)."""
+        if pool is None or self.replay_log is None:
+            return 0
 
         try:
-            data = await PgUserStorage(pool).get_profile(user_id)
-            return data or {}
-        except Exception:
-            return await self.storage.get_profile(user_id)
+            applied = await self.replay_log.drain(self._pg(pool).apply_replay)
+        except Exception as e:
+            print(f"[users] replay failed, will retry on next recovery: {e!r}")
+            return 0
 
-    async def count_invited(self, ref_id: int, pool: asyncpg.Pool | None = None) -> int:
-        if pool is None:
-            return await self.storage.count_invited(ref_id)
+        if applied:
+            print(f"[users] replayed {applied} writes to PG")
+            # профили в кэше могли быть прочитаны из fallback
+            self.cache.clear()
+        return applied
+
+    def cached_profile(self, user_id: int) -> dict | None:
+        return self.cache.peek(user_id)
+
+    def invalidate_profile(self, *user_ids: int) -> None:
+        """Для записей в обход сервиса (например, финализация покупки одной транзакцией)."""
+        self._touched(*user_ids)
+
+    @staticmethod
+    def _upsert_args(users) -> dict:
+        now = datetime.now(timezone.utc)
+        return {
+            "users": [
+                [
+                    u.id,
+                    u.username,
+                    u.first_name,
+                    u.last_name,
+                    (getattr(u, "seen_at", None) or now).isoformat(),
+                ]
+                for u in users
+            ]
+        }
 
+    async def track(self, user, pool: asyncpg.Pool | None = None) -> None:
+        await self._write(
+            pool, "upsert_many", self._upsert_args([user]),
+            lambda pg: pg.upsert_user(user),
+            lambda: self.storage.upsert_user(user),
+        )
+
+    async def track_and_get_profile(self, user, pool: asyncpg.Pool | None = None) -> dict:
+        async def load() -> tuple[dict, bool]:
+            return await self._write_sourced(
+                pool, "upsert_many", self._upsert_args([user]),
+                lambda pg: pg.upsert_user_returning(user),
+                lambda: self.storage.upsert_user_returning(user),
+            )
+
+        return await self.cache.get(user.id, load)
+
+    async def track_many(self, users, pool: asyncpg.Pool | None = None) -> None:
+        # имена в кэше профилей обновятся по TTL — бонусы/ref здесь не меняются
+        if not users:
+            return
+
+        await self._write(
+            pool, "upsert_many", self._upsert_args(users),
+            lambda pg: pg.upsert_users(users),
+            lambda: self.storage.upsert_users(users),
+        )
+
+    async def add_purchase(self, user_id: int, amount_rub: int, pool: asyncpg.Pool | None = None) -> None:
         try:
-            return await PgUserStorage(pool).count_invited(ref_id)
-        except Exception:
-            return await self.storage.count_invited(ref_id)
+            await self._write(
+                pool, "add_purchase", {"user_id": user_id, "amount_rub": amount_rub},
+                lambda pg: pg.add_purchase(user_id, amount_rub),
+                lambda: self.storage.add_purchase(user_id, amount_rub),
+            )
+        finally:
+            self._touched(user_id)
+
+    async def try_set_ref(self, user_id: int, ref_id: int, pool: asyncpg.Pool | None = None) -> bool:
+        updated = await self._write(
+            pool, "try_set_ref", {"user_id": user_id, "ref_id": ref_id},
+            lambda pg: pg.try_set_ref(user_id, ref_id),
+            lambda: self.storage.try_set_ref(user_id, ref_id),
+        )
+
+        if updated:
+            # ref у пользователя и invited_count у реферера
+            self._touched(user_id, ref_id)
+        return updated
+
+    async def get_profile(
+        self, user_id: int, pool: asyncpg.Pool | None = None, *, primary: bool = False
+    ) -> dict:
+        """primary=True — мимо кэша и реплики (баланс перед списанием)."""
+        if primary:
+            profile, authoritative = await self._read_sourced(
+                pool,
+                lambda pg: self._pg_profile(pg, user_id),
+                lambda: self.storage.get_profile(user_id),
+            )
+            # профиль из fallback не кэшируем: после восстановления PG он устарел бы
+            if authoritative:
+                self.cache.put(user_id, profile)
+            return profile
+
+        async def load() -> tuple[dict, bool]:
+            return await self._read_sourced(
+                pool,
+                lambda pg: self._pg_profile(pg, user_id),
+                lambda: self.storage.get_profile(user_id),
+                lag_ok=not self._is_pinned(user_id),
+            )
+
+        return await self.cache.get(user_id, load)
+
+    @staticmethod
+    async def _pg_profile(pg: PgUserStorage, user_id: int) -> dict:
+        return await pg.get_profile(user_id) or {}
+
+    async def count_invited(self, ref_id: int, pool: asyncpg.Pool | None = None) -> int:
+        return await self._read(
+            pool,
+            lambda pg: pg.count_invited(ref_id),
+            lambda: self.storage.count_invited(ref_id),
+            lag_ok=not self._is_pinned(ref_id),
+        )
 
     async def add_bonus(self, user_id: int, amount: int, pool=None):
         if amount <= 0:
             return
 
-        if pool is None:
-            return await self.storage.add_bonus(user_id, amount)
-
         try:
-            return await PgUserStorage(pool).add_bonus(user_id, amount)
-        except Exception:
-            return await self.storage.add_bonus(user_id, amount)
+            return await self._write(
+                pool, "add_bonus", {"user_id": user_id, "amount": amount},
+                lambda pg: pg.add_bonus(user_id, amount),
+                lambda: self.storage.add_bonus(user_id, amount),
+            )
+        finally:
+            self._touched(user_id)
 
     async def deduct_bonus(self, user_id: int, amount: int, pool=None):
         if amount <= 0:
             return
 
-        if pool is None:
-            return await self.storage.deduct_bonus(user_id, amount)
-
         try:
-            return await PgUserStorage(pool).deduct_bonus(user_id, amount)
-        except Exception:
-            return await self.storage.deduct_bonus(user_id, amount)
+            return await self._write(
+                pool, "deduct_bonus", {"user_id": user_id, "amount": amount},
+                lambda pg: pg.deduct_bonus(user_id, amount),
+                lambda: self.storage.deduct_bonus(user_id, amount),
+            )
+        finally:
+            self._touched(user_id)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from bot.db.sqlite import SqliteDb
+
+_UPSERT_SQL = """
+INSERT INTO users (id, username, first_name, last_name, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE
+SET
+    username = excluded.username,
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    last_seen = excluded.last_seen
+"""
+
+_PROFILE_COLUMNS = (
+    "id, username, first_name, last_name, first_seen, last_seen, "
+    "total_purchases, total_spent_rub, ref, bonus_balance, invited_count"
+)
+
+
+class SqliteUserStorage:
+    """Тот же интерфейс, что у JsonUserStorage, поверх SQLite (WAL)."""
+
+    def __init__(self, db: SqliteDb):
+        self.db = db
+
+    async def compact(self) -> None:
+        # аналог сворачивания журнала: переносим WAL в основной файл
+        await self.db.checkpoint()
+
+    async def upsert_user(self, user) -> None:
+        now = datetime.utcnow().isoformat()
+        await self.db.run(
+            lambda conn: conn.execute(
+                _UPSERT_SQL,
+                (user.id, user.username, user.first_name, user.last_name, now, now),
+            )
+        )
+
+    async def upsert_user_returning(self, user) -> dict:
+        now = datetime.utcnow().isoformat()
+
+        def tx(conn):
+            row = conn.execute(
+                _UPSERT_SQL + f" RETURNING {_PROFILE_COLUMNS}",
+                (user.id, user.username, user.first_name, user.last_name, now, now),
+            ).fetchone()
+            return dict(row) if row else {}
+
+        return await self.db.run(tx)
+
+    async def upsert_users(self, users) -> None:
+        if not users:
+            return
+
+        rows = []
+        for u in users:
+            seen = u.seen_at.replace(tzinfo=None).isoformat()
+            rows.append((u.id, u.username, u.first_name, u.last_name, seen, seen))
+
+        await self.db.run(lambda conn: conn.executemany(_UPSERT_SQL, rows))
+
+    async def add_purchase(self, user_id: int, amount_rub: int) -> None:
+        def tx(conn):
+            conn.execute("INSERT OR IGNORE INTO users (id) VALUES (?)", (user_id,))
+            conn.execute(
+                """
+                UPDATE users
+                SET total_purchases = total_purchases + 1,
+                    total_spent_rub = total_spent_rub + ?
+                WHERE id = ?
+                """,
+                (int(amount_rub), user_id),
+            )
+
+        await self.db.run(tx)
+
+    async def try_set_ref(self, user_id: int, ref_id: int) -> bool:
+        if user_id == ref_id:
+            return False
+
+        def tx(conn):
+            conn.execute("INSERT OR IGNORE INTO users (id) VALUES (?)", (user_id,))
+            cur = conn.execute(
+                """
+                UPDATE users
+                SET ref = ?
+                WHERE id = ? AND ref IS NULL AND total_spent_rub = 0
+                """,
+                (int(ref_id), user_id),
+            )
+            if cur.rowcount != 1:
+                return False
+            conn.execute(
+                "UPDATE users SET invited_count = invited_count + 1 WHERE id = ?",
+                (int(ref_id),),
+            )
+            return True
+
+        return await self.db.run(tx)
+
+    async def count_invited(self, ref_id: int) -> int:
+        def tx(conn):
+            row = conn.execute("SELECT invited_count FROM users WHERE id = ?", (ref_id,)).fetchone()
+            return int(row[0]) if row else 0
+
+        return await self.db.run(tx)
+
+    async def get_profile(self, user_id: int) -> dict:
+        def tx(conn):
+            row = conn.execute(
+                f"SELECT {_PROFILE_COLUMNS} FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+            return dict(row) if row else {}
+
+        return await self.db.run(tx)
+
+    async def add_bonus(self, user_id: int, amount: int) -> None:
+        await self.db.run(
+            lambda conn: conn.execute(
+                "UPDATE users SET bonus_balance = bonus_balance + ? WHERE id = ?",
+                (int(amount), user_id),
+            )
+        )
+
+    async def deduct_bonus(self, user_id: int, amount: int) -> None:
+        await self.db.run(
+            lambda conn: conn.execute(
+                "UPDATE users SET bonus_balance = MAX(bonus_balance - ?, 0) WHERE id = ?",
+                (int(amount), user_id),
+            )
+        )
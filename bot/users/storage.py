@@ -1,39 +1,81 @@
-import json
-import os
 import asyncio
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Set
+
+from bot.utils.journal import JsonJournal
+
+
+def _empty_user(user_id: int) -> dict:
+    return {
+        "id": user_id,
+        "username": None,
+        "first_name": None,
+        "last_name": None,
+        "first_seen": None,
+        "last_seen": None,
+        "total_purchases": 0,
+        "total_spent_rub": 0,
+        "ref": None,
+    }
 
 
 class JsonUserStorage:
-    def __init__(self, path: str):
-        self.path = path
-        self._lock = asyncio.Lock()
+    """
+    Пользователи в памяти + append-only журнал изменений.
 
-    def _read(self) -> Dict:
-        if not os.path.exists(self.path):
-            return {}
-        with open(self.path, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
+    users.json читается один раз (плюс replay журнала users.json.journal),
+    каждое изменение дописывает в журнал одну строку с новой записью пользователя.
+    Раз в compact_every изменений журнал сворачивается в снапшот users.json.
 
-    def _write(self, data: Dict) -> None:
-        tmp = f"{self.path}.tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, self.path)
+    Записи не меняются на месте (copy-on-write): файловый поток сериализует
+    их уже после того, как метод отпустил lock.
+
+    Обратный индекс рефералов (ref → {user_id}) строится при загрузке
+    и обновляется в try_set_ref, count_invited — O(1).
+    """
+
+    def __init__(self, path: str, *, compact_every: int = 1000):
+        self.path = path
+        self._lock = asyncio.Lock()
+        self._journal = JsonJournal(path, compact_every=compact_every)
+        self._data: Dict[str, dict] | None = None
+        self._invited: Dict[int, Set[int]] = {}
+
+    async def _users(self) -> Dict[str, dict]:
+        if self._data is None:
+            data = await self._journal.load()
+            invited: Dict[int, Set[int]] = {}
+            for rec in data.values():
+                if rec.get("ref") is not None:
+                    invited.setdefault(int(rec["ref"]), set()).add(int(rec["id"]))
+            self._data, self._invited = data, invited
+        return self._data
+
+    def _commit(self, *records: dict) -> asyncio.Future:
+        for rec in records:
+            self._data[str(rec["id"])] = rec
+
+        written = self._journal.append([(str(rec["id"]), rec) for rec in records])
+        if self._journal.needs_compaction:
+            written = self._journal.compact(dict(self._data))
+        return written
+
+    async def compact(self) -> None:
+        async with self._lock:
+            if self._data is None:
+                return
+            written = self._journal.compact(dict(self._data))
+        await written
 
     async def upsert_user(self, user) -> None:
         now = datetime.utcnow().isoformat()
 
         async with self._lock:
-            data = self._read()
-            uid = str(user.id)
+            data = await self._users()
+            rec = data.get(str(user.id))
 
-            if uid not in data:
-                data[uid] = {
+            if rec is None:
+                rec = {
                     "id": user.id,
                     "username": user.username,
                     "first_name": user.first_name,
@@ -45,107 +87,130 @@ class JsonUserStorage:
                     "ref": None,
                 }
             else:
-                data[uid]["username"] = user.username
-                data[uid]["first_name"] = user.first_name
-                data[uid]["last_name"] = user.last_name
-                data[uid]["last_seen"] = now
+                rec = dict(rec)
+                rec["username"] = user.username
+                rec["first_name"] = user.first_name
+                rec["last_name"] = user.last_name
+                rec["last_seen"] = now
+
+            written = self._commit(rec)
+
+        await written
+
+    async def upsert_user_returning(self, user) -> dict:
+        await self.upsert_user(user)
+        return await self.get_profile(user.id)
 
-            self._write(data)
+    async def upsert_users(self, users) -> None:
+        """Пачечный upsert: одна дозапись журнала на всю пачку."""
+        if not users:
+            return
+
+        async with self._lock:
+            data = await self._users()
+            records = []
+
+            for user in users:
+                seen = user.seen_at.replace(tzinfo=None).isoformat()
+                rec = data.get(str(user.id))
+
+                if rec is None:
+                    rec = {
+                        "id": user.id,
+                        "username": user.username,
+                        "first_name": user.first_name,
+                        "last_name": user.last_name,
+                        "first_seen": seen,
+                        "last_seen": seen,
+                        "total_purchases": 0,
+                        "total_spent_rub": 0,
+                        "ref": None,
+                    }
+                else:
+                    rec = dict(rec)
+                    rec["username"] = user.username
+                    rec["first_name"] = user.first_name
+                    rec["last_name"] = user.last_name
+                    rec["last_seen"] = seen
+
+                records.append(rec)
+
+            written = self._commit(*records)
+
+        await written
 
     async def add_purchase(self, user_id: int, amount_rub: int) -> None:
         async with self._lock:
-            data = self._read()
-            uid = str(user_id)
-
-            if uid not in data:
-                data[uid] = {
-                    "id": user_id,
-                    "username": None,
-                    "first_name": None,
-                    "last_name": None,
-                    "first_seen": None,
-                    "last_seen": None,
-                    "total_purchases": 0,
-                    "total_spent_rub": 0,
-                    "ref": None,
-                }
+            data = await self._users()
+            rec = dict(data.get(str(user_id)) or _empty_user(user_id))
 
-            data[uid]["total_purchases"] = int(
-                data[uid].get("total_purchases", 0)
-            ) + 1
+            rec["total_purchases"] = int(rec.get("total_purchases", 0)) + 1
+            rec["total_spent_rub"] = int(rec.get("total_spent_rub", 0)) + int(amount_rub)
 
-            data[uid]["total_spent_rub"] = int(
-                data[uid].get("total_spent_rub", 0)
-            ) + int(amount_rub)
+            written = self._commit(rec)
 
-            self._write(data)
+        await written
 
     async def try_set_ref(self, user_id: int, ref_id: int) -> bool:
         if user_id == ref_id:
             return False
 
         async with self._lock:
-            data = self._read()
-            uid = str(user_id)
-            rid = int(ref_id)
-
-            if uid not in data:
-                data[uid] = {
-                    "id": user_id,
-                    "username": None,
-                    "first_name": None,
-                    "last_name": None,
-                    "first_seen": None,
-                    "last_seen": None,
-                    "total_purchases": 0,
-                    "total_spent_rub": 0,
-                    "ref": None,
-                }
+            data = await self._users()
+            rec = dict(data.get(str(user_id)) or _empty_user(user_id))
 
             # уже есть реферер
-            if data[uid].get("ref") is not None:
+            if rec.get("ref") is not None:
                 return False
 
             # уже покупал
-            if int(data[uid].get("total_spent_rub", 0)) > 0:
+            if int(rec.get("total_spent_rub", 0)) > 0:
                 return False
 
-            data[uid]["ref"] = rid
-            self._write(data)
-            return True
+            rec["ref"] = int(ref_id)
+            written = self._commit(rec)
+            self._invited.setdefault(int(ref_id), set()).add(int(user_id))
+
+        await written
+        return True
 
     async def count_invited(self, ref_id: int) -> int:
         async with self._lock:
-            data = self._read()
-            return sum(1 for u in data.values() if u.get("ref") == ref_id)
+            await self._users()
+            return len(self._invited.get(int(ref_id), ()))
 
     async def get_profile(self, user_id: int) -> dict:
         async with self._lock:
-            data = self._read()
-            uid = str(user_id)
-            return data.get(uid, {})
+            data = await self._users()
+            rec = data.get(str(user_id))
+            if rec is None:
+                return {}
+            # копия: снаружи не должны менять запись в памяти
+            return {**rec, "invited_count": len(self._invited.get(int(user_id), ()))}
 
     async def add_bonus(self, user_id: int, amount: int) -> None:
         async with self._lock:
-            data = self._read()
-            uid = str(user_id)
-
-            if uid not in data:
+            data = await self._users()
+            rec = data.get(str(user_id))
+            if rec is None:
                 return
 
-            data[uid]["bonus_balance"] = int(
-                data[uid].get("bonus_balance", 0)
-            ) + int(amount)
+            rec = dict(rec)
+            rec["bonus_balance"] = int(rec.get("bonus_balance", 0)) + int(amount)
+            written = self._commit(rec)
 
-            self._write(data)
+        await written
 
     async def deduct_bonus(self, user_id: int, amount: int) -> None:
         async with self._lock:
-            data = self._read()
-            uid = str(user_id)
-            if uid not in data:
+            data = await self._users()
+            rec = data.get(str(user_id))
+            if rec is None:
                 return
 
-            bal = int(data[uid].get("bonus_balance", 0) or 0)
-            data[uid]["bonus_balance"] = max(bal - int(amount), 0)
-            self._write(data)
+            rec = dict(rec)
+            bal = int(rec.get("bonus_balance", 0) or 0)
+            rec["bonus_balance"] = max(bal - int(amount), 0)
+            written = self._commit(rec)
+
+        await written
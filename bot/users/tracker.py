@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import asyncpg
+
+
+@dataclass(frozen=True)
+class TrackedUser:
+    id: int
+    username: str | None
+    first_name: str | None
+    last_name: str | None
+    seen_at: datetime  # UTC
+
+
+class UserTracker:
+    """
+    Write-behind трекинг пользователей.
+
+    Апдейты копятся в буфере (по user_id, повторы схлопываются),
+    фоновая задача сбрасывает их пачкой раз в flush_interval_ms
+    или как только набралось max_batch пользователей.
+    Хендлер на эту запись больше не ждёт.
+    """
+
+    def __init__(self, service, *, flush_interval_ms: int = 500, max_batch: int = 500):
+        self.service = service
+        self.flush_interval = max(flush_interval_ms, 1) / 1000
+        self.max_batch = max(max_batch, 1)
+
+        self._buffer: dict[int, TrackedUser] = {}
+        self._pool: asyncpg.Pool | None = None
+        self._wake = asyncio.Event()
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    def track(self, user, pool: asyncpg.Pool | None = None) -> None:
+        self._buffer[user.id] = TrackedUser(
+            id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            seen_at=datetime.now(timezone.utc),
+        )
+        if pool is not None:
+            self._pool = pool
+
+        if len(self._buffer) >= self.max_batch:
+            self._wake.set()
+
+    def discard(self, user_id: int) -> None:
+        """Пользователь уже записан синхронно (например, вместе с чтением профиля)."""
+        self._buffer.pop(user_id, None)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и дописывает всё, что осталось в буфере."""
+        self._closed = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, {}
+        try:
+            await self.service.track_many(list(batch.values()), pool=self._pool)
+        except Exception as e:
+            # не теряем апдейты: вернём в буфер, если за это время не пришли свежее
+            for uid, u in batch.items():
+                self._buffer.setdefault(uid, u)
+            print(f"[users] track flush error: {type(e).__name__}: {e}")
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
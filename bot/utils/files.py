@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Вся файловая работа JSON-хранилищ идёт через один поток:
+# event loop не блокируется, а порядок операций (в т.ч. между разными файлами)
+# совпадает с порядком вызовов.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-io")
+
+_tail_lock = threading.Lock()
+_tail: _Job | None = None  # последняя поставленная в очередь операция
+
+
+class _Job:
+    __slots__ = ("kind", "path", "payload", "started", "future")
+
+    def __init__(self, kind: str, path: str | None, payload: Any):
+        self.kind = kind
+        self.path = path
+        self.payload = payload
+        self.started = False
+        self.future = None
+
+    def run(self) -> Any:
+        with _tail_lock:
+            self.started = True
+            payload = self.payload
+
+        if self.kind == "write":
+            data, indent = payload
+            return write_json_sync(self.path, data, indent)
+        if self.kind == "append":
+            return _append_lines_sync(self.path, payload)
+
+        fn, args = payload
+        return fn(*args)
+
+
+def _submit(kind: str, path: str | None, payload: Any, merge: Callable[[Any, Any], Any] | None = None) -> asyncio.Future:
+    """
+    Ставит операцию в очередь. Если предыдущая операция в очереди — того же
+    вида над тем же файлом и ещё не началась, новая сливается с ней
+    (back-to-back запись → одна запись).
+    """
+    global _tail
+
+    with _tail_lock:
+        job = _tail
+        if merge is not None and job is not None and not job.started and job.kind == kind and job.path == path:
+            job.payload = merge(job.payload, payload)
+        else:
+            job = _Job(kind, path, payload)
+            job.future = _executor.submit(job.run)
+            _tail = job
+
+    return asyncio.wrap_future(job.future)
+
+
+def _read_json_sync(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+
+def write_json_sync(path: str, data: Any, indent: int | None) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp, path)
+
+
+def _append_lines_sync(path: str, lines: list[str]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def run_io(fn: Callable[..., Any], *args: Any) -> asyncio.Future:
+    """Произвольная блокирующая файловая операция в общей очереди."""
+    return _submit("call", None, (fn, args))
+
+
+def read_json(path: str) -> asyncio.Future:
+    return run_io(_read_json_sync, path)
+
+
+def write_json(path: str, data: Any, *, indent: int | None = 2) -> asyncio.Future:
+    """
+    Атомарная запись JSON (tmp + rename).
+    data сериализуется в фоновом потоке — после передачи его нельзя менять.
+    """
+    return _submit("write", path, (data, indent), merge=lambda _old, new: new)
+
+
+def append_lines(path: str, lines: list[str]) -> asyncio.Future:
+    return _submit("append", path, list(lines), merge=lambda old, new: old + new)
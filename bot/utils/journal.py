@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any
+
+from bot.utils.files import append_lines, run_io, write_json_sync
+
+
+class JsonJournal:
+    """
+    Снапшот (обычный JSON-объект) + append-only журнал (JSON Lines).
+
+    Каждая строка журнала — полное новое значение ключа ({"k": ..., "v": ...},
+    v=None — удаление), поэтому повторный replay идемпотентен: падение между
+    записью снапшота и очисткой журнала ничего не ломает.
+
+    Файловые операции идут через общую очередь bot.utils.files; значения,
+    переданные в append/compact, после этого менять нельзя (copy-on-write).
+    """
+
+    def __init__(self, path: str, *, compact_every: int = 1000):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.compact_every = max(compact_every, 1)
+        self._pending = 0  # записей в журнале с момента последнего снапшота
+
+    async def load(self) -> dict[str, Any]:
+        return await run_io(self._load_sync)
+
+    def _load_sync(self) -> dict[str, Any]:
+        data: dict[str, Any] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError:
+                    data = {}
+
+        self._pending = 0
+        torn = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # недописанная строка после падения — дальше ничего нет
+                        torn = True
+                        break
+                    if rec.get("v") is None:
+                        data.pop(rec["k"], None)
+                    else:
+                        data[rec["k"]] = rec["v"]
+                    self._pending += 1
+
+        if torn:
+            # иначе следующая запись приклеится к обрывку и потеряется
+            self._compact_sync(data)
+            self._pending = 0
+
+        return data
+
+    def append(self, items: list[tuple[str, Any]]) -> asyncio.Future:
+        """Ставит записи в очередь (порядок сохраняется), возвращает future записи."""
+        lines = [json.dumps({"k": k, "v": v}, ensure_ascii=False) for k, v in items]
+        self._pending += len(lines)
+        return append_lines(self.journal_path, lines)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._pending >= self.compact_every
+
+    def compact(self, data: dict[str, Any]) -> asyncio.Future:
+        """Снапшот атомарно (tmp + rename) + обнуление журнала; data — неизменяемая копия."""
+        self._pending = 0
+        return run_io(self._compact_sync, data)
+
+    def _compact_sync(self, data: dict[str, Any]) -> None:
+        write_json_sync(self.path, data, 2)
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import bisect
+from typing import Any, Callable
+
+# Простейший реестр метрик: компонент регистрирует функцию, которая отдаёт
+# текущий снимок своих счётчиков; снимок всех компонентов отдаёт /metrics
+# на отдельном listener'е (bot/webhooks/metrics_server.py).
+_SOURCES: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register(name: str, source: Callable[[], dict[str, Any]]) -> None:
+    _SOURCES[name] = source
+
+
+def snapshot() -> dict[str, Any]:
+    result: dict[str, Any] = {}
+    for name, source in _SOURCES.items():
+        try:
+            result[name] = source()
+        except Exception as e:
+            result[name] = {"error": f"{type(e).__name__}: {e}"}
+    return result
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными границами корзин (мс), как у Prometheus."""
+
+    BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, buckets_ms: tuple[float, ...] = BUCKETS_MS):
+        self.buckets_ms = tuple(sorted(buckets_ms))
+        self.counts = [0] * (len(self.buckets_ms) + 1)  # последняя — +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def snapshot(self) -> dict[str, Any]:
+        buckets: dict[str, int] = {}
+        total = 0
+        for bound, n in zip(self.buckets_ms, self.counts):
+            total += n
+            buckets[f"le_{bound:g}"] = total  # накопительно
+        buckets["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 1) if self.count else None,
+            "buckets": buckets,
+        }
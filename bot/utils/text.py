@@ -4,12 +4,15 @@ def home_text() -> str:
 def catalog_text() -> str:
     ...
 
-def product_text(title, description, price_text: str):
-    return (
+def product_text(title, description, price_text: str, crypto_prices: dict[str, float] | None = None):
+    text = (
         f"📦 *{title}*\n\n"
         f"{description}\n\n"
         f"💰 Цена: {price_text}"
     )
+    if crypto_prices:
+        text += "\n🪙 " + " / ".join(f"≈ {amount} {asset}" for asset, amount in crypto_prices.items())
+    return text
 
 def profile_text(
     user_id: int,
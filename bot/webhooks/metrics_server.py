@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import hmac
+
+from aiohttp import web
+
+from bot.utils import metrics
+
+
+def create_metrics_app(token: str | None = None) -> web.Application:
+    """GET /metrics — снимок bot.utils.metrics; с token — только с заголовком Authorization: Bearer <token>."""
+
+    async def metrics_handler(request: web.Request) -> web.Response:
+        if token:
+            given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            if not hmac.compare_digest(given.encode(), token.encode()):
+                return web.json_response({"error": "unauthorized"}, status=401)
+        return web.json_response(metrics.snapshot())
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    return app
+
+
+async def start_metrics_server(host: str = "127.0.0.1", port: int = 9100, token: str | None = None) -> web.AppRunner:
+    """
+    Отдельный listener для метрик (по умолчанию только localhost), не на
+    публичном сервере вебхуков: там видны пул, реплика, кэши и т.п.
+    """
+    runner = web.AppRunner(create_metrics_app(token))
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
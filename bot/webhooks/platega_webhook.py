@@ -4,6 +4,10 @@ import asyncio
 import uuid
 from aiohttp import web
 
+from bot.config import PLATEGA_WEBHOOK_WORKERS, PLATEGA_WEBHOOK_QUEUE
+from bot.utils import metrics
+from bot.webhooks.worker_queue import DedupWorkQueue
+
 
 async def _fetch_meta_from_pg(pg_pool, tx_id: str) -> dict | None:
     if not pg_pool:
@@ -15,14 +19,14 @@ async def _fetch_meta_from_pg(pg_pool, tx_id: str) -> dict | None:
         return None
 
     try:
-        row = await pg_pool.fetchrow(
-            """
-            select ticket_id, user_id, product_id, promo_code, final_price_rub
-              from payments
-             where order_id = $1
-            """,
-            order_id,
-        )
+        from bot.db import replica  # lazy import
+        from bot.handlers.payments import _pg_payments  # lazy import
+        from bot.payments.pg_storage import PgPaymentsStorage  # lazy import
+
+        # мета заказа неизменна — читаем с реплики; строки там может ещё не быть
+        row = await replica.read(pg_pool, lambda p: PgPaymentsStorage(p).get_order(order_id))
+        if row is None:
+            row = await _pg_payments().get_order(order_id)
     except Exception:
         return None
 
@@ -36,68 +40,47 @@ async def _fetch_meta_from_pg(pg_pool, tx_id: str) -> dict | None:
         "product_id": row["product_id"],
         "promo_code": row["promo_code"],
         "final_price_rub": row["final_price_rub"],
+        "promo_hold_id": str(row["promo_hold_id"]) if row["promo_hold_id"] else None,
+        "bonus_spent": row["bonus_spent"],
     }
 
 
-async def _process_platega_tx(app: web.Application, tx_id: str) -> None:
+async def _process_platega_tx(app: web.Application, tx_id: str) -> bool:
     """
-    Фоновая обработка:
-    - ретраи на запрос статуса
-    - финализация только если CONFIRMED
-    - анти-дубликат через PgPaymentsStorage.mark_paid (единый механизм с polling)
+    Один job воркера очереди вебхуков — один запрос статуса (single-flight,
+    ретраи — только внутри клиента). Ошибка или нефинальный статус — воркер
+    не держим: дальше проверит планировщик, а Platega повторит вебхук.
+    Финальный статус обрабатывает тот же _check_platega_tx, что и планировщик
+    (анти-дубликат через mark_paid, финализация/отмена, platega_orders.pop).
+    True — статус финальный, повторные вебхуки по tx можно отбрасывать.
     """
     pg_pool = app.get("pg_pool")
-    bot = app["bot"]
-
-    # 1) получаем статус с ретраями
-    st = None
-    for _ in range(10):  # ~30 секунд
-        try:
-            from bot.services.platega_pay import platega_pay
-            st = await platega_pay.get_transaction(tx_id)
-            break
-        except Exception:
-            await asyncio.sleep(3)
-
-    if not st:
-        return
-
-    status = (st.get("status") or "").upper()
-    if status != "CONFIRMED":
-        return
-
-    # 2) анти-дубликат через общий PG-замок
+
+    # без общего PG-замка mark_paid финализирует только планировщик
     if not pg_pool:
-        return
+        return False
 
+    from bot.payments.platega_status import TERMINAL_STATUSES, platega_status  # lazy import
     try:
-        from bot.payments.pg_storage import PgPaymentsStorage
-        pg = PgPaymentsStorage(pg_pool)
-        first = await pg.mark_paid(uuid.UUID(str(tx_id)))
-    except Exception:
-        return
+        st = await platega_status.get(tx_id)
+    except Exception as e:
+        print(f"[platega] webhook status {tx_id} failed: {type(e).__name__}: {e}")
+        return False
 
-    if not first:
-        return  # уже финализировали polling'ом
+    if (st.get("status") or "").upper() not in TERMINAL_STATUSES:
+        return False
 
-    # 3) мета из PG
-    meta = await _fetch_meta_from_pg(pg_pool, tx_id)
+    # мета: у планировщика (с id сообщения об оплате) или из PG
+    from bot.handlers.payments import _check_platega_tx, platega_scheduler  # lazy import
+    meta = platega_scheduler.get(tx_id) or await _fetch_meta_from_pg(pg_pool, tx_id)
     if not meta:
-        return
-
-    # 4) финализация
-    from bot.handlers.payments import _finalize_purchase  # lazy import
-    await _finalize_purchase(
-        bot=bot,
-        ticket_id=meta.get("ticket_id"),
-        buyer_id=meta["buyer_id"],
-        buyer_username=meta.get("buyer_username"),
-        product_id=meta["product_id"],
-        amount_asset=str(meta.get("final_price_rub") or 0),
-        asset="RUB",
-        final_price_rub=meta.get("final_price_rub"),
-        promo_code=meta.get("promo_code"),
-    )
+        return True  # не наш / неизвестный платёж
+
+    # статус уже в кэше резолвера — повторного запроса к Platega не будет
+    done = await _check_platega_tx(tx_id, meta)
+    if done:
+        platega_scheduler.remove(tx_id)
+    return done
 
 
 async def platega_webhook(request: web.Request) -> web.Response:
@@ -125,7 +108,8 @@ async def platega_webhook(request: web.Request) -> web.Response:
         tx_id = data.get("transactionId") or data.get("id")
 
     if tx_id:
-        asyncio.create_task(_process_platega_tx(request.app, str(tx_id)))
+        # не ждём обработку; дубликаты и переполнение учитываются в метриках очереди
+        request.app["platega_queue"].submit(str(tx_id))
 
     return web.json_response({})  # 200
 
@@ -140,6 +124,17 @@ async def start_platega_webhook_server(
     app["bot"] = bot
     app["pg_pool"] = pg_pool
 
+    # ограниченная очередь + фиксированный пул воркеров вместо задачи на каждый POST
+    queue = DedupWorkQueue(
+        lambda tx_id: _process_platega_tx(app, tx_id),
+        workers=PLATEGA_WEBHOOK_WORKERS,
+        maxsize=PLATEGA_WEBHOOK_QUEUE,
+        name="platega-webhook",
+    )
+    queue.start()
+    app["platega_queue"] = queue
+    metrics.register("platega_webhooks", queue.stats)
+
     # и со слэшем, и без
     app.router.add_post("/webhooks/platega", platega_webhook)
     app.router.add_post("/webhooks/platega/", platega_webhook)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
+
+Handler = Callable[[str], Awaitable[bool]]
+
+
+class DedupWorkQueue:
+    """
+    Ограниченная очередь ключей (tx_id) с фиксированным пулом воркеров.
+
+    submit() не ждёт обработки. Ключ, который уже в очереди/в работе или
+    недавно обработан до финального статуса (handler вернул True), повторно
+    не ставится. Очередь полна — ключ отбрасывается (overflow): платёж всё
+    равно проверит планировщик статусов, а Platega повторит вебхук.
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        *,
+        workers: int = 4,
+        maxsize: int = 1000,
+        done_ttl: float = 10 * 60,
+        done_maxsize: int = 10_000,
+        name: str = "queue",
+    ):
+        self.handler = handler
+        self.workers = max(workers, 1)
+        self.maxsize = max(maxsize, 1)
+        self.done_ttl = done_ttl
+        self.done_maxsize = done_maxsize
+        self.name = name
+
+        self._queue: asyncio.Queue[tuple[str, float]] = asyncio.Queue(self.maxsize)
+        self._active: set[str] = set()  # в очереди или в работе
+        self._done: OrderedDict[str, float] = OrderedDict()  # key → monotonic завершения
+        self._tasks: list[asyncio.Task] = []
+
+        self.accepted = 0
+        self.duplicates = 0
+        self.overflow = 0
+        self.processed = 0
+        self.errors = 0
+        self._wait_ms: deque[float] = deque(maxlen=1000)
+        self._latency_ms: deque[float] = deque(maxlen=1000)
+
+    def submit(self, key: str) -> str:
+        """'queued' | 'duplicate' | 'overflow'."""
+        if key in self._active or self._recently_done(key):
+            self.duplicates += 1
+            return "duplicate"
+
+        try:
+            self._queue.put_nowait((key, time.monotonic()))
+        except asyncio.QueueFull:
+            self.overflow += 1
+            print(f"[{self.name}] queue full ({self.maxsize}), dropped {key}")
+            return "overflow"
+
+        self._active.add(key)
+        self.accepted += 1
+        return "queued"
+
+    def _recently_done(self, key: str) -> bool:
+        now = time.monotonic()
+        # записи упорядочены по времени завершения — протухшие снимаем с головы
+        while self._done:
+            _, at = next(iter(self._done.items()))
+            if now - at < self.done_ttl:
+                break
+            self._done.popitem(last=False)
+        return key in self._done
+
+    async def _worker(self) -> None:
+        while True:
+            key, enqueued = await self._queue.get()
+            started = time.monotonic()
+            self._wait_ms.append((started - enqueued) * 1000)
+            final = False
+            try:
+                final = await self.handler(key)
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name}] {key} failed: {type(e).__name__}: {e}")
+            finally:
+                self._active.discard(key)
+                self.processed += 1
+                self._latency_ms.append((time.monotonic() - enqueued) * 1000)
+                self._queue.task_done()
+
+            if final:
+                self._done[key] = time.monotonic()
+                self._done.move_to_end(key)
+                if len(self._done) > self.done_maxsize:
+                    self._done.popitem(last=False)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @staticmethod
+    def _percentiles(values: deque[float]) -> dict:
+        if not values:
+            return {"p50": None, "p95": None, "max": None}
+        ordered = sorted(values)
+        return {
+            "p50": round(ordered[len(ordered) // 2], 1),
+            "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 1),
+            "max": round(ordered[-1], 1),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "active": len(self._active),
+            "workers": len(self._tasks),
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "overflow": self.overflow,
+            "processed": self.processed,
+            "errors": self.errors,
+            "wait_ms": self._percentiles(self._wait_ms),
+            "latency_ms": self._percentiles(self._latency_ms),
+        }
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# bot.config читается при импорте: тестовый режим (JSON, без PG и платежей)
+os.environ.setdefault("APP_ENV", "test")
+os.environ.setdefault("BOT_TOKEN", "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
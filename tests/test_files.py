@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from bot.utils import files
+
+
+def test_read_json_missing_or_broken_file_is_empty(tmp_path):
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+
+    async def main():
+        return await files.read_json(str(tmp_path / "missing.json")), await files.read_json(str(broken))
+
+    assert asyncio.run(main()) == ({}, {})
+
+
+def test_operations_run_in_call_order(tmp_path):
+    path = str(tmp_path / "a.json")
+
+    async def main():
+        w = files.write_json(path, {"v": 1})
+        r = files.read_json(path)
+        w2 = files.write_json(path, {"v": 2})
+        await asyncio.gather(w, w2)
+        return await r, await files.read_json(path)
+
+    assert asyncio.run(main()) == ({"v": 1}, {"v": 2})
+
+
+def test_queued_writes_and_appends_are_merged(tmp_path, monkeypatch):
+    path = str(tmp_path / "a.json")
+    log = str(tmp_path / "a.log")
+    gate = threading.Event()
+    writes = []
+
+    real_write = files.write_json_sync
+
+    def counting_write(p, data, indent):
+        writes.append(data)
+        real_write(p, data, indent)
+
+    monkeypatch.setattr(files, "write_json_sync", counting_write)
+
+    async def main():
+        blocker = files.run_io(gate.wait)  # держит поток, пока ставим операции
+        futs = [files.write_json(path, {"v": i}) for i in range(5)]
+        futs.append(files.append_lines(log, ["x"]))
+        futs.append(files.append_lines(log, ["y", "z"]))
+        gate.set()
+        await asyncio.gather(blocker, *futs)
+        return await files.read_json(path)
+
+    assert asyncio.run(main()) == {"v": 4}
+    assert writes == [{"v": 4}]
+    assert (tmp_path / "a.log").read_text(encoding="utf-8") == "x\ny\nz\n"
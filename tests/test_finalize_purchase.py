@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot.handlers.payments as payments
+from bot.payments.pg_storage import PurchaseFinalized
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def get_chat(self, chat_id):
+        return SimpleNamespace(username="buyer")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+
+class FakePg:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = []
+
+    async def finalize_purchase(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = SimpleNamespace(stepwise=[], invalidated=[])
+
+    async def stepwise(*args):
+        state.stepwise.append(args)
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(payments, "_apply_purchase_stepwise", stepwise)
+    monkeypatch.setattr(payments, "notify_managers", noop)
+    monkeypatch.setattr(payments, "send_ticket_to_group", noop)
+    monkeypatch.setattr(
+        payments, "user_service", SimpleNamespace(invalidate_profile=lambda *ids: state.invalidated.extend(ids))
+    )
+    return state
+
+
+def _finalize(**kwargs):
+    bot = FakeBot()
+    asyncio.run(payments._finalize_purchase(
+        bot, ticket_id="T1", buyer_id=10, product_id="p", final_price_rub=1000, bonus_spent=50, **kwargs
+    ))
+    return bot
+
+
+def test_pg_transaction_replaces_stepwise_updates(env, monkeypatch):
+    pg = FakePg(PurchaseFinalized(ref_id=20, bonus_balance=100, referrer_credited=True))
+    monkeypatch.setattr(payments, "_pg_payments", lambda: pg)
+
+    bot = _finalize(promo_code="SALE", promo_hold_id="h1")
+
+    assert pg.calls == [dict(
+        buyer_id=10, amount_rub=1000, bonus_spent=50, bonus_earned=100,
+        referrer_bonus=100, promo_code="SALE", promo_hold_id="h1",
+    )]
+    assert env.stepwise == []
+    assert env.invalidated == [10, 20]
+    assert bot.sent == [10]
+
+
+def test_failed_transaction_falls_back_to_stepwise(env, monkeypatch):
+    monkeypatch.setattr(payments, "_pg_payments", lambda: FakePg(error=RuntimeError("pg down")))
+
+    _finalize()
+
+    assert env.stepwise == [(10, 1000, 50, 100, None, None)]
+    assert env.invalidated == []
+
+
+def test_without_pg_applies_stepwise(env, monkeypatch):
+    monkeypatch.setattr(payments, "_pg_payments", lambda: None)
+
+    _finalize()
+
+    assert len(env.stepwise) == 1
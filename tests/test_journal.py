@@ -0,0 +1,93 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from bot.users.storage import JsonUserStorage
+from bot.utils.journal import JsonJournal
+
+
+def _user(uid: int, username: str = "u"):
+    return SimpleNamespace(id=uid, username=username, first_name=None, last_name=None)
+
+
+def test_journal_replays_over_snapshot(tmp_path):
+    path = str(tmp_path / "data.json")
+
+    async def main():
+        j = JsonJournal(path)
+        await j.compact({"a": 1, "b": 2})
+        await j.append([("a", 10), ("b", None), ("c", 3)])
+        return await JsonJournal(path).load()
+
+    assert asyncio.run(main()) == {"a": 10, "c": 3}
+
+
+def test_torn_last_line_is_dropped_and_journal_rewritten(tmp_path):
+    path = str(tmp_path / "data.json")
+
+    async def main():
+        j = JsonJournal(path)
+        await j.append([("a", 1), ("b", 2)])
+        with open(j.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"k": "c", "v"')  # падение посреди записи
+
+        j2 = JsonJournal(path)
+        data = await j2.load()
+        # новая запись не должна приклеиться к обрывку
+        await j2.append([("d", 4)])
+        return data, await JsonJournal(path).load()
+
+    first, second = asyncio.run(main())
+    assert first == {"a": 1, "b": 2}
+    assert second == {"a": 1, "b": 2, "d": 4}
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    path = tmp_path / "data.json"
+
+    async def main():
+        j = JsonJournal(str(path), compact_every=2)
+        await j.append([("a", 1)])
+        assert not j.needs_compaction
+        await j.append([("b", 2)])
+        assert j.needs_compaction
+        await j.compact({"a": 1, "b": 2})
+        assert not j.needs_compaction
+
+    asyncio.run(main())
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 1, "b": 2}
+    assert (tmp_path / "data.json.journal").read_text(encoding="utf-8") == ""
+
+
+def test_user_storage_survives_reload(tmp_path):
+    path = str(tmp_path / "users.json")
+
+    async def main():
+        s = JsonUserStorage(path, compact_every=3)
+        await s.upsert_user(_user(1, "a"))
+        await s.upsert_users([
+            SimpleNamespace(id=2, username="b", first_name=None, last_name=None, seen_at=datetime.now(timezone.utc)),
+        ])
+        await s.add_purchase(1, 100)
+        await s.upsert_user(_user(1, "renamed"))
+
+        reloaded = JsonUserStorage(path)
+        return await reloaded.get_profile(1), await reloaded.get_profile(2), await reloaded.get_profile(3)
+
+    p1, p2, p3 = asyncio.run(main())
+    assert p1["username"] == "renamed"
+    assert p1["total_purchases"] == 1 and p1["total_spent_rub"] == 100
+    assert p2["username"] == "b"
+    assert p3 == {}
+
+
+def test_user_storage_returns_copies(tmp_path):
+    async def main():
+        s = JsonUserStorage(str(tmp_path / "users.json"))
+        profile = await s.upsert_user_returning(_user(1))
+        profile["bonus_balance"] = 999
+        return await s.get_profile(1)
+
+    assert "bonus_balance" not in asyncio.run(main())
+
@@ -0,0 +1,43 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.utils import metrics
+from bot.webhooks.metrics_server import create_metrics_app
+
+
+def _get(app, *headers):
+    """GET /metrics с каждым из наборов заголовков: [(status, body), ...]."""
+    async def main():
+        result = []
+        async with TestClient(TestServer(app)) as client:
+            for h in headers or ({},):
+                resp = await client.get("/metrics", headers=h)
+                result.append((resp.status, await resp.json()))
+        return result
+
+    return asyncio.run(main())
+
+
+def test_metrics_snapshot_served(monkeypatch):
+    monkeypatch.setattr(metrics, "_SOURCES", {"ok": lambda: {"n": 1}, "broken": lambda: 1 / 0})
+
+    [(status, body)] = _get(create_metrics_app())
+
+    assert status == 200
+    assert body["ok"] == {"n": 1}
+    assert body["broken"]["error"].startswith("ZeroDivisionError")
+
+
+def test_metrics_token_required(monkeypatch):
+    monkeypatch.setattr(metrics, "_SOURCES", {"ok": lambda: {"n": 1}})
+    results = _get(
+        create_metrics_app(token="secret"),
+        {},
+        {"Authorization": "Bearer wrong"},
+        {"Authorization": "Bearer secret"},
+    )
+
+    assert [status for status, _ in results] == [401, 401, 200]
+    assert results[-1][1] == {"ok": {"n": 1}}
+
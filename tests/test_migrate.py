@@ -0,0 +1,67 @@
+import asyncio
+
+from bot.db import migrate
+from bot.db.statements import STATEMENTS
+
+
+def test_migrations_are_ordered_and_unique():
+    found = migrate.discover()
+    versions = [m.version for m in found]
+
+    assert versions == sorted(versions)
+    assert len(set(versions)) == len(versions)
+    assert all(v.isdigit() and len(v) == 4 for v in versions)
+    assert found[0].name == "base_schema"
+
+
+def test_checksum_tracks_content(tmp_path):
+    (tmp_path / "0002_b.sql").write_text("SELECT 2;", encoding="utf-8")
+    (tmp_path / "0001_a.sql").write_text("SELECT 1;", encoding="utf-8")
+    first = migrate.discover(tmp_path)
+
+    (tmp_path / "0001_a.sql").write_text("SELECT 1; -- changed", encoding="utf-8")
+    second = migrate.discover(tmp_path)
+
+    assert [(m.version, m.name) for m in first] == [("0001", "a"), ("0002", "b")]
+    assert first[0].checksum != second[0].checksum
+    assert first[1].checksum == second[1].checksum
+
+
+def test_every_hot_query_is_registered():
+    migrate.register_statements()
+    assert set(migrate.HOT_QUERIES) <= set(STATEMENTS)
+
+
+def test_seq_scans_found_in_nested_plan():
+    plan = {
+        "Node Type": "Nested Loop",
+        "Plans": [
+            {"Node Type": "Index Scan", "Relation Name": "users"},
+            {"Node Type": "Aggregate", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "promo_usages"}]},
+        ],
+    }
+    assert migrate._seq_scans(plan) == ["promo_usages"]
+
+
+class FakeConn:
+    def __init__(self, applied):
+        self.applied = applied
+
+    async def fetchval(self, sql, *args):
+        return None if self.applied is None else "schema_migrations"
+
+    async def fetch(self, sql, *args):
+        return [{"version": v, "checksum": "x"} for v in self.applied]
+
+
+def test_pending_without_and_with_schema_migrations():
+    all_versions = [m.version for m in migrate.discover()]
+
+    async def main():
+        fresh = await migrate.pending(FakeConn(None))
+        partial = await migrate.pending(FakeConn(all_versions[:2]))
+        return [m.version for m in fresh], [m.version for m in partial]
+
+    fresh, partial = asyncio.run(main())
+    assert fresh == all_versions
+    assert partial == all_versions[2:]
@@ -0,0 +1,165 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import bot.handlers.payments as payments
+from bot.db.sqlite import SqliteDb
+from bot.payments.platega_orders import PendingPlategaOrder
+from bot.payments.sqlite_orders import SqlitePlategaOrders
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.added = {}
+
+    def add(self, tx_id, meta, *, age=0.0, first_check=None):
+        self.added[tx_id] = (meta, age)
+
+
+def _order(created_at: datetime) -> PendingPlategaOrder:
+    return PendingPlategaOrder(
+        ticket_id="T",
+        buyer_id=1,
+        buyer_username=None,
+        product_id="p",
+        promo_code=None,
+        final_price_rub=100,
+        created_at=created_at.replace(tzinfo=None).isoformat(),
+    )
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    s = FakeScheduler()
+    monkeypatch.setattr(payments, "platega_scheduler", s)
+    return s
+
+
+def test_local_recovery_expires_old_and_requeues_live(tmp_path, monkeypatch, scheduler):
+    now = datetime.now(timezone.utc)
+    orders = SqlitePlategaOrders(SqliteDb(str(tmp_path / "store.sqlite3")))
+    monkeypatch.setattr(payments, "platega_orders", orders)
+    monkeypatch.setattr(payments, "_pg_payments", lambda: None)
+
+    async def main():
+        await orders.put("live", _order(now - timedelta(minutes=2)))
+        await orders.put("stale", _order(now - timedelta(days=2)))
+        await payments.recover_pending_payments()
+        return await orders.all()
+
+    left = asyncio.run(main())
+    assert set(left) == {"live"}
+    assert set(scheduler.added) == {"live"}
+    assert 100 <= scheduler.added["live"][1] <= 140  # возраст — от created_at
+
+
+def test_pg_recovery_routes_sbp_to_scheduler_and_crypto_to_polling(tmp_path, monkeypatch, scheduler):
+    now = datetime.now(timezone.utc)
+    sbp_id = uuid.uuid4()
+    calls = SimpleNamespace(cutoffs=[], invoice_ids=[], polled=[])
+
+    class Pg:
+        async def expire_stale(self, before):
+            calls.cutoffs.append(before)
+            return 3
+
+        async def list_pending(self, since):
+            calls.cutoffs.append(since)
+            return [
+                dict(order_id=sbp_id, ticket_id="T1", user_id=5, product_id="p", promo_code=None,
+                     final_price_rub=100, bonus_spent=10, promo_hold_id=None, payment_method="sbp",
+                     created_at=now - timedelta(minutes=1)),
+                dict(order_id=uuid.uuid4(), ticket_id="777", payment_method="crypto", created_at=now),
+                dict(order_id=uuid.uuid4(), ticket_id="778", payment_method="crypto", created_at=now),
+            ]
+
+    class Invoice:
+        def __init__(self, invoice_id, status, created_at):
+            self.invoice_id, self.status, self.created_at = invoice_id, status, created_at
+            self.expiration_date = None
+
+        def poll(self, message=None):
+            calls.polled.append(self.invoice_id)
+
+    async def get_invoices(invoice_ids, count=None):
+        calls.invoice_ids.extend(invoice_ids)
+        return [Invoice(777, "active", now), Invoice(778, "expired", now)]
+
+    monkeypatch.setattr(payments, "_pg_payments", lambda: Pg())
+    monkeypatch.setattr(payments, "platega_orders", SqlitePlategaOrders(SqliteDb(str(tmp_path / "s.sqlite3"))))
+    monkeypatch.setattr(payments, "crypto_pay", SimpleNamespace(get_invoices=get_invoices))
+
+    asyncio.run(payments.recover_pending_payments())
+
+    assert calls.cutoffs[0] == calls.cutoffs[1] < now
+    meta, age = scheduler.added[str(sbp_id)]
+    assert meta["buyer_id"] == 5 and meta["bonus_spent"] == 10 and 50 <= age <= 70
+    assert len(scheduler.added) == 1
+    assert calls.invoice_ids == [777, 778]
+    assert calls.polled == [777]
+
+
+class FakeCryptoPay:
+    """getInvoices как у Crypto Pay: без count — не больше 100 счетов."""
+
+    def __init__(self, created_at):
+        self.created_at = created_at
+        self.requests = []
+        self._invoice_tasks = {}
+
+    async def get_invoices(self, invoice_ids, count=None):
+        self.requests.append((len(invoice_ids), count))
+        return [self._invoice(i) for i in invoice_ids[:count or 100]]
+
+    def _invoice(self, invoice_id):
+        tasks = self._invoice_tasks
+
+        class Invoice:
+            status = "active"
+            expiration_date = None
+
+            def poll(self, **kwargs):
+                tasks[self.invoice_id] = SimpleNamespace(timeout=300, data=kwargs)  # таймаут менеджера
+
+        invoice = Invoice()
+        invoice.invoice_id, invoice.created_at = invoice_id, self.created_at
+        return invoice
+
+
+def _crypto_rows(ids, created_at):
+    return [dict(order_id=uuid.uuid4(), ticket_id=str(i), payment_method="crypto", created_at=created_at) for i in ids]
+
+
+def _run_crypto_recovery(tmp_path, monkeypatch, rows, fake):
+    class Pg:
+        async def expire_stale(self, before):
+            return 0
+
+        async def list_pending(self, since):
+            return rows
+
+    monkeypatch.setattr(payments, "_pg_payments", lambda: Pg())
+    monkeypatch.setattr(payments, "platega_orders", SqlitePlategaOrders(SqliteDb(str(tmp_path / "s.sqlite3"))))
+    monkeypatch.setattr(payments, "crypto_pay", fake)
+    asyncio.run(payments.recover_pending_payments())
+
+
+def test_crypto_recovery_requests_whole_batch(tmp_path, monkeypatch, scheduler):
+    created = datetime.now(timezone.utc) - timedelta(minutes=1)
+    fake = FakeCryptoPay(created)
+    _run_crypto_recovery(tmp_path, monkeypatch, _crypto_rows(range(1, 1251), created), fake)
+
+    assert fake.requests == [(1000, 1000), (250, 250)]
+    assert set(fake._invoice_tasks) == set(range(1, 1251))
+
+
+def test_crypto_recovery_polls_for_remaining_lifetime_only(tmp_path, monkeypatch, scheduler):
+    created = datetime.now(timezone.utc) - timedelta(seconds=payments.CRYPTO_INVOICE_TTL - 60)
+    fake = FakeCryptoPay(created)
+    _run_crypto_recovery(tmp_path, monkeypatch, _crypto_rows([1], created), fake)
+
+    assert 50 <= fake._invoice_tasks[1].timeout <= 61
+    assert fake._invoice_tasks[1].data == {"message": None}
@@ -0,0 +1,135 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.db import breaker as breaker_mod
+from bot.db.breaker import CircuitBreaker, CircuitOpenError
+from bot.users.cache import ProfileCache
+from bot.users.replay import ReplayLog
+from bot.users.service import UserService
+
+
+async def _ok():
+    return "ok"
+
+
+async def _fail():
+    raise ConnectionError("pg down")
+
+
+def _call(b, fn):
+    async def main():
+        try:
+            return await b.call(fn)
+        except Exception as e:
+            return type(e)
+
+    return asyncio.run(main())
+
+
+def test_breaker_opens_fast_fails_and_recovers(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(breaker_mod.time, "monotonic", lambda: now[0])
+    closed = []
+    b = CircuitBreaker("t", failure_threshold=2, reset_timeout=10, on_close=lambda: closed.append(1))
+
+    assert _call(b, _fail) is ConnectionError
+    assert b.state == "closed"
+    assert _call(b, _fail) is ConnectionError
+    assert b.state == "open"
+    assert _call(b, _ok) is CircuitOpenError
+
+    now[0] += 10
+    assert _call(b, _fail) is ConnectionError  # неудачная проба — снова open
+    assert b.state == "open"
+    assert _call(b, _ok) is CircuitOpenError
+
+    now[0] += 10
+    assert _call(b, _ok) == "ok"
+    assert b.state == "closed" and closed == [1]
+    assert b.stats()["opened_total"] == 2 and b.stats()["fast_failed"] == 2
+
+
+def test_breaker_times_out_slow_calls():
+    async def slow():
+        await asyncio.sleep(1)
+
+    b = CircuitBreaker("t", failure_threshold=1, call_timeout=0.01)
+    assert _call(b, slow) is asyncio.TimeoutError
+    assert b.state == "open"
+
+
+def test_replay_log_drains_once_and_keeps_records_on_failure(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+
+    async def main():
+        log = ReplayLog(path)
+        await log.append("add_bonus", {"user_id": 1, "amount": 10})
+
+        async def broken(records):
+            raise ConnectionError("pg down")
+
+        with pytest.raises(ConnectionError):
+            await log.drain(broken)
+
+        # пока PG лежал, пришла ещё одна запись — догоняются обе
+        await log.append("add_purchase", {"user_id": 1, "amount_rub": 100})
+        seen = []
+
+        async def apply(records):
+            seen.extend(records)
+            return len(records)
+
+        applied = await log.drain(apply)
+        return applied, seen, await log.drain(apply), log.stats()
+
+    applied, seen, again, stats = asyncio.run(main())
+    assert applied == 2 and again == 0
+    assert [r["op"] for r in seen] == ["add_bonus", "add_purchase"]
+    assert len({r["key"] for r in seen}) == 2
+    assert stats == {"pending": 0}
+
+
+class LocalStorage:
+    def __init__(self):
+        self.bonus = []
+
+    async def get_profile(self, user_id):
+        return {"id": user_id, "bonus_balance": 1}
+
+    async def add_bonus(self, user_id, amount):
+        self.bonus.append((user_id, amount))
+
+
+def test_service_falls_back_journals_writes_and_does_not_cache(tmp_path):
+    down_pool = SimpleNamespace()  # любой вызов PgUserStorage падает
+
+    async def main():
+        local = LocalStorage()
+        service = UserService(
+            local,
+            cache=ProfileCache(),
+            breaker=CircuitBreaker("t", failure_threshold=1),
+            replay_log=ReplayLog(str(tmp_path / "replay.jsonl")),
+        )
+        profile = await service.get_profile(1, down_pool)
+        primary = await service.get_profile(1, down_pool, primary=True)
+        await service.add_bonus(1, 5, pool=down_pool)
+        return service, local, profile, primary
+
+    service, local, profile, primary = asyncio.run(main())
+    assert profile == primary == {"id": 1, "bonus_balance": 1}
+    assert service.cache.peek(1) is None
+    assert local.bonus == [(1, 5)]
+    assert service.replay_log.pending == 1
+    assert service.breaker.state == "open"
+
+
+def test_service_without_pool_caches_local_profile():
+    async def main():
+        service = UserService(LocalStorage(), cache=ProfileCache())
+        await service.get_profile(1)
+        return service.cache.peek(1)
+
+    assert asyncio.run(main()) == {"id": 1, "bonus_balance": 1}
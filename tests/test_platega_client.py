@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.services.platega_pay import CallPolicy, PlategaClient, PlategaError, RetryBudget
+
+FAST_STATUS = CallPolicy(connect=1, read=1, total=2, retries=2, backoff=0.001)
+FAST_CREATE = CallPolicy(connect=1, read=1, total=2)
+
+
+def _run(responses, scenario, **client_kwargs):
+    """Поднимает stand-in Platega, отвечающий по очереди из responses; возвращает (результат, запросы)."""
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requests.append((request.method, request.path, request.headers.get("X-MerchantId")))
+        status, body = responses.pop(0)
+        if isinstance(body, str):
+            return web.Response(text=body, status=status, content_type="text/plain")
+        return web.json_response(body, status=status)
+
+    async def main():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        async with TestServer(app) as server:
+            client = PlategaClient(
+                "m1", "s1",
+                base_url=str(server.make_url("/")),
+                status_policy=FAST_STATUS,
+                create_policy=FAST_CREATE,
+                **client_kwargs,
+            )
+            try:
+                return await scenario(client), client.stats()
+            finally:
+                await client.close()
+
+    (result, stats) = asyncio.run(main())
+    return result, stats, requests
+
+
+async def _status(client):
+    try:
+        return await client.get_transaction("tx1")
+    except PlategaError as e:
+        return e
+
+
+def test_status_retried_on_5xx_then_succeeds():
+    result, stats, requests = _run([(502, {}), (503, {}), (200, {"status": "CONFIRMED"})], _status)
+
+    assert result == {"status": "CONFIRMED"}
+    assert requests == [("GET", "/transaction/tx1", "m1")] * 3
+    assert stats["retries"] == 2 and stats["errors"]["status"] == 2
+    assert stats["latency"]["status"]["count"] == 3
+
+
+def test_client_error_is_not_retried():
+    result, stats, requests = _run([(404, {"error": "not found"})], _status)
+
+    assert isinstance(result, PlategaError) and result.status == 404 and not result.retryable
+    assert len(requests) == 1 and stats["retries"] == 0
+
+
+def test_plain_text_client_error_is_not_retried():
+    result, stats, requests = _run([(400, "bad request")], _status)
+
+    assert isinstance(result, PlategaError) and result.status == 400 and not result.retryable
+    assert "bad request" in str(result)
+    assert len(requests) == 1 and stats["retries"] == 0
+    assert stats["retry_budget"] == 10  # бюджет на клиентскую ошибку не тратится
+
+
+def test_retries_stop_when_budget_is_spent():
+    budget = RetryBudget(ratio=0.1, reserve=1)
+    result, stats, requests = _run([(500, {}), (500, {}), (500, {})], _status, retry_budget=budget)
+
+    assert isinstance(result, PlategaError) and result.status == 500
+    assert len(requests) == 2  # один повтор из запаса, второй — отказ бюджета
+    assert stats["retries"] == 1 and stats["retries_denied"] == 1
+
+
+def test_create_is_never_retried():
+    async def create(client):
+        with pytest.raises(PlategaError):
+            await client.create_sbp_payment(500, "desc", "payload", "https://ok", "https://fail")
+
+    _, stats, requests = _run([(500, {})], create)
+
+    assert requests == [("POST", "/transaction/process", "m1")]
+    assert stats["retries"] == 0 and stats["errors"]["create"] == 1
+
+
+def test_retry_budget_refills_with_requests():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.on_request()
+    budget.on_request()
+    assert budget.try_spend()
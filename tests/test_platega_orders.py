@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bot.payments.platega_orders import PendingPlategaOrder, PlategaOrders
+
+
+def _order(ticket_id: str, age: timedelta = timedelta()) -> PendingPlategaOrder:
+    return PendingPlategaOrder(
+        ticket_id=ticket_id,
+        buyer_id=1,
+        buyer_username=None,
+        product_id="p",
+        promo_code=None,
+        final_price_rub=100,
+        created_at=(datetime.utcnow() - age).isoformat(),
+    )
+
+
+def test_put_pop_get_survive_reload(tmp_path):
+    path = str(tmp_path / "orders.json")
+
+    async def main():
+        s = PlategaOrders(path)
+        await s.put("a", _order("A"))
+        await s.put("b", _order("B"))
+        popped = await s.pop("a")
+        reloaded = PlategaOrders(path)
+        return popped, await reloaded.get("a"), await reloaded.get("b")
+
+    popped, a, b = asyncio.run(main())
+    assert popped["ticket_id"] == "A"
+    assert a is None and b["ticket_id"] == "B"
+
+
+def test_pop_of_missing_order_writes_nothing(tmp_path):
+    path = tmp_path / "orders.json"
+
+    async def main():
+        s = PlategaOrders(str(path))
+        await s.put("a", _order("A"))
+        size = (tmp_path / "orders.json.journal").stat().st_size
+        assert await s.pop("missing") is None
+        return size
+
+    size = asyncio.run(main())
+    assert (tmp_path / "orders.json.journal").stat().st_size == size
+
+
+def test_stale_orders_pruned_on_load_and_compaction(tmp_path):
+    path = str(tmp_path / "orders.json")
+
+    async def main():
+        s = PlategaOrders(path, ttl=60, compact_every=3)
+        await s.put("old", _order("O", timedelta(minutes=5)))
+        await s.put("new", _order("N"))
+        on_load = await PlategaOrders(path, ttl=60).all()
+
+        await s.put("newer", _order("N2"))  # третья запись — компакция с чисткой
+        return on_load, await s.all(), await PlategaOrders(path, ttl=3600).all()
+
+    on_load, after_compact, on_disk = asyncio.run(main())
+    assert set(on_load) == {"new"}
+    assert set(after_compact) == set(on_disk) == {"new", "newer"}
+
+
+def test_expire_before(tmp_path):
+    async def main():
+        s = PlategaOrders(str(tmp_path / "orders.json"), ttl=3600)
+        await s.put("old", _order("O", timedelta(minutes=30)))
+        await s.put("new", _order("N"))
+        cutoff = (datetime.utcnow() - timedelta(minutes=10)).isoformat()
+        return await s.expire_before(cutoff), await s.expire_before(cutoff), await s.all()
+
+    removed, again, left = asyncio.run(main())
+    assert (removed, again) == (1, 0)
+    assert set(left) == {"new"}
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from bot.payments import platega_scheduler as sched_mod
+from bot.payments.platega_scheduler import PlategaScheduler, backoff_interval
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(sched_mod, "backoff_interval", lambda age: 0.01)
+
+
+def test_backoff_grows_with_payment_age():
+    assert [backoff_interval(a) for a in (0, 59, 60, 299, 300, 900, 10_000)] == [5, 5, 10, 10, 20, 30, 30]
+
+
+async def _wait_for(cond, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if cond():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_rechecks_until_final_status(fast_backoff):
+    calls = []
+
+    async def on_check(tx_id, meta):
+        calls.append((tx_id, meta["n"]))
+        if len(calls) == 2:
+            raise RuntimeError("platega 502")  # ошибка — просто следующая проверка
+        return len(calls) >= 3
+
+    async def on_expire(tx_id, meta):
+        raise AssertionError("must not expire")
+
+    async def main():
+        s = PlategaScheduler(on_check, on_expire, min_gap=0)
+        s.start()
+        s.add("tx", {"n": 1}, first_check=0)
+        await _wait_for(lambda: "tx" not in s)
+        await s.stop()
+        return s.stats()
+
+    stats = asyncio.run(main())
+    assert calls == [("tx", 1)] * 3
+    assert stats["completed"] == 1 and stats["errors"] == 1 and stats["pending"] == 0
+
+
+def test_expires_after_ttl_counting_restart_age(fast_backoff):
+    expired = []
+
+    async def on_check(tx_id, meta):
+        return False
+
+    async def on_expire(tx_id, meta):
+        expired.append(tx_id)
+
+    async def main():
+        s = PlategaScheduler(on_check, on_expire, ttl=60, min_gap=0)
+        s.start()
+        s.add("old", {}, age=59.95)  # после рестарта: осталось 50 мс
+        s.add("new", {})
+        await _wait_for(lambda: expired)
+        pending = "new" in s
+        await s.stop()
+        return pending
+
+    assert asyncio.run(main()) is True
+    assert expired == ["old"]
+
+
+def test_removed_payment_is_not_checked(fast_backoff):
+    calls = []
+
+    async def on_check(tx_id, meta):
+        calls.append(tx_id)
+        return True
+
+    async def on_expire(tx_id, meta):
+        pass
+
+    async def main():
+        s = PlategaScheduler(on_check, on_expire, min_gap=0)
+        s.start()
+        s.add("a", {}, first_check=0.05)
+        s.add("b", {}, first_check=0.05)
+        s.remove("a")
+        await _wait_for(lambda: calls)
+        await asyncio.sleep(0.05)
+        await s.stop()
+
+    asyncio.run(main())
+    assert calls == ["b"]
+
+
+def test_concurrency_cap():
+    active = 0
+    peak = 0
+
+    async def on_check(tx_id, meta):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return True
+
+    async def on_expire(tx_id, meta):
+        pass
+
+    async def main():
+        s = PlategaScheduler(on_check, on_expire, max_inflight=2, min_gap=0)
+        s.start()
+        for i in range(8):
+            s.add(f"tx{i}", {}, first_check=0)
+        await _wait_for(lambda: len(s) == 0)
+        await s.stop()
+        return s.stats()["completed"]
+
+    assert asyncio.run(main()) == 8
+    assert peak == 2
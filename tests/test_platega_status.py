@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from bot.payments import platega_status as status_mod
+from bot.payments.platega_status import StatusResolver
+
+
+class Upstream:
+    def __init__(self, *statuses, delay=0.01):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, tx_id):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        st = self.statuses.pop(0)
+        if isinstance(st, Exception):
+            raise st
+        return {"id": tx_id, "status": st}
+
+
+def test_concurrent_gets_share_one_request():
+    async def main():
+        upstream = Upstream("PENDING")
+        r = StatusResolver(upstream)
+        results = await asyncio.gather(*(r.get("tx") for _ in range(5)))
+        return results, upstream.calls, r.stats()
+
+    results, calls, stats = asyncio.run(main())
+    assert results == [{"id": "tx", "status": "PENDING"}] * 5
+    assert calls == 1 and stats["shared"] == 4 and stats["inflight"] == 0
+
+
+def test_only_terminal_status_is_cached(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(status_mod.time, "monotonic", lambda: now[0])
+
+    async def main():
+        upstream = Upstream("PENDING", "confirmed", "CONFIRMED", delay=0)
+        r = StatusResolver(upstream, terminal_ttl=60)
+        seen = [(await r.get("tx"))["status"] for _ in range(3)]
+        now[0] += 61
+        seen.append((await r.get("tx"))["status"])
+        return seen, upstream.calls, r.stats()["cache_hits"]
+
+    seen, calls, hits = asyncio.run(main())
+    assert seen == ["PENDING", "confirmed", "confirmed", "CONFIRMED"]
+    assert calls == 3 and hits == 1
+
+
+def test_error_is_shared_and_not_cached():
+    async def main():
+        upstream = Upstream(RuntimeError("502"), "CANCELED")
+        r = StatusResolver(upstream)
+        results = await asyncio.gather(r.get("tx"), r.get("tx"), return_exceptions=True)
+        return results, await r.get("tx"), upstream.calls
+
+    results, after, calls = asyncio.run(main())
+    assert all(isinstance(e, RuntimeError) for e in results)
+    assert after["status"] == "CANCELED" and calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_request():
+    async def main():
+        upstream = Upstream("CONFIRMED", delay=0.02)
+        r = StatusResolver(upstream)
+        first = asyncio.create_task(r.get("tx"))
+        second = asyncio.create_task(r.get("tx"))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, upstream.calls
+
+    result, calls = asyncio.run(main())
+    assert result["status"] == "CONFIRMED" and calls == 1
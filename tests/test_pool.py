@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from bot.db.pool import InstrumentedPool, PgConfig, warm_pool
+
+
+class FakePool:
+    """Минимум asyncpg.Pool: acquire/release и размеры."""
+
+    def __init__(self, size: int = 2):
+        self.size = size
+        self.free = asyncio.Queue()
+        for i in range(size):
+            self.free.put_nowait(FakeConn(i))
+        self.max_concurrent = 0
+
+    async def acquire(self, *, timeout=None):
+        conn = await asyncio.wait_for(self.free.get(), timeout)
+        self.max_concurrent = max(self.max_concurrent, self.size - self.free.qsize())
+        return conn
+
+    async def release(self, conn):
+        self.free.put_nowait(conn)
+
+    def get_size(self):
+        return self.size
+
+    def get_idle_size(self):
+        return self.free.qsize()
+
+    get_min_size = get_max_size = get_size
+
+
+class FakeConn:
+    def __init__(self, n):
+        self.n = n
+        self.executed = []
+
+    async def execute(self, sql):
+        self.executed.append(sql)
+        await asyncio.sleep(0.01)
+
+
+def test_acquire_releases_and_counts():
+    async def main():
+        raw = FakePool(size=1)
+        pool = InstrumentedPool(raw, acquire_timeout=0.05)
+        async with pool.acquire() as conn:
+            with pytest.raises(asyncio.TimeoutError):
+                async with pool.acquire():
+                    pass
+        async with pool.acquire() as again:
+            pass
+        return conn, again, pool.stats()
+
+    conn, again, stats = asyncio.run(main())
+    assert conn is again
+    assert stats["acquires"] == 3 and stats["acquire_timeouts"] == 1
+    assert stats["waiting"] == 0 and stats["idle"] == 1
+    assert stats["acquire_wait_max_ms"] >= 40
+
+
+def test_unknown_attributes_proxy_to_pool():
+    pool = InstrumentedPool(FakePool(size=3))
+    assert pool.get_size() == 3
+
+
+def test_warm_pool_holds_min_size_connections_at_once():
+    async def main():
+        raw = FakePool(size=3)
+        await warm_pool(InstrumentedPool(raw))
+        return raw
+
+    raw = asyncio.run(main())
+    assert raw.max_concurrent == 3
+
+
+def test_config_from_env(monkeypatch):
+    for k, v in {
+        "PG_HOST": "db", "PG_DB": "store", "PG_USER": "bot", "PG_PASS": "pw",
+        "PG_POOL_MAX": "20", "PG_ACQUIRE_TIMEOUT": "2.5", "PG_STATEMENT_CACHE_SIZE": "",
+        "PG_REPLICA_HOST": "ro", "PG_REPLICA_POOL_MIN": "0",
+    }.items():
+        monkeypatch.setenv(k, v)
+
+    cfg = PgConfig.from_env()
+    replica = cfg.replica_from_env()
+
+    assert (cfg.host, cfg.max_size, cfg.acquire_timeout, cfg.statement_cache_size) == ("db", 20, 2.5, None)
+    assert (replica.host, replica.user, replica.min_size, replica.max_size) == ("ro", "bot", 0, 20)
+    assert replica.application_name == "store-bot-ro"
+
+    monkeypatch.delenv("PG_REPLICA_HOST")
+    assert cfg.replica_from_env() is None
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+import bot.payments.price_table as price_table_module
+from bot.data.products import Product
+from bot.payments.price_table import PriceTable, cross_rate
+from bot.payments.rates_cache import RatesUnavailable
+
+PRODUCT = Product(id="p1", title="P", description="", price_rub=1000, category_id="c")
+RATES = {("TON", "RUB"): 250.0, ("USDT", "RUB"): 80.0, ("BTC", "USD"): 50000.0, ("USD", "RUB"): 100.0}
+
+
+def test_cross_rate_direct_inverse_and_pivot():
+    assert cross_rate(RATES, "TON", "RUB") == 250.0
+    assert cross_rate(RATES, "RUB", "TON") == pytest.approx(1 / 250)
+    assert cross_rate(RATES, "RUB", "BTC") == pytest.approx(1 / 100 / 50000)  # через USD
+    assert cross_rate(RATES, "RUB", "RUB") == 1.0
+    assert cross_rate(RATES, "RUB", "DOGE") is None
+
+
+def test_rebuild_precomputes_quantized_prices():
+    table = PriceTable([PRODUCT], ["TON", "USDT", "DOGE"])
+    table.rebuild(RATES, time.time())
+
+    assert table.price(1000, "TON", "p1") == 4.0
+    assert table.price(1000, "USDT", "p1") == 12.5
+    # нестандартная сумма (промо) — одно умножение по тому же курсу
+    assert table.price(900, "TON", "p1") == 3.6
+    assert table.card_prices(1000, "p1") == {"TON": 4.0, "USDT": 12.5}
+    with pytest.raises(RatesUnavailable, match="DOGE"):
+        table.price(1000, "DOGE")
+    assert table.stats()["entries"] == 2
+
+
+def test_empty_or_stale_table_refuses_to_quote():
+    table = PriceTable([PRODUCT], ["TON"])
+    with pytest.raises(RatesUnavailable):
+        table.price(1000, "TON", "p1")
+    assert table.card_prices(1000, "p1") == {}
+
+    table.rebuild(RATES, time.time() - price_table_module.rates_cache.max_stale - 60)
+    assert not table.fresh
+    with pytest.raises(RatesUnavailable):
+        table.price(1000, "TON", "p1")
+
+
+def test_crypto_price_reads_table_after_rates_check(monkeypatch):
+    table = PriceTable([PRODUCT], ["TON"])
+    checks = []
+
+    async def get_rates():
+        checks.append(1)
+        table.rebuild(RATES, time.time())  # как подписка на rates_cache
+        return RATES
+
+    monkeypatch.setattr(price_table_module, "price_table", table)
+    monkeypatch.setattr(price_table_module.rates_cache, "get_rates", get_rates)
+
+    assert asyncio.run(price_table_module.crypto_price(1000, "TON", "p1")) == 4.0
+    assert checks == [1]
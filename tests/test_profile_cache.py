@@ -0,0 +1,77 @@
+import asyncio
+
+from bot.users import cache as cache_mod
+from bot.users.cache import ProfileCache
+
+
+def _loader(profile, calls, *, cacheable=True, delay=0.0):
+    async def load():
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return profile, cacheable
+
+    return load
+
+
+def test_hit_after_miss_returns_copy():
+    async def main():
+        c = ProfileCache()
+        calls = []
+        first = await c.get(1, _loader({"id": 1}, calls))
+        first["id"] = 99
+        return await c.get(1, _loader({"id": 2}, calls)), calls, c.stats()
+
+    profile, calls, stats = asyncio.run(main())
+    assert profile == {"id": 1}
+    assert len(calls) == 1
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_concurrent_misses_share_one_load():
+    async def main():
+        c = ProfileCache()
+        calls = []
+        load = _loader({"id": 1}, calls, delay=0.01)
+        results = await asyncio.gather(*(c.get(1, load) for _ in range(5)))
+        return results, calls, c.stats()["coalesced"]
+
+    results, calls, coalesced = asyncio.run(main())
+    assert results == [{"id": 1}] * 5
+    assert len(calls) == 1 and coalesced == 4
+
+
+def test_invalidate_during_load_keeps_result_out_of_cache():
+    async def main():
+        c = ProfileCache()
+        task = asyncio.create_task(c.get(1, _loader({"id": 1, "bonus": 0}, [], delay=0.01)))
+        await asyncio.sleep(0)
+        c.invalidate(1)  # запись произошла, пока читали
+        return await task, c.peek(1)
+
+    loaded, cached = asyncio.run(main())
+    assert loaded == {"id": 1, "bonus": 0}
+    assert cached is None
+
+
+def test_not_cacheable_result_is_returned_but_not_stored():
+    async def main():
+        c = ProfileCache()
+        return await c.get(1, _loader({"id": 1}, [], cacheable=False)), c.peek(1)
+
+    assert asyncio.run(main()) == ({"id": 1}, None)
+
+
+def test_lru_and_ttl_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: now[0])
+
+    c = ProfileCache(maxsize=2, ttl=10)
+    c.put(1, {"id": 1})
+    c.put(2, {"id": 2})
+    c.peek(1)  # 1 — недавно использованный
+    c.put(3, {"id": 3})
+    assert c.peek(2) is None and c.peek(1) == {"id": 1}
+
+    now[0] += 11
+    assert c.peek(1) is None and c.peek(3) is None
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+
+from bot.promos.catalog import PromoCatalog
+from bot.promos.model import PromoCode, PromoType
+from bot.promos.storage import JsonPromoStorage
+
+
+def _promo(code, value=10):
+    return PromoCode(code=code, type=PromoType.PERCENT, value=value)
+
+
+class FakePg:
+    def __init__(self, promos):
+        self.promos = dict(promos)
+        self.lookups = []
+
+    async def load_promos(self):
+        return dict(self.promos)
+
+    async def get_promo(self, code):
+        self.lookups.append(code)
+        return self.promos.get(code)
+
+
+def _write(path, promos, mtime):
+    path.write_text(json.dumps(promos), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_local_catalog_reloads_on_mtime_change(tmp_path):
+    path = tmp_path / "promos.json"
+    _write(path, {"A": {"type": "percent", "value": 5}}, 1_000_000)
+    storage = JsonPromoStorage(str(path), str(tmp_path / "usage.json"))
+
+    async def main():
+        catalog = PromoCatalog(storage, file_check_interval=0)
+        await catalog.load()
+        a, missing = await catalog.get(" a "), await catalog.get("B")
+
+        _write(path, {"B": {"type": "fixed", "value": 50}}, 1_000_100)
+        return a, missing, await catalog.get("A"), await catalog.get("b"), catalog.stats()
+
+    a, missing, a_after, b, stats = asyncio.run(main())
+    assert a.value == 5 and missing is None
+    assert a_after is None and b.value == 50
+    assert stats["lookups"] == 0  # без PG неизвестный код не ищется в хранилище
+
+
+def test_pg_codes_win_and_notify_refreshes_one_code(tmp_path):
+    local = JsonPromoStorage(str(tmp_path / "none.json"), str(tmp_path / "usage.json"))
+    pg = FakePg({"A": _promo("A", 20)})
+
+    async def main():
+        catalog = PromoCatalog(local)
+        await catalog.load(pg)
+        catalog._pg_complete = True  # как после подписки на NOTIFY
+        before = await catalog.get("A")
+
+        pg.promos["A"] = _promo("A", 30)
+        await catalog._refresh_code("A")
+        pg.promos.pop("A")
+        after_update = await catalog.get("A")
+        await catalog._refresh_code("A")
+        return before, after_update, await catalog.get("A"), pg.lookups
+
+    before, updated, deleted, lookups = asyncio.run(main())
+    assert before.value == 20 and updated.value == 30 and deleted is None
+    assert lookups == ["A", "A"]  # только обновления по NOTIFY
+
+
+def test_incomplete_catalog_uses_negative_cache(tmp_path):
+    local = JsonPromoStorage(str(tmp_path / "none.json"), str(tmp_path / "usage.json"))
+    pg = FakePg({})
+
+    async def main():
+        catalog = PromoCatalog(local)
+        await catalog.load(pg)  # слушателя нет — каталог неполон
+        first = await catalog.get("NEW")
+        second = await catalog.get("NEW")
+        pg.promos["LATE"] = _promo("LATE")
+        late = await catalog.get("LATE")
+        return first, second, late, pg.lookups, catalog.stats()
+
+    first, second, late, lookups, stats = asyncio.run(main())
+    assert first is None and second is None and late.code == "LATE"
+    assert lookups == ["NEW", "LATE"]
+    assert stats["negative_hits"] == 1 and stats["complete"] is False
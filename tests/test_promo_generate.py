@@ -0,0 +1,89 @@
+import asyncio
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bot.data.products import PRODUCTS
+from bot.db.sqlite import SCHEMA
+from bot.promos import generate
+from bot.promos.model import PromoCode, PromoType
+from bot.promos.service import PromoError, PromoService
+from bot.promos.storage import JsonPromoStorage
+
+TEMPLATE = PromoCode(
+    code="",
+    type=PromoType.PERCENT,
+    value=15,
+    expires_at=datetime(2030, 1, 1),
+    max_uses=1,
+    allowed_products=["gpt_business_1m"],
+)
+
+
+def test_codes_unique_prefixed_and_skip_existing():
+    existing = set(generate.generate_codes(200, length=4, prefix="x-"))
+    codes = generate.generate_codes(500, length=4, prefix="x-", existing=existing)
+
+    assert len(set(codes)) == 500
+    assert not existing & set(codes)
+    assert all(c.startswith("X-") and len(c) == 6 for c in codes)
+    assert set("".join(c[2:] for c in codes)) <= set(generate.ALPHABET)
+
+
+def test_short_codes_rejected():
+    with pytest.raises(ValueError):
+        generate.generate_codes(10_000, length=2)
+
+
+def test_json_load_merges_into_existing_file(tmp_path):
+    path = tmp_path / "promos.json"
+    path.write_text(json.dumps({"OLD": {"type": "fixed", "value": 100}}), encoding="utf-8")
+    codes = generate.generate_codes(3, existing=generate.json_existing_codes(str(path)))
+
+    generate.load_json(str(path), generate.build_promos(codes, TEMPLATE))
+
+    async def main():
+        return await JsonPromoStorage(str(path), str(tmp_path / "usage.json")).load_promos()
+
+    promos = asyncio.run(main())
+    assert set(promos) == {"OLD", *codes}
+    assert promos[codes[0]].expires_at == TEMPLATE.expires_at
+    assert list(promos[codes[0]].allowed_products) == ["gpt_business_1m"]
+
+
+def test_sqlite_load_is_one_transaction(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "store.sqlite3"))
+    conn.executescript(SCHEMA)
+    codes = generate.generate_codes(5)
+    generate.load_sqlite(conn, generate.build_promos(codes, TEMPLATE))
+
+    with pytest.raises(sqlite3.IntegrityError):
+        # дубликат в пачке откатывает её целиком
+        generate.load_sqlite(conn, generate.build_promos(["NEW1", codes[0]], TEMPLATE))
+
+    assert generate.sqlite_existing_codes(conn) == set(codes)
+
+
+@pytest.mark.parametrize("tz", [None, timezone.utc])
+def test_validate_handles_naive_and_aware_expiry(tz):
+    class Storage:
+        def __init__(self, expires_at):
+            self.promo = PromoCode(code="C", type=PromoType.PERCENT, value=1, expires_at=expires_at)
+
+        async def get_promo(self, code):
+            return self.promo
+
+        async def get_usage(self, code, user_id):
+            return 0, 0
+
+    now = datetime.now(timezone.utc) if tz else datetime.now(timezone.utc).replace(tzinfo=None)
+
+    async def main():
+        ok = await PromoService(Storage(now + timedelta(hours=1))).validate("C", 1, PRODUCTS[0])
+        with pytest.raises(PromoError, match="истёк"):
+            await PromoService(Storage(now - timedelta(hours=1))).validate("C", 1, PRODUCTS[0])
+        return ok
+
+    assert asyncio.run(main()).code == "C"
@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import pytest
+
+from bot.data.products import PRODUCTS
+from bot.promos.service import PromoError, PromoService
+from bot.promos.storage import JsonPromoStorage
+
+PRODUCT = PRODUCTS[0]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    promos = tmp_path / "promos.json"
+    promos.write_text(json.dumps({
+        "SALE": {"type": "percent", "value": 10, "max_uses": 3, "per_user_limit": 2},
+        "FIXED": {"type": "fixed", "value": 100000},
+    }), encoding="utf-8")
+    return JsonPromoStorage(str(promos), str(tmp_path / "promo_usage.json"))
+
+
+def test_usage_counters_persist(storage):
+    async def main():
+        await storage.increment_usage("sale", 1)
+        await storage.increment_usage("SALE", 1)
+        await storage.increment_usage("SALE", 2)
+        reloaded = JsonPromoStorage(storage.promos_path, storage.usage_path)
+        return await storage.get_usage("SALE", 1), await reloaded.get_usage("sale", 2), await reloaded.get_usage("X", 1)
+
+    assert asyncio.run(main()) == ((3, 2), (3, 1), (0, 0))
+
+
+def test_validate_uses_total_and_per_user_counts(storage):
+    service = PromoService(storage)
+
+    async def main():
+        await storage.increment_usage("SALE", 1)
+        await storage.increment_usage("SALE", 1)
+        with pytest.raises(PromoError, match="уже использовали"):
+            await service.validate("SALE", 1, PRODUCT)
+        ok = await service.validate("SALE", 2, PRODUCT)
+
+        await storage.increment_usage("SALE", 3)
+        with pytest.raises(PromoError, match="Лимит"):
+            await service.validate("SALE", 4, PRODUCT)
+        return ok
+
+    assert asyncio.run(main()).code == "SALE"
+
+
+def test_apply_never_goes_below_zero(storage):
+    result = asyncio.run(PromoService(storage).apply("fixed", 1, PRODUCT))
+    assert result.final_price_rub == 0
+    assert result.discount_rub == PRODUCT.price_rub
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def reservable(request, storage, tmp_path):
+    if request.param == "json":
+        return storage
+    from bot.db.sqlite import SqliteDb
+    from bot.promos.sqlite_storage import SqlitePromoStorage
+
+    return SqlitePromoStorage(SqliteDb(str(tmp_path / "store.sqlite3")), seed_path=storage.promos_path)
+
+
+def test_concurrent_reservations_respect_max_uses(reservable):
+    async def main():
+        await reservable.increment_usage("SALE", 9)
+        results = await asyncio.gather(*(
+            reservable.reserve("SALE", uid, f"h{uid}", 3, None, 60) for uid in range(5)
+        ))
+        return sorted(results)
+
+    # одно использование + два резерва = лимит 3
+    assert asyncio.run(main()) == [False, False, False, True, True]
+
+
+def test_reservation_release_extend_and_redeem(reservable):
+    async def main():
+        r = []
+        r.append(await reservable.reserve("SALE", 1, "a", 1, None, 60))
+        r.append(await reservable.reserve("SALE", 2, "b", 1, None, 60))  # слот занят
+        r.append(await reservable.reserve("SALE", 1, "a", 1, None, 60))  # тот же hold — продление
+        await reservable.release("a")
+        r.append(await reservable.reserve("SALE", 2, "b", 1, None, 60))
+        await reservable.increment_usage("SALE", 2, "b")  # резерв превращается в использование
+        r.append(await reservable.reserve("SALE", 3, "c", 1, None, 60))
+        return r, await reservable.get_usage("SALE", 2)
+
+    results, usage = asyncio.run(main())
+    assert results == [True, False, True, True, False]
+    assert usage == (1, 1)
+
+
+def test_expired_reservation_frees_slot(reservable):
+    async def main():
+        await reservable.reserve("SALE", 1, "a", 1, None, 0)
+        return await reservable.reserve("SALE", 2, "b", 1, None, 60)
+
+    assert asyncio.run(main()) is True
+
+
+def test_per_user_limit_counts_own_reservations(reservable):
+    async def main():
+        return [await reservable.reserve("SALE", 1, h, None, 2, 60) for h in ("a", "b", "c")]
+
+    assert asyncio.run(main()) == [True, True, False]
+
+
+def test_service_reserve_only_for_limited_codes(storage):
+    service = PromoService(storage)
+
+    async def main():
+        unlimited = await service.reserve("FIXED", 1, "h1", 60)
+        limited = await service.reserve("SALE", 1, "h2", 60)
+        await service.reserve("SALE", 1, "h3", 60)
+        with pytest.raises(PromoError):
+            await service.reserve("SALE", 1, "h4", 60)  # per_user_limit=2
+        return unlimited, limited
+
+    assert asyncio.run(main()) == (False, True)
+
+
+def test_each_payment_gets_its_own_hold(tmp_path, monkeypatch):
+    import bot.handlers.payments as payments
+    from bot.promos.state import PromoState
+
+    promos = tmp_path / "once.json"
+    promos.write_text(json.dumps({"ONCE": {"type": "percent", "value": 50, "max_uses": 1}}), encoding="utf-8")
+    storage = JsonPromoStorage(str(promos), str(tmp_path / "usage.json"))
+    monkeypatch.setattr(payments, "promo_service", PromoService(storage))
+    st = PromoState(product_id=PRODUCT.id, promo_code="ONCE")
+
+    async def main():
+        first = await payments._reserve_promo_hold(1, st)
+        second = await payments._reserve_promo_hold(1, st)  # второй платёж того же выбора
+        # прежний резерв отпущен, а не продлён: занят ровно один слот — под второй платёж
+        other = await storage.reserve("ONCE", 2, "other", 1, None, 60)
+        reserved_first_again = await storage.reserve("ONCE", 1, first, 1, None, 60)
+        return first, second, other, reserved_first_again
+
+    first, second, other, reserved_first_again = asyncio.run(main())
+    assert first and second and first != second
+    assert st.hold_id == second
+    assert other is False and reserved_first_again is False
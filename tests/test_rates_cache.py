@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import bot.payments.rates_cache as rates_cache_module
+from bot.payments.rates_cache import RatesCache, RatesUnavailable, quantize_amount
+
+
+class FakeCryptoPay:
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.calls = 0
+
+    async def get_exchange_rates(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        batch = self.batches.pop(0) if len(self.batches) > 1 else self.batches[0]
+        if isinstance(batch, Exception):
+            raise batch
+        return [SimpleNamespace(source=s, target=t, rate=r) for s, t, r in batch]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    def install(*batches):
+        fake = FakeCryptoPay(*batches)
+        monkeypatch.setattr(rates_cache_module, "crypto_pay", fake)
+        return fake
+
+    return install
+
+
+def test_cold_start_fetches_once_for_concurrent_readers(tmp_path, upstream):
+    fake = upstream([("TON", "RUB", 250.0)])
+    cache = RatesCache(str(tmp_path / "rates.json"))
+
+    async def main():
+        return await asyncio.gather(*(cache.get_rate("TON", "RUB") for _ in range(5)))
+
+    assert asyncio.run(main()) == [250.0] * 5
+    assert fake.calls == 1
+    saved = json.loads((tmp_path / "rates.json").read_text(encoding="utf-8"))
+    assert saved["rates"] == [["TON", "RUB", 250.0]]
+
+
+def test_inverse_rate_and_missing_pair(tmp_path, upstream):
+    upstream([("USDT", "RUB", 80.0)])
+    cache = RatesCache(str(tmp_path / "rates.json"))
+
+    async def main():
+        inverse = await cache.get_rate("rub", "usdt")
+        with pytest.raises(RuntimeError, match="No exchange rate"):
+            await cache.get_rate("BTC", "RUB")
+        return inverse
+
+    assert asyncio.run(main()) == pytest.approx(1 / 80)
+
+
+def test_stale_snapshot_served_until_max_stale(tmp_path, upstream):
+    fake = upstream(RuntimeError("upstream down"))
+    path = tmp_path / "rates.json"
+    cache = RatesCache(str(path), refresh_interval=30, max_stale=600)
+
+    async def main(age):
+        path.write_text(json.dumps({"fetched_at": time.time() - age, "rates": [["TON", "RUB", 250.0]]}))
+        await cache.load_snapshot()
+        rate = await cache.get_rate("TON", "RUB")
+        await asyncio.sleep(0.05)  # фоновое обновление отработало (с ошибкой)
+        return rate
+
+    # снимок устарел, но в пределах max_stale: отдаём сразу, обновляем в фоне
+    assert asyncio.run(main(120)) == 250.0
+    assert fake.calls == 1
+    assert cache.errors == 1 and "upstream down" in cache.last_error
+
+    stale = RatesCache(str(path), refresh_interval=30, max_stale=600)
+
+    async def too_old():
+        path.write_text(json.dumps({"fetched_at": time.time() - 3600, "rates": [["TON", "RUB", 250.0]]}))
+        await stale.load_snapshot()
+        with pytest.raises(RatesUnavailable):
+            await stale.get_rate("TON", "RUB")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(too_old())
+    assert stale.stats()["stale"] is True
+
+
+def test_empty_response_is_an_error(tmp_path, upstream):
+    upstream([])
+    cache = RatesCache(str(tmp_path / "rates.json"))
+
+    with pytest.raises(RuntimeError, match="empty exchange rates"):
+        asyncio.run(cache.get_rates())
+    assert cache.errors == 1
+
+
+def test_subscribers_get_current_and_new_snapshots(tmp_path, upstream):
+    upstream([("TON", "RUB", 250.0)], [("TON", "RUB", 260.0)])
+    cache = RatesCache(str(tmp_path / "rates.json"))
+    seen = []
+
+    async def main():
+        await cache.refresh()
+        cache.subscribe(lambda rates, fetched_at: seen.append(rates[("TON", "RUB")]))
+        await cache.refresh()
+
+    asyncio.run(main())
+    assert seen == [250.0, 260.0]
+    assert cache.refreshes == 2
+
+
+def test_quantize_amount():
+    assert quantize_amount(1.005, "ton") == 1.01
+    assert quantize_amount(2.344, "USDT") == 2.34
+    assert quantize_amount(0.12345678, "BTC") == 0.123457
@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.users.storage import JsonUserStorage
+
+
+def _user(uid: int):
+    return SimpleNamespace(id=uid, username=None, first_name=None, last_name=None)
+
+
+def test_invited_count_follows_set_ref(tmp_path):
+    path = str(tmp_path / "users.json")
+
+    async def main():
+        s = JsonUserStorage(path)
+        for uid in (1, 2, 3, 4):
+            await s.upsert_user(_user(uid))
+        await s.add_purchase(4, 100)
+
+        results = [
+            await s.try_set_ref(2, 1),
+            await s.try_set_ref(3, 1),
+            await s.try_set_ref(2, 3),  # реферер уже есть
+            await s.try_set_ref(4, 1),  # уже покупал
+            await s.try_set_ref(1, 1),  # сам себя
+        ]
+        profile = await s.get_profile(1)
+        reloaded = JsonUserStorage(path)
+        return results, await s.count_invited(1), profile["invited_count"], await reloaded.count_invited(1)
+
+    results, count, in_profile, after_reload = asyncio.run(main())
+    assert results == [True, True, False, False, False]
+    assert count == in_profile == after_reload == 2
+
+
+def test_count_invited_unknown_referrer_is_zero(tmp_path):
+    async def main():
+        return await JsonUserStorage(str(tmp_path / "users.json")).count_invited(42)
+
+    assert asyncio.run(main()) == 0
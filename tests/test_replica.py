@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from bot.db import replica
+from bot.db.replica import ReplicaRouter
+from bot.users.service import UserService
+
+
+class FakePool:
+    def __init__(self, name, lag=0.0, broken=False):
+        self.name = name
+        self.lag = lag
+        self.broken = broken
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, *, timeout=None):
+        if self.broken:
+            raise ConnectionError("replica down")
+        yield self
+
+    async def fetchval(self, sql, *args, timeout=None):
+        return self.lag
+
+
+async def _read_from(pool):
+    if pool.broken:
+        raise ConnectionError("replica down")
+    return pool.name
+
+
+@pytest.fixture(autouse=True)
+def no_router():
+    yield
+    replica.set_router(None)
+
+
+def test_router_uses_replica_only_while_healthy():
+    async def main():
+        primary, ro = FakePool("primary"), FakePool("replica", lag=1.0)
+        router = ReplicaRouter(primary, ro, max_lag=5)
+        before = await router.run(_read_from)  # до первой проверки — primary
+        await router.check()
+        healthy = await router.run(_read_from)
+        ro.lag = 30.0
+        await router.check()
+        lagging = await router.run(_read_from)
+        return before, healthy, lagging, router.stats()
+
+    before, healthy, lagging, stats = asyncio.run(main())
+    assert (before, healthy, lagging) == ("primary", "replica", "primary")
+    assert stats["replica_reads"] == 1 and stats["primary_reads"] == 2 and stats["lag_s"] == 30.0
+
+
+def test_replica_error_retries_on_primary_and_marks_unhealthy():
+    async def main():
+        ro = FakePool("replica")
+        router = ReplicaRouter(FakePool("primary"), ro)
+        await router.check()
+        ro.broken = True
+        result = await router.run(_read_from)
+        return result, router.healthy, await router.check(), router.stats()
+
+    result, healthy, check, stats = asyncio.run(main())
+    assert result == "primary"
+    assert healthy is False and check is False
+    assert stats["replica_errors"] == 1 and stats["lag_s"] is None
+
+
+def test_module_read_routes_only_for_the_configured_primary():
+    async def main():
+        primary, other = FakePool("primary"), FakePool("other")
+        router = ReplicaRouter(primary, FakePool("replica"))
+        await router.check()
+        replica.set_router(router)
+        return await replica.read(primary, _read_from), await replica.read(other, _read_from)
+
+    assert asyncio.run(main()) == ("replica", "other")
+
+
+def test_user_is_pinned_to_primary_after_own_write():
+    service = UserService(storage=None)
+    assert replica.lag_window() == 0.0
+    service.invalidate_profile(1)
+    assert not service._is_pinned(1)  # без реплики закреплять незачем
+
+    replica.set_router(ReplicaRouter(FakePool("primary"), FakePool("replica"), max_lag=5))
+
+    assert replica.lag_window() == 5
+    service.invalidate_profile(1)
+    assert service._is_pinned(1) and not service._is_pinned(2)
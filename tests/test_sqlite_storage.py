@@ -0,0 +1,92 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from bot.db.sqlite import SqliteDb
+from bot.payments.platega_orders import PendingPlategaOrder
+from bot.payments.sqlite_orders import SqlitePlategaOrders
+from bot.promos.sqlite_storage import SqlitePromoStorage
+from bot.users.sqlite_storage import SqliteUserStorage
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SqliteDb(str(tmp_path / "store.sqlite3"))
+
+
+def _user(uid: int, username: str = "u"):
+    return SimpleNamespace(id=uid, username=username, first_name=None, last_name=None)
+
+
+def _order(ticket_id: str = "T-1", created_at: str = "2026-01-01T00:00:00+00:00") -> PendingPlategaOrder:
+    return PendingPlategaOrder(
+        ticket_id=ticket_id,
+        buyer_id=1,
+        buyer_username="u",
+        product_id="p1",
+        promo_code=None,
+        final_price_rub=500,
+        created_at=created_at,
+    )
+
+
+def test_users_upsert_returning_and_referrals(db):
+    async def main():
+        s = SqliteUserStorage(db)
+        created = await s.upsert_user_returning(_user(1, "a"))
+        await s.upsert_user(_user(2))
+        await s.upsert_user(_user(3))
+        await s.add_purchase(3, 100)
+        refs = [await s.try_set_ref(2, 1), await s.try_set_ref(2, 1), await s.try_set_ref(3, 1)]
+        return created, refs, await s.count_invited(1), await s.get_profile(1), await s.get_profile(9)
+
+    created, refs, invited, profile, missing = asyncio.run(main())
+    assert created["username"] == "a" and created["invited_count"] == 0
+    assert refs == [True, False, False]
+    assert invited == profile["invited_count"] == 1
+    assert missing == {}
+
+
+def test_promos_seeded_from_json_and_usage_counted(db, tmp_path):
+    seed = tmp_path / "promos.json"
+    seed.write_text(json.dumps({"sale": {"type": "percent", "value": 10, "max_uses": 5}}), encoding="utf-8")
+
+    async def main():
+        s = SqlitePromoStorage(db, seed_path=str(seed))
+        promo = await s.get_promo(" sale ")
+        await s.increment_usage("SALE", 1)
+        await s.increment_usage("SALE", 1)
+        await s.increment_usage("SALE", 2)
+        return promo, await s.get_usage("sale", 1)
+
+    promo, usage = asyncio.run(main())
+    assert promo.code == "SALE" and promo.value == 10 and promo.max_uses == 5
+    assert usage == (3, 2)
+
+
+def test_promo_usage_totals_follow_deletes(db):
+    async def main():
+        s = SqlitePromoStorage(db)
+        for uid in (1, 2, 3):
+            await s.increment_usage("SALE", uid)
+        await db.run(lambda conn: conn.execute("DELETE FROM promo_usages WHERE user_id IN (1, 2)"))
+        await db.run(lambda conn: conn.execute("DELETE FROM promo_usages"))
+        await db.run(lambda conn: conn.execute("DELETE FROM promo_usages"))  # уже пусто: не уходим в минус
+        return await s.get_usage("SALE", 3)
+
+    assert asyncio.run(main()) == (0, 0)
+
+
+def test_orders_put_get_pop(db):
+    async def main():
+        s = SqlitePlategaOrders(db)
+        await s.put("tx1", _order())
+        got = await s.get("tx1")
+        popped = await s.pop("tx1")
+        return got, popped, await s.get("tx1"), await s.pop("tx1")
+
+    got, popped, after, again = asyncio.run(main())
+    assert got["ticket_id"] == popped["ticket_id"] == "T-1"
+    assert after is None and again is None
@@ -0,0 +1,27 @@
+from bot.db import statements
+from bot.db.migrate import register_statements
+from bot.users.service import UserService
+
+
+def test_repositories_register_their_sql():
+    register_statements()
+    for name in ("users.get_profile", "users.set_ref", "payments.mark_paid", "promos.get_usage"):
+        assert name in statements.STATEMENTS
+
+    # кэш asyncpg вмещает весь реестр и запас под ad-hoc запросы
+    assert statements.statement_cache_size() > len(statements.STATEMENTS)
+
+
+def test_sql_returns_text_unchanged(monkeypatch):
+    monkeypatch.setattr(statements, "STATEMENTS", {})
+    text = statements.sql("test.one", "SELECT 1;")
+    assert text == "SELECT 1;"
+    assert statements.STATEMENTS == {"test.one": "SELECT 1;"}
+
+
+def test_user_service_reuses_one_repository_per_pool():
+    service = UserService(storage=None)
+    primary, replica = object(), object()
+
+    assert service._pg(primary) is service._pg(primary)
+    assert service._pg(primary) is not service._pg(replica)
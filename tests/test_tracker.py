@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.users.tracker import UserTracker
+
+
+def _user(uid: int, username: str = "u"):
+    return SimpleNamespace(id=uid, username=username, first_name=None, last_name=None)
+
+
+class FakeService:
+    def __init__(self, fail: int = 0):
+        self.batches = []
+        self.fail = fail
+
+    async def track_many(self, users, pool=None):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("db down")
+        self.batches.append([(u.id, u.username) for u in users])
+
+
+def test_repeated_updates_collapse_per_user():
+    async def main():
+        service = FakeService()
+        tracker = UserTracker(service, flush_interval_ms=10_000)
+        tracker.track(_user(1, "old"))
+        tracker.track(_user(2))
+        tracker.track(_user(1, "new"))
+        await tracker.flush()
+        return service.batches
+
+    assert asyncio.run(main()) == [[(1, "new"), (2, "u")]]
+
+
+def test_batch_size_wakes_flush_before_interval():
+    async def main():
+        service = FakeService()
+        tracker = UserTracker(service, flush_interval_ms=10_000, max_batch=2)
+        tracker.start()
+        tracker.track(_user(1))
+        tracker.track(_user(2))
+        for _ in range(50):
+            if service.batches:
+                break
+            await asyncio.sleep(0.01)
+        await tracker.stop()
+        return service.batches
+
+    assert asyncio.run(main()) == [[(1, "u"), (2, "u")]]
+
+
+def test_failed_flush_keeps_users_but_prefers_newer_data():
+    async def main():
+        service = FakeService(fail=1)
+        tracker = UserTracker(service, flush_interval_ms=10_000)
+        tracker.track(_user(1, "first"))
+        tracker.track(_user(2))
+        await tracker.flush()
+        tracker.track(_user(1, "fresh"))
+        await tracker.flush()
+        return service.batches
+
+    assert asyncio.run(main()) == [[(1, "fresh"), (2, "u")]]
+
+
+def test_stop_flushes_remaining_and_discard_drops_user():
+    async def main():
+        service = FakeService()
+        tracker = UserTracker(service, flush_interval_ms=10_000)
+        tracker.start()
+        tracker.track(_user(1))
+        tracker.track(_user(2))
+        tracker.discard(2)
+        await tracker.stop()
+        return service.batches
+
+    assert asyncio.run(main()) == [[(1, "u")]]
@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import bot.middlewares.users as users_mw
+from bot.middlewares.users import UserTrackingMiddleware
+
+
+class FakeService:
+    def __init__(self, cached=None):
+        self.cached = cached
+        self.loaded = []
+
+    def cached_profile(self, user_id):
+        return self.cached
+
+    async def track_and_get_profile(self, user, pool=None):
+        self.loaded.append(user.id)
+        return {"id": user.id, "bonus_balance": 5}
+
+
+class FakeTracker:
+    def __init__(self):
+        self.tracked = []
+        self.discarded = []
+
+    def track(self, user, pool=None):
+        self.tracked.append(user.id)
+
+    def discard(self, user_id):
+        self.discarded.append(user_id)
+
+
+def _run(monkeypatch, service, flags):
+    tracker = FakeTracker()
+    monkeypatch.setattr(users_mw, "user_service", service)
+    monkeypatch.setattr(users_mw, "user_tracker", tracker)
+
+    seen = {}
+
+    async def handler(event, data):
+        seen.update(data)
+
+    data = {
+        "event_from_user": SimpleNamespace(id=7),
+        "handler": SimpleNamespace(flags=flags),
+    }
+    asyncio.run(UserTrackingMiddleware()(handler, object(), data))
+    return seen, tracker
+
+
+def test_flagged_handler_gets_profile_from_single_upsert(monkeypatch):
+    service = FakeService()
+    seen, tracker = _run(monkeypatch, service, {"profile": True})
+
+    assert seen["profile"] == {"id": 7, "bonus_balance": 5}
+    assert service.loaded == [7]
+    assert tracker.discarded == [7] and tracker.tracked == []
+
+
+def test_cached_profile_skips_database(monkeypatch):
+    service = FakeService(cached={"id": 7, "bonus_balance": 1})
+    seen, tracker = _run(monkeypatch, service, {"profile": True})
+
+    assert seen["profile"] == {"id": 7, "bonus_balance": 1}
+    assert service.loaded == []
+    assert tracker.tracked == [7]
+
+
+def test_unflagged_handler_is_write_behind(monkeypatch):
+    service = FakeService(cached={"id": 7})
+    seen, tracker = _run(monkeypatch, service, {})
+
+    assert "profile" not in seen
+    assert service.loaded == []
+    assert tracker.tracked == [7]
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+import bot.handlers.payments as payments
+import bot.payments.platega_status as status_mod
+from bot.webhooks import worker_queue
+from bot.webhooks.platega_webhook import _process_platega_tx
+from bot.webhooks.worker_queue import DedupWorkQueue
+
+
+def test_duplicates_and_overflow_while_queued():
+    async def main():
+        q = DedupWorkQueue(lambda key: asyncio.sleep(0, True), maxsize=2)
+        return [q.submit("a"), q.submit("a"), q.submit("b"), q.submit("c")], q.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == ["queued", "duplicate", "queued", "overflow"]
+    assert (stats["accepted"], stats["duplicates"], stats["overflow"], stats["depth"]) == (2, 1, 1, 2)
+
+
+def test_only_final_results_suppress_resubmits(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(worker_queue.time, "monotonic", lambda: now[0])
+    handled = []
+
+    async def handler(key):
+        handled.append(key)
+        if key == "boom":
+            raise RuntimeError("platega down")
+        return key == "final"
+
+    async def main():
+        q = DedupWorkQueue(handler, workers=2, done_ttl=60)
+        q.start()
+        for key in ("final", "pending", "boom"):
+            q.submit(key)
+        await q._queue.join()
+
+        again = [q.submit("final"), q.submit("pending"), q.submit("boom")]
+        await q._queue.join()
+        now[0] += 61
+        after_ttl = q.submit("final")
+        await q._queue.join()
+        await q.stop()
+        return again, after_ttl, q.stats()
+
+    again, after_ttl, stats = asyncio.run(main())
+    assert again == ["duplicate", "queued", "queued"]
+    assert after_ttl == "queued"
+    assert sorted(handled) == ["boom", "boom", "final", "final", "pending", "pending"]
+    assert stats["errors"] == 2 and stats["processed"] == 6 and stats["active"] == 0
+
+
+class FakeStatus:
+    def __init__(self, status):
+        self.status = status
+        self.calls = []
+
+    async def get(self, tx_id):
+        self.calls.append(tx_id)
+        return {"status": self.status}
+
+
+class FakeScheduler:
+    def __init__(self, meta):
+        self.meta = meta
+        self.removed = []
+
+    def get(self, tx_id):
+        return self.meta
+
+    def remove(self, tx_id):
+        self.removed.append(tx_id)
+
+
+@pytest.fixture
+def webhook_env(monkeypatch):
+    checked = []
+
+    async def check(tx_id, meta):
+        checked.append((tx_id, meta))
+        return True
+
+    def setup(status, meta=None):
+        st, sched = FakeStatus(status), FakeScheduler(meta or {"buyer_id": 1})
+        monkeypatch.setattr(status_mod, "platega_status", st)
+        monkeypatch.setattr(payments, "platega_scheduler", sched)
+        monkeypatch.setattr(payments, "_check_platega_tx", check)
+        return st, sched, checked
+
+    return setup
+
+
+def test_webhook_job_makes_one_status_call_and_finalizes(webhook_env):
+    status, scheduler, checked = webhook_env("CONFIRMED")
+    done = asyncio.run(_process_platega_tx({"pg_pool": object()}, "tx"))
+
+    assert done is True
+    assert status.calls == ["tx"]
+    assert checked == [("tx", {"buyer_id": 1})]
+    assert scheduler.removed == ["tx"]
+
+
+def test_non_final_status_left_to_scheduler(webhook_env):
+    status, scheduler, checked = webhook_env("PENDING")
+    done = asyncio.run(_process_platega_tx({"pg_pool": object()}, "tx"))
+
+    assert done is False
+    assert status.calls == ["tx"]  # без повторов в цикле
+    assert checked == [] and scheduler.removed == []
+
+
+def test_without_pg_webhook_leaves_payment_to_scheduler(webhook_env):
+    status, _, checked = webhook_env("CONFIRMED")
+    assert asyncio.run(_process_platega_tx({"pg_pool": None}, "tx")) is False
+    assert status.calls == [] and checked == []
+
+
+def test_failed_mark_paid_is_retried(monkeypatch):
+    from types import SimpleNamespace
+
+    calls = SimpleNamespace(mark_paid=0, finalized=[], popped=[])
+
+    class Pg:
+        async def mark_paid(self, order_id):
+            calls.mark_paid += 1
+            if calls.mark_paid == 1:
+                raise ConnectionError("pg is restarting")
+            return True
+
+    async def finalize(**kwargs):
+        calls.finalized.append(kwargs["ticket_id"])
+
+    async def pop(tx_id):
+        calls.popped.append(tx_id)
+
+    tx_id = "00000000-0000-0000-0000-000000000001"
+    monkeypatch.setattr(payments, "platega_status", FakeStatus("CONFIRMED"))
+    monkeypatch.setattr(payments, "_pg_payments", lambda: Pg())
+    monkeypatch.setattr(payments, "_finalize_purchase", finalize)
+    monkeypatch.setattr(payments, "platega_orders", SimpleNamespace(pop=pop))
+    meta = {"ticket_id": "T1", "buyer_id": 1, "product_id": "p", "final_price_rub": 100}
+
+    async def main():
+        return [await payments._check_platega_tx(tx_id, meta) for _ in range(2)]
+
+    # первая попытка не финальная — подтверждение не теряется, вторая финализирует
+    assert asyncio.run(main()) == [False, True]
+    assert calls.finalized == ["T1"] and calls.popped == [tx_id]